@@ -7,8 +7,9 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
+from app import timing
 from app.config import get_settings
-from app.database import get_db
+from app.database import bind_shard, get_db
 from app.models import User
 
 settings = get_settings()
@@ -22,12 +23,14 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
-    return pwd_context.verify(plain_password, hashed_password)
+    with timing.span('argon2'):
+        return pwd_context.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """生成密码哈希"""
-    return pwd_context.hash(password)
+    with timing.span('argon2'):
+        return pwd_context.hash(password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -42,24 +45,36 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    """从 token 获取当前用户"""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="无效的认证凭据",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def user_for_token(token: str, db: Session) -> Optional[User]:
+    """校验 token 并返回对应用户，无效时返回 None（WebSocket 等无法使用依赖注入的场景）
+
+    同时把 db 中的分片表绑定到该用户所在的分片，之后同一请求内的查询都落在该分片。
+    """
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+        with timing.span('jwt'):
+            payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
     except JWTError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
+        return None
+    email: str = payload.get("sub")
+    if email is None:
+        return None
+
+    with timing.span('user_lookup'):
+        user = db.query(User).filter(User.email == email).first()
+    if user is not None:
+        bind_shard(db, user.shard)
+    return user
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+    """从 token 获取当前用户"""
+    user = user_for_token(token, db)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="无效的认证凭据",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 
@@ -68,3 +83,10 @@ def get_current_active_user(current_user: User = Depends(get_current_user)) -> U
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="用户已被禁用")
     return current_user
+
+
+def get_admin_user(current_user: User = Depends(get_current_active_user)) -> User:
+    """要求当前用户在 ADMIN_EMAILS 中"""
+    if current_user.email not in settings.admin_emails:
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+    return current_user
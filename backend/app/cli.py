@@ -0,0 +1,123 @@
+"""后端运维命令
+
+  python -m app.cli backfill-stats [--user-id 1 --user-id 2]
+  python -m app.cli maintenance [--dry-run] [--analyze] [--enable-incremental-vacuum]
+  python -m app.cli restore-session SESSION_ID
+  python -m app.cli send-reminders [--dry-run]
+  python -m app.cli shard-status
+  python -m app.cli rebalance-shards [--dry-run] [--user-id 1] [--limit 100]
+"""
+import argparse
+import asyncio
+import json
+
+from sqlalchemy import select
+
+from app.database import engine, init_db, shard_engine, shard_locations, shard_session
+from app.models import User
+
+
+def backfill_stats(args: argparse.Namespace) -> None:
+    from app.services import stats
+
+    written = 0
+    for shard in shard_locations():
+        # 每个库只重建位于其中的用户；users 在主库，user_ids 为空列表时 backfill 直接返回
+        with engine.connect() as conn:
+            query = select(User.id).where(User.shard.is_(None) if shard is None else User.shard == shard)
+            if args.user_id:
+                query = query.where(User.id.in_(args.user_id))
+            user_ids = list(conn.execute(query).scalars())
+        db = shard_session(shard)
+        try:
+            written += stats.backfill(db, user_ids=user_ids)
+        finally:
+            db.close()
+    print(f"已重建 {written} 行每日统计")
+
+
+def run_maintenance(args: argparse.Namespace) -> None:
+    from app.services import maintenance
+
+    if args.enable_incremental_vacuum:
+        for shard in shard_locations():
+            maintenance.enable_incremental_vacuum(shard_engine(shard))
+    report = maintenance.run(dry_run=args.dry_run, analyze=args.analyze)
+    print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+
+
+def restore_session(args: argparse.Namespace) -> None:
+    from app.services import maintenance
+
+    restored = False
+    for shard in shard_locations():
+        db = shard_session(shard)
+        try:
+            restored = maintenance.restore_session(db, args.session_id)
+        finally:
+            db.close()
+        if restored:
+            break
+    print("已恢复" if restored else "归档中没有该会话")
+
+
+def send_reminders(args: argparse.Namespace) -> None:
+    from app.services import reminders
+
+    report = asyncio.run(reminders.dispatch(dry_run=args.dry_run))
+    print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+
+
+def shard_status(args: argparse.Namespace) -> None:
+    from app.services import sharding
+
+    print(json.dumps(sharding.status(), ensure_ascii=False, indent=2))
+
+
+def rebalance_shards(args: argparse.Namespace) -> None:
+    from app.services import sharding
+
+    report = sharding.rebalance(dry_run=args.dry_run, user_ids=args.user_id, limit=args.limit)
+    print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backfill = commands.add_parser('backfill-stats', help='根据已有消息与收藏重建 user_daily_stats')
+    backfill.add_argument('--user-id', type=int, action='append', help='只重建指定用户，可重复；默认全部用户')
+    backfill.set_defaults(func=backfill_stats)
+
+    maintain = commands.add_parser('maintenance', help='按保留策略清理音频、归档闲置会话并回收空间')
+    maintain.add_argument('--dry-run', action='store_true', help='只报告可回收的空间，不做修改')
+    maintain.add_argument('--analyze', action='store_true', help='额外执行一次完整 ANALYZE')
+    maintain.add_argument('--enable-incremental-vacuum', action='store_true',
+                          help='把已有数据库切换为 auto_vacuum=INCREMENTAL（执行完整 VACUUM，期间阻塞写入）')
+    maintain.set_defaults(func=run_maintenance)
+
+    restore = commands.add_parser('restore-session', help='恢复已归档的会话')
+    restore.add_argument('session_id')
+    restore.set_defaults(func=restore_session)
+
+    remind = commands.add_parser('send-reminders', help='立即执行一次复习提醒扫描与推送')
+    remind.add_argument('--dry-run', action='store_true', help='只统计处于提醒时段且有到期收藏的用户，不发送')
+    remind.set_defaults(func=send_reminders)
+
+    commands.add_parser('shard-status', help='主库与各分片的用户数、行数与文件大小').set_defaults(func=shard_status)
+
+    rebalance = commands.add_parser(
+        'rebalance-shards', help='把用户数据搬到 SHARD_COUNT 对应的分片（开启、调整或关闭分片后执行）',
+    )
+    rebalance.add_argument('--dry-run', action='store_true', help='只统计需要搬迁的用户')
+    rebalance.add_argument('--user-id', type=int, action='append', help='只搬迁指定用户，可重复')
+    rebalance.add_argument('--limit', type=int, help='本次最多搬迁的用户数')
+    rebalance.set_defaults(func=rebalance_shards)
+
+    args = parser.parse_args()
+    init_db()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
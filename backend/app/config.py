@@ -14,14 +14,105 @@ class Settings(BaseSettings):
   google_api_key: str
   chat_model: str = 'gemini-2.0-flash-exp'
   tts_model: str = 'gemini-2.5-flash-preview-tts'
+  gemini_api_endpoint: str | None = None  # 自定义 API 地址（如本地假服务 http://127.0.0.1:8901），设置后使用 REST
   cors_origins: Union[str, List[str]] = 'http://localhost:5173'
+
+  # 模型路由（见 app/services/model_router.py）：每个任务按顺序尝试的模型，"模型名@超时秒数"，逗号分隔
+  chat_models: Union[str, List[str]] = []  # 为空时只使用 chat_model
+  feedback_models: Union[str, List[str]] = []  # 拆分模式的纠错反馈，为空时与 chat_models 相同
+  title_models: Union[str, List[str]] = []  # 为空时只使用 chat_model
+  tts_models: Union[str, List[str]] = []  # 为空时只使用 tts_model
+  gemini_timeout: float = 30.0  # 未指定超时的模型的单次调用超时（秒）
+  gemini_deadline: float = 60.0  # 一次任务（含故障转移）的总时限（秒）
+  gemini_breaker_open_seconds: float = 30.0  # 模型熔断后多久再试
   
   # VOICEVOX 配置
   voicevox_url: str = 'http://localhost:50021'
+  voicevox_urls: Union[str, List[str]] = []  # 多引擎池，逗号分隔；为空时只使用 voicevox_url
   voicevox_speaker: int = 8  # 默认说话人 ID (春日部つむぎ)
+  voicevox_timeout: float = 60.0  # 单次合成请求超时（秒）
+  voicevox_connect_timeout: float = 3.0  # 建立连接超时（秒）
+  voicevox_split_chars: int = 60  # 超过该长度的文本按句切分并行合成
+  voicevox_warmup: bool = True  # 启动时调用 initialize_speaker 预热说话人
+
+  # VOICEVOX 熔断配置
+  voicevox_breaker_failure_rate: float = 0.5  # 窗口内失败率达到该值即熔断
+  voicevox_breaker_window: int = 20  # 滑动窗口大小（最近 N 次调用）
+  voicevox_breaker_min_calls: int = 5  # 窗口内至少多少次调用才计算失败率
+  voicevox_breaker_open_seconds: float = 30.0  # 熔断后多久进入半开状态
+  voicevox_probe_interval: float = 5.0  # 熔断期间后台探活间隔（秒）
+  tts_fallback_gemini: bool = False  # VOICEVOX 熔断时是否降级到 Gemini TTS
+  voicevox_multi_synthesis_size: int = 4  # 批量合成时每次 multi_synthesis 的条数，1 表示禁用
+  tts_cache_size: int = 256  # 合成结果 LRU 缓存条数，0 表示禁用
+  tts_batch_concurrency: int = 4  # 批量合成的并行组数
+  tts_batch_max_items: int = 200  # 单次批量合成的最大条数
+
+  # 上游调度（见 app/services/scheduler.py）：对话 > 按需播放 > 标题 > 预取，同类别内按用户公平排队
+  scheduler_enabled: bool = True
+  gemini_concurrency: int = 16  # 同时进行的 Gemini 调用上限
+  voicevox_concurrency: int = 0  # 同时进行的 VOICEVOX 合成上限，0 表示每个引擎 4 个
+  scheduler_reserved_share: float = 0.25  # 只留给对话与按需播放的额度比例
+  scheduler_max_wait_tts: float = 30.0  # 各类别最长排队秒数，超时丢弃并返回 503（对话不丢弃）
+  scheduler_max_wait_title: float = 20.0
+  scheduler_max_wait_background: float = 10.0
+
+  # 异步音频任务配置
+  audio_job_workers: int = 2  # 并发合成 worker 数
+  audio_job_queue_size: int = 100  # 排队上限，超出返回 503
+  audio_job_ttl: int = 600  # 已完成任务的保留时间（秒）
   
   # 数据库配置
   database_url: str = 'sqlite:///./chatbot.db'
+
+  # 按用户分片（见 app/database.py）：会话、消息、收藏等按用户存放的表写入多个 SQLite 文件，users 等全局表留在主库
+  shard_count: int = 0  # 新用户与再平衡的目标分片数，0 表示不分片（已分片用户的数据仍按 users.shard 读取）
+  shard_url: str = 'sqlite:///./shards/chatbot_{shard}.db'  # 分片库地址模板，{shard} 替换为分片号
+
+  # 数据保留与压缩（后台维护任务）
+  retention_audio_days: int = 0  # 删除早于 N 天的消息音频，0 表示保留
+  retention_archive_idle_days: int = 0  # 超过 M 天未更新的会话压缩归档，0 表示不归档
+  maintenance_interval: float = 3600.0  # 后台维护间隔（秒），0 表示只通过命令行执行
+  maintenance_batch_size: int = 200  # 每个事务处理的行数，避免长时间持有写锁
+  maintenance_batch_pause: float = 0.05  # 批次之间的间隔（秒），让出写锁
+  maintenance_vacuum_pages: int = 1000  # 每次 incremental_vacuum 回收的页数
+
+  # 响应压缩：列表/会话详情 JSON 超过该字节数时按 Accept-Encoding 使用 br 或 gzip，0 表示关闭
+  compression_min_size: int = 4096
+
+  # 拆分模式：回复（带对话记录）与纠错反馈（只带用户上一句）两次并发调用，回复就绪即可返回
+  chat_split_mode: bool = False
+
+  # 纠错反馈缓存：相同的短句（按风格与提示词版本区分）直接复用反馈，模型只生成回复
+  feedback_cache_enabled: bool = True
+  feedback_cache_max_chars: int = 60  # 只缓存不超过该长度的句子，长句很少重复
+  feedback_cache_ttl_days: int = 30
+  feedback_cache_max_entries: int = 50000  # 后台维护时按最近使用时间淘汰超出的条目
+  feedback_cache_flush_interval: float = 60.0  # 命中次数与使用时间在进程内累计，按该间隔批量写回
+
+  # WebSocket 实时对话通道（/api/sessions/{id}/live）
+  live_max_connections: int = 500  # 每个 worker 的连接上限，超出时以 1013 关闭
+  live_idle_timeout: float = 300.0  # 没有回合进行且超过该秒数未收到消息时关闭连接
+  live_history_messages: int = 40  # 内存中保留、随每轮发送给模型的最近消息条数
+  live_max_turn_chars: int = 2000  # 单轮用户输入上限
+  live_max_pending_turns: int = 2  # 每个连接排队等待处理的输入上限
+  live_send_queue_size: int = 64  # 每个连接待发送事件的队列长度
+  live_send_timeout: float = 10.0  # 队列满时必需事件最多等待的秒数，超时视为客户端过慢并断开
+
+  # 复习提醒（见 app/services/reminders.py）：按用户时区在每天的提醒时段向 push_url 推送待复习卡片数
+  reminder_interval: float = 600.0  # 扫描间隔（秒），0 表示只通过命令行执行
+  reminder_hour: int = 19  # 用户本地时间几点开始提醒
+  reminder_window_hours: float = 3.0  # 提醒时段长度，时段内每个用户每天最多一次
+  reminder_concurrency: int = 20  # 同时进行的推送请求数（也是连接池上限）；httpx 的连接分配开销随连接数增长，不宜过大
+  reminder_timeout: float = 10.0  # 单次推送超时（秒）
+  reminder_max_attempts: int = 3  # 连接失败、429 与 5xx 的最多尝试次数
+  reminder_backoff: float = 1.0  # 重试退避的初始秒数，之后每次翻倍（带随机抖动）
+  reminder_push_hosts: Union[str, List[str]] = []  # 允许的推送主机（如 api.day.app），为空时允许任意公网地址；列表中的主机不做内网检查
+  reminder_pending_timeout: float = 900.0  # 占位后超过该秒数仍未回写结果（如回写失败）的记录在下次扫描时释放重发
+
+  # 批量导入（POST /api/import）
+  import_batch_size: int = 500  # 每个事务写入的记录数
+  import_max_line_bytes: int = 8 * 1024 * 1024  # 单行 NDJSON 上限（消息可能内联音频）
+  import_max_errors: int = 50  # 结果中保留的错误详情条数
   
   # JWT 配置
   secret_key: str = 'your-secret-key-change-in-production'
@@ -31,7 +122,14 @@ class Settings(BaseSettings):
   # 邮箱白名单配置
   email_whitelist_file: str = 'email_whitelist.txt'
 
-  @field_validator('cors_origins', mode='before')
+  # 线上性能分析（见 app/profiling.py）：只对这些邮箱的用户开放，为空时不注册 /debug 路由与分析中间件
+  admin_emails: Union[str, List[str]] = []
+  profile_max_seconds: float = 60.0  # /debug/profile 单次采样时长上限
+  profile_interval: float = 0.01  # 采样间隔（秒）
+  profile_top_functions: int = 40  # ?profile=1 摘要中列出的函数数
+
+  @field_validator('cors_origins', 'voicevox_urls', 'chat_models', 'feedback_models', 'title_models', 'tts_models', 'admin_emails',
+                   'reminder_push_hosts', mode='before')
   @classmethod
   def parse_cors_origins(cls, v) -> List[str]:
     if isinstance(v, str):
@@ -0,0 +1,191 @@
+"""服务容器：外部依赖的客户端在首次使用时创建，生命周期由 FastAPI lifespan 管理
+
+导入本模块不会创建任何客户端，也不会连接数据库或上游服务：
+
+    from app.container import services
+
+    services.gemini.chat(payload)
+    await services.voicevox.tts(text)
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any
+
+from fastapi.concurrency import run_in_threadpool
+
+from app import metrics
+from app.config import get_settings
+from app.database import init_db, ping_db
+
+if TYPE_CHECKING:
+    from app.services.audio_jobs import AudioJobManager
+    from app.services.gemini import GeminiService
+    from app.services.scheduler import Scheduler
+    from app.services.voicevox import VoicevoxService
+
+logger = logging.getLogger(__name__)
+
+
+class Services:
+    def __init__(self) -> None:
+        self._gemini: GeminiService | None = None
+        self._voicevox: VoicevoxService | None = None
+        self._audio_jobs: AudioJobManager | None = None
+        self._scheduler: Scheduler | None = None
+        # 同步路由在线程池中执行，可能并发触发首次创建
+        self._lock = threading.Lock()
+        self._voicevox_warmed = False
+        self._warm_lock: asyncio.Lock | None = None
+        self._warm_task: asyncio.Task | None = None
+        self._maintenance_task: asyncio.Task | None = None
+        self._reminder_task: asyncio.Task | None = None
+
+    @property
+    def gemini(self) -> GeminiService:
+        if self._gemini is None:
+            with self._lock:
+                if self._gemini is None:
+                    from app.services.gemini import GeminiService
+                    self._gemini = GeminiService()
+        return self._gemini
+
+    @property
+    def voicevox(self) -> VoicevoxService:
+        if self._voicevox is None:
+            # 调度器与客户端共用同一把锁，先在锁外创建
+            scheduler = self.scheduler
+            with self._lock:
+                if self._voicevox is None:
+                    from app.services.voicevox import VoicevoxService
+                    service = VoicevoxService(scheduler=scheduler)
+                    metrics.register_sampler(service.sample_metrics)
+                    self._voicevox = service
+        return self._voicevox
+
+    @property
+    def scheduler(self) -> Scheduler:
+        if self._scheduler is None:
+            with self._lock:
+                if self._scheduler is None:
+                    from app.services.scheduler import Priority, Scheduler
+                    settings = get_settings()
+                    capacities = {}
+                    if settings.scheduler_enabled:
+                        engines = len(settings.voicevox_urls) or 1
+                        capacities = {
+                            'gemini': settings.gemini_concurrency,
+                            'voicevox': settings.voicevox_concurrency or 4 * engines,
+                        }
+                    scheduler = Scheduler(
+                        capacities,
+                        reserved_share=settings.scheduler_reserved_share,
+                        max_wait={
+                            Priority.INTERACTIVE: None,
+                            Priority.TTS: settings.scheduler_max_wait_tts,
+                            Priority.TITLE: settings.scheduler_max_wait_title,
+                            Priority.BACKGROUND: settings.scheduler_max_wait_background,
+                        },
+                    )
+                    metrics.register_sampler(scheduler.sample_metrics)
+                    self._scheduler = scheduler
+        return self._scheduler
+
+    @property
+    def audio_jobs(self) -> AudioJobManager:
+        if self._audio_jobs is None:
+            with self._lock:
+                if self._audio_jobs is None:
+                    from app.services.audio_jobs import AudioJobManager
+                    settings = get_settings()
+                    manager = AudioJobManager(
+                        workers=settings.audio_job_workers,
+                        queue_size=settings.audio_job_queue_size,
+                        ttl_seconds=settings.audio_job_ttl,
+                    )
+                    metrics.register_sampler(manager.sample_metrics)
+                    self._audio_jobs = manager
+        return self._audio_jobs
+
+    def loaded(self, name: str) -> bool:
+        """服务是否已创建（用于只在已使用时刷新状态，不触发创建）"""
+        return getattr(self, f'_{name}') is not None
+
+    async def startup(self) -> None:
+        """建表后立即开始接收请求，依赖预热在后台进行，/ready 反映预热结果"""
+        settings = get_settings()
+        await run_in_threadpool(init_db)
+        loop = asyncio.get_running_loop()
+        if settings.voicevox_warmup:
+            self._warm_task = loop.create_task(self.warm_up())
+        if settings.maintenance_interval > 0:
+            from app.services import maintenance
+            self._maintenance_task = loop.create_task(maintenance.run_periodically(settings.maintenance_interval))
+        if settings.reminder_interval > 0:
+            from app.services import reminders
+            self._reminder_task = loop.create_task(reminders.run_periodically(settings.reminder_interval))
+
+    async def shutdown(self) -> None:
+        for task in (self._warm_task, self._maintenance_task, self._reminder_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._warm_task = self._maintenance_task = self._reminder_task = None
+        if self._audio_jobs is not None:
+            await self._audio_jobs.shutdown()
+        from app.services import feedback_cache
+        # 写回进程内累计的反馈缓存命中
+        await run_in_threadpool(feedback_cache.flush_hits)
+        if self._voicevox is not None:
+            await self._voicevox.aclose()
+
+    async def warm_up(self) -> None:
+        """创建 Gemini 模型句柄并在各 VOICEVOX 引擎上预加载说话人；已成功的步骤不再重复"""
+        if self._warm_lock is None:
+            self._warm_lock = asyncio.Lock()
+        async with self._warm_lock:
+            if self._gemini is None:
+                # 首次导入 SDK 较慢，放到线程池避免阻塞事件循环
+                await run_in_threadpool(lambda: self.gemini)
+            if not self._voicevox_warmed:
+                results = await self.voicevox.warm_up()
+                self._voicevox_warmed = any(results.values())
+
+    async def readiness(self) -> tuple[bool, dict[str, Any]]:
+        """就绪检查：数据库与 Gemini 客户端为必需，VOICEVOX 不可用时仅标记为降级"""
+        checks: dict[str, Any] = {}
+        try:
+            await self.warm_up()
+        except Exception as exc:
+            logger.warning("Warm-up failed: %s", exc)
+
+        started = time.perf_counter()
+        try:
+            await run_in_threadpool(ping_db)
+            checks['database'] = {'ok': True, 'latency_ms': round((time.perf_counter() - started) * 1000, 1)}
+        except Exception as exc:
+            checks['database'] = {'ok': False, 'error': str(exc)}
+
+        if self._gemini is not None:
+            # 上游熔断只报告不影响就绪：429/5xx 会同时让所有 worker 熔断，据此摘除会让整个集群下线
+            checks['gemini'] = {'ok': True, 'available': self._gemini.router.available('chat'), **self._gemini.snapshot()}
+        else:
+            checks['gemini'] = {'ok': False, 'error': 'Gemini 客户端未初始化'}
+
+        voicevox = self.voicevox
+        checks['voicevox'] = {
+            'ok': self._voicevox_warmed and voicevox.available,
+            'required': False,
+            'engines': voicevox.snapshot(),
+        }
+
+        checks['scheduler'] = {'ok': True, 'required': False, 'lanes': self.scheduler.snapshot()}
+
+        ready = checks['database']['ok'] and checks['gemini']['ok']
+        return ready, checks
+
+
+services = Services()
@@ -1,19 +1,44 @@
-from sqlalchemy import create_engine
+import logging
+import threading
+from pathlib import Path
+
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, event, inspect, make_url, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateTable
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
+from app import metrics
 from app.config import get_settings
 
+logger = logging.getLogger(__name__)
+
 settings = get_settings()
 
 # SQLite 数据库 URL (后续迁移到 MySQL 只需改这里)
 SQLALCHEMY_DATABASE_URL = settings.database_url or "sqlite:///./chatbot.db"
 
+
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    """SQLite 默认不执行外键约束，ON DELETE CASCADE 需要每个连接单独开启"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def _create_engine(url: str) -> Engine:
+    created = create_engine(url, connect_args={"check_same_thread": False} if "sqlite" in url else {})
+    if created.dialect.name == "sqlite":
+        event.listen(created, "connect", _enable_foreign_keys)
+    return created
+
+
 # 创建数据库引擎
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {},
-)
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
+
+# 记录 SQL 条数与耗时
+metrics.instrument_engine(engine)
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -21,6 +46,194 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # 声明基类
 Base = declarative_base()
 
+# 按用户分片：users 等全局表只在主库，以下按用户存放的表写入用户所在的分片库（users.shard）。
+# users.shard 为空表示数据仍在主库（未开启分片或尚未迁移），主库因此保留全部表。
+# 请求中由 app.auth.user_for_token 把会话的分片表绑定到当前用户的分片，其余表仍使用主库；
+# 同一会话跨两个库的写入各自提交，没有两阶段提交。
+SHARDED_TABLES = ("sessions", "messages", "favorites", "user_daily_stats", "archived_sessions")
+
+# 分片库中的用户占位表：分片表的外键指向它，迁出用户时删除占位行即级联删除其全部数据
+shard_users = Table("users", MetaData(), Column("id", Integer, primary_key=True))
+
+_shard_engines: dict[int, Engine] = {}
+_shard_lock = threading.Lock()
+
+
+def shard_engine(shard: int | None) -> Engine:
+    """分片号对应的引擎（首次使用时创建）；None 表示主库"""
+    if shard is None:
+        return engine
+    with _shard_lock:
+        created = _shard_engines.get(shard)
+        if created is None:
+            url = settings.shard_url.format(shard=shard)
+            if not url.startswith("sqlite"):
+                raise ValueError(f"分片只支持 SQLite: {url}")
+            database = make_url(url).database
+            if database and database != ":memory:":
+                Path(database).parent.mkdir(parents=True, exist_ok=True)
+            created = _shard_engines[shard] = _create_engine(url)
+            metrics.instrument_engine(created, sample_pool=False)
+    return created
+
+
+def assign_shard(user_id: int) -> int | None:
+    """按 SHARD_COUNT 计算用户应在的分片，未开启分片时为 None（主库）"""
+    return user_id % settings.shard_count if settings.shard_count > 0 else None
+
+
+def sharded_tables() -> list[Table]:
+    from app import models  # noqa: F401
+
+    return [table for table in Base.metadata.sorted_tables if table.name in SHARDED_TABLES]
+
+
+def bind_shard(db: Session, shard: int | None) -> None:
+    """把会话中的分片表绑定到分片库；shard 为空时不做任何事，全部使用主库"""
+    if shard is None:
+        return
+    target = shard_engine(shard)
+    for table in sharded_tables():
+        db.bind_table(table, target)
+
+
+def shard_session(shard: int | None) -> Session:
+    """分片表绑定到指定分片的数据库会话，用于没有请求上下文的写入（实时通道、后台任务）"""
+    db = SessionLocal()
+    bind_shard(db, shard)
+    return db
+
+
+def shard_locations() -> list[int | None]:
+    """主库（None）与所有分片：维护、提醒等跨用户的任务逐个处理"""
+    with engine.connect() as conn:
+        placed = {row[0] for row in conn.execute(text("SELECT DISTINCT shard FROM users WHERE shard IS NOT NULL"))}
+    return [None, *sorted(placed | set(range(max(0, settings.shard_count))))]
+
+
+def register_shard_user(shard: int, user_id: int) -> None:
+    """在分片库登记用户（分片表的外键指向占位行），重复登记不报错"""
+    with shard_engine(shard).begin() as conn:
+        conn.execute(sqlite.insert(shard_users).on_conflict_do_nothing(), {"id": user_id})
+
+
+def init_db() -> None:
+    """创建缺失的表（在应用启动时调用，而不是导入时）"""
+    # 导入模型以注册到 Base.metadata
+    from app import models  # noqa: F401
+
+    _init_schema(engine, Base.metadata.sorted_tables)
+    for shard in shard_locations()[1:]:
+        init_shard(shard)
+
+
+def init_shard(shard: int) -> None:
+    """创建分片库中的占位表与分片表"""
+    _init_schema(shard_engine(shard), sharded_tables(), shard=True)
+
+
+def _init_schema(bind: Engine, tables: list[Table], shard: bool = False) -> None:
+    if bind.dialect.name == "sqlite":
+        _upgrade_sqlite_foreign_keys(bind, tables)
+
+    with bind.begin() as conn:
+        # auto_vacuum 只能在建表前设置；已有数据库需执行一次 python -m app.cli maintenance --enable-incremental-vacuum
+        if bind.dialect.name == "sqlite":
+            if conn.exec_driver_sql("PRAGMA page_count").scalar() == 0:
+                conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            # 多个 worker 同时启动时串行建表（pysqlite 不会为 DDL 隐式开启事务）
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        if shard:
+            shard_users.create(conn, checkfirst=True)
+        Base.metadata.create_all(bind=conn, tables=tables)
+        _add_missing_columns(conn, tables)
+        _add_missing_indexes(conn, tables)
+
+
+def _add_missing_columns(conn, tables: list[Table]) -> None:
+    """create_all 不会修改已有表：为旧表补上模型中新增的可空列"""
+    inspector = inspect(conn)
+    for table in tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable or column.server_default is not None:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+            logger.info("Added column %s.%s", table.name, column.name)
+
+
+def _add_missing_indexes(conn, tables: list[Table]) -> None:
+    """create_all 也不会为已有表补建索引"""
+    for table in tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _outdated_foreign_keys(conn, table) -> bool:
+    """表中是否有外键的 ON DELETE 动作与模型定义不一致"""
+    actual = {
+        row[3]: row[6].upper()
+        for row in conn.exec_driver_sql(f'PRAGMA foreign_key_list("{table.name}")')
+    }
+    return any(
+        fk.parent.name in actual and actual[fk.parent.name] != (fk.ondelete or "NO ACTION").upper()
+        for fk in table.foreign_keys
+    )
+
+
+def _upgrade_sqlite_foreign_keys(bind: Engine, tables: list[Table]) -> None:
+    """SQLite 无法修改已有表的外键，按官方步骤重建表：建新表、复制数据、删除旧表、改名
+
+    只在旧数据库上执行一次；父记录已不存在的孤儿行不会复制（开启外键约束后它们无法再被删除）。
+    """
+    with bind.connect() as conn:
+        existing = set(bind.dialect.get_table_names(conn))
+        tables = [t for t in tables if t.name in existing and _outdated_foreign_keys(conn, t)]
+        if not tables:
+            return
+        # 外键约束只能在事务外切换；重建期间关闭，避免删除旧表时级联删除子表数据
+        conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        conn.commit()
+        try:
+            with conn.begin():
+                # pysqlite 只在 DML 前隐式开启事务，显式 BEGIN 让建表、删表和改名一起提交或回滚
+                conn.exec_driver_sql("BEGIN")
+                for table in tables:
+                    old_columns = {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table.name}")')}
+                    columns = ", ".join(f'"{c.name}"' for c in table.columns if c.name in old_columns)
+                    parents = " AND ".join(
+                        f'("{fk.parent.name}" IS NULL OR "{fk.parent.name}" IN '
+                        f'(SELECT "{fk.column.name}" FROM "{fk.column.table.name}"))'
+                        for fk in table.foreign_keys
+                    ) or "1"
+                    temp = f"_new_{table.name}"
+                    ddl = str(CreateTable(table).compile(dialect=bind.dialect))
+                    conn.exec_driver_sql(ddl.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {temp} ", 1))
+                    copied = conn.exec_driver_sql(
+                        f'INSERT INTO {temp} ({columns}) SELECT {columns} FROM "{table.name}" WHERE {parents}'
+                    ).rowcount
+                    conn.exec_driver_sql(f'DROP TABLE "{table.name}"')
+                    conn.exec_driver_sql(f'ALTER TABLE {temp} RENAME TO "{table.name}"')
+                    for index in table.indexes:
+                        index.create(conn)
+                    logger.info("Rebuilt table %s with ON DELETE CASCADE (%d rows)", table.name, copied)
+                problems = conn.exec_driver_sql("PRAGMA foreign_key_check").all()
+                if problems:
+                    raise RuntimeError(f"外键检查失败: {problems[:5]}")
+        finally:
+            conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+            conn.commit()
+
+
+def ping_db() -> None:
+    """执行一次最简单的查询，确认主库与已打开的分片库连接可用"""
+    with _shard_lock:
+        binds = [engine, *_shard_engines.values()]
+    for bind in binds:
+        with bind.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
 
 # 依赖注入:获取数据库会话
 def get_db():
@@ -1,16 +1,28 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+import anyio.to_thread
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from app import metrics, timing
 from app.config import get_settings
-from app.database import engine, Base
-from app.routers import chat, tts, title, auth, sessions, favorites
+from app.container import services
+from app.routers import chat, tts, title, auth, sessions, favorites, audio, stats, data_import, live
 
 settings = get_settings()
+timing.configure_logging()
+
 
-# 创建数据库表
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+  # 建表在启动时完成；Gemini、VOICEVOX 客户端按需创建，预热在后台进行
+  await services.startup()
+  yield
+  await services.shutdown()
 
-app = FastAPI(title='Kokoro Coach API', version='0.1.0')
+
+app = FastAPI(title='Kokoro Coach API', version='0.1.0', lifespan=lifespan)
 
 app.add_middleware(
   CORSMiddleware,
@@ -18,16 +30,55 @@ app.add_middleware(
   allow_headers=['*'],
   allow_credentials=True,
   allow_methods=['*'],
+  expose_headers=['Server-Timing', 'X-Request-ID'],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(timing.TimingMiddleware)
+if settings.admin_emails:
+  # 线上性能分析只对管理员开放；未配置时不导入、不注册路由与中间件，没有任何开销
+  from app import profiling
+  from app.routers import debug
+
+  app.add_middleware(profiling.ProfileMiddleware)
+  app.include_router(debug.router)
 
 app.include_router(auth.router)
 app.include_router(sessions.router)
+app.include_router(live.router)
 app.include_router(favorites.router)
+app.include_router(stats.router)
+app.include_router(data_import.router)
 app.include_router(chat.router)
 app.include_router(tts.router)
+app.include_router(audio.router)
 app.include_router(title.router)
 
 
 @app.get('/health')
 async def health() -> dict[str, str]:
+  # 存活探针：进程能处理请求即可，不检查依赖
   return {'status': 'ok'}
+
+
+@app.get('/ready')
+async def ready() -> JSONResponse:
+  # 就绪探针：预热依赖并分别报告状态，数据库或 Gemini 不可用时返回 503
+  is_ready, checks = await services.readiness()
+  degraded = not all(check['ok'] and check.get('available', True) for check in checks.values())
+  return JSONResponse(
+    {'status': ('degraded' if degraded else 'ready') if is_ready else 'not_ready', 'checks': checks},
+    status_code=200 if is_ready else 503,
+  )
+
+
+@app.get('/metrics', include_in_schema=False)
+async def prometheus_metrics() -> Response:
+  # 读取一次状态以便冷却期结束时刷新熔断器指标
+  if services.loaded('voicevox'):
+    services.voicevox.snapshot()
+  # 同步路由与阻塞调用共用 anyio 默认线程池
+  limiter = anyio.to_thread.current_default_thread_limiter()
+  metrics.threadpool_busy.set(limiter.borrowed_tokens)
+  metrics.threadpool_capacity.set(limiter.total_tokens)
+  body, content_type = metrics.render()
+  return Response(content=body, media_type=content_type)
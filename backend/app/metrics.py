@@ -0,0 +1,292 @@
+"""Prometheus 指标定义"""
+import time
+from contextvars import ContextVar
+from typing import Callable
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import timing
+
+CIRCUIT_STATES = ('closed', 'half_open', 'open')
+
+# 上游调用（Gemini、VOICEVOX）耗时分桶，覆盖几十毫秒到一分钟
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 34, 60)
+# 数据库单条语句耗时分桶
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+circuit_state = Gauge(
+    'circuit_breaker_state',
+    '熔断器当前状态（值为 1 的 state 标签即当前状态）',
+    ['name', 'state'],
+)
+circuit_transitions = Counter(
+    'circuit_breaker_transitions_total',
+    '熔断器状态切换次数',
+    ['name', 'state'],
+)
+tts_fallbacks = Counter(
+    'tts_fallback_total',
+    'VOICEVOX 不可用时的 TTS 降级次数',
+    ['result'],
+)
+
+http_request_duration = Histogram(
+    'http_request_duration_seconds',
+    'HTTP 请求耗时（按路由模板与状态码）',
+    ['method', 'route', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+http_requests_in_progress = Gauge(
+    'http_requests_in_progress',
+    '正在处理的 HTTP 请求数',
+)
+
+gemini_request_duration = Histogram(
+    'gemini_request_duration_seconds',
+    'Gemini 调用耗时',
+    ['task', 'model', 'outcome'],
+    buckets=UPSTREAM_BUCKETS,
+)
+gemini_tokens = Counter(
+    'gemini_tokens_total',
+    'Gemini token 用量（来自 usage_metadata）',
+    ['task', 'model', 'kind'],
+)
+
+gemini_failovers = Counter(
+    'gemini_failovers_total',
+    '模型路由跳过或放弃某个模型的次数',
+    ['task', 'model', 'reason'],  # reason: error / slow / open
+)
+chat_time_to_reply = Histogram(
+    'chat_time_to_reply_seconds',
+    '/api/chat 从收到请求到回复文本就绪的耗时',
+    ['mode'],  # combined / split
+    buckets=UPSTREAM_BUCKETS,
+)
+voicevox_request_duration = Histogram(
+    'voicevox_request_duration_seconds',
+    'VOICEVOX 接口耗时',
+    ['operation', 'engine', 'outcome'],
+    buckets=UPSTREAM_BUCKETS,
+)
+voicevox_outstanding = Gauge(
+    'voicevox_engine_outstanding_requests',
+    '每个 VOICEVOX 引擎的在途请求数',
+    ['engine'],
+)
+
+db_query_duration = Histogram(
+    'db_query_duration_seconds',
+    '单条 SQL 耗时（按路由与语句类型）',
+    ['route', 'operation'],
+    buckets=DB_BUCKETS,
+)
+db_queries_per_request = Histogram(
+    'db_queries_per_request',
+    '单个请求执行的 SQL 条数',
+    ['route'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+db_pool_checked_out = Gauge('db_pool_checked_out', '数据库连接池已借出连接数')
+db_pool_size = Gauge('db_pool_size', '数据库连接池容量（含溢出上限）')
+
+maintenance_rows = Counter(
+    'maintenance_rows_total',
+    '后台维护处理的行数',
+    ['task'],
+)
+feedback_cache_requests = Counter(
+    'feedback_cache_requests_total',
+    '纠错反馈缓存查询次数',
+    ['result'],  # hit / miss / skip（句子过长或缓存关闭）
+)
+import_rows = Counter(
+    'import_rows_total',
+    '批量导入处理的记录数',
+    ['kind', 'result'],
+)
+live_connections = Gauge('live_connections', 'WebSocket 实时对话连接数')
+live_turns = Counter(
+    'live_turns_total',
+    'WebSocket 实时对话的回合数',
+    ['result'],  # ok / error / busy（排队已满被拒绝）
+)
+live_deltas_coalesced = Counter(
+    'live_reply_deltas_coalesced_total',
+    '发送队列已满、合并到下一个增量的回复片段数',
+)
+upstream_queue_depth = Gauge(
+    'upstream_queue_depth',
+    '等待上游并发额度的调用数',
+    ['upstream', 'priority'],
+)
+upstream_queue_wait = Histogram(
+    'upstream_queue_wait_seconds',
+    '上游调用排队等待额度的时间',
+    ['upstream', 'priority'],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+upstream_dropped = Counter(
+    'upstream_dropped_total',
+    '排队超过最长等待时间被丢弃的上游调用数',
+    ['upstream', 'priority'],
+)
+upstream_in_flight = Gauge('upstream_in_flight', '正在进行的上游调用数', ['upstream'])
+audio_encode_duration = Histogram(
+    'audio_encode_duration_seconds',
+    '语音按档位重新编码的耗时',
+    ['profile'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+reminder_deliveries = Counter(
+    'reminder_deliveries_total',
+    '复习提醒推送结果',
+    ['result'],  # sent / failed
+)
+reminder_attempts = Counter('reminder_attempts_total', '复习提醒推送请求数（含重试）')
+reminder_pass_duration = Histogram(
+    'reminder_pass_duration_seconds',
+    '一次提醒扫描与发送的总耗时',
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+maintenance_last_success = Gauge('maintenance_last_success_timestamp', '最近一次维护成功完成的时间（unix 秒）')
+
+audio_jobs_queued = Gauge('audio_jobs_queued', '异步音频任务排队数')
+audio_jobs_running = Gauge('audio_jobs_running', '异步音频任务执行中数量')
+threadpool_busy = Gauge('threadpool_busy_threads', '同步路由/阻塞调用占用的线程数')
+threadpool_capacity = Gauge('threadpool_capacity_threads', '线程池容量')
+
+
+class _RequestStats:
+    """单个请求内的统计，通过 contextvar 在线程池中共享"""
+
+    __slots__ = ('scope', 'db_queries')
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.db_queries = 0
+
+    @property
+    def route(self) -> str:
+        return route_label(self.scope)
+
+
+_current_request: ContextVar[_RequestStats | None] = ContextVar('metrics_request', default=None)
+_samplers: list[Callable[[], None]] = []
+
+
+def route_label(scope: dict) -> str:
+    """使用路由模板而不是实际路径，避免标签基数爆炸"""
+    route = scope.get('route')
+    path = getattr(route, 'path', None)
+    return path or 'unmatched'
+
+
+def set_circuit_state(name: str, state: str, transition: bool = True) -> None:
+    for candidate in CIRCUIT_STATES:
+        circuit_state.labels(name=name, state=candidate).set(1 if candidate == state else 0)
+    if transition:
+        circuit_transitions.labels(name=name, state=state).inc()
+
+
+def observe_gemini(task: str, model: str, started: float, response=None, outcome: str = 'ok') -> None:
+    """记录 Gemini 调用耗时与 token 用量"""
+    gemini_request_duration.labels(task=task, model=model, outcome=outcome).observe(time.perf_counter() - started)
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return
+    for kind, attr in (
+        ('prompt', 'prompt_token_count'),
+        ('candidates', 'candidates_token_count'),
+        ('total', 'total_token_count'),
+    ):
+        count = getattr(usage, attr, 0) or 0
+        if count:
+            gemini_tokens.labels(task=task, model=model, kind=kind).inc(count)
+
+
+def register_sampler(sampler: Callable[[], None]) -> None:
+    """注册抓取时执行的采样函数，用于刷新连接池、队列等饱和度 Gauge"""
+    _samplers.append(sampler)
+
+
+def instrument_engine(engine: Engine, sample_pool: bool = True) -> None:
+    """通过 SQLAlchemy 事件统计每条 SQL 的耗时与所属路由；连接池 Gauge 只反映主库（sample_pool）"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['metrics_started'].pop()
+        stats = _current_request.get()
+        route = stats.route if stats else 'background'
+        if stats:
+            stats.db_queries += 1
+        operation = statement.lstrip().split(' ', 1)[0].upper() or 'OTHER'
+        elapsed = time.perf_counter() - started
+        db_query_duration.labels(route=route, operation=operation).observe(elapsed)
+        timing.record('db', elapsed)
+
+    @event.listens_for(engine, 'handle_error')
+    def _error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('metrics_started'):
+            conn.info['metrics_started'].pop()
+
+    if not sample_pool:
+        return
+    pool = engine.pool
+
+    def sample() -> None:
+        if hasattr(pool, 'checkedout'):
+            db_pool_checked_out.set(pool.checkedout())
+            db_pool_size.set(pool.size() + max(getattr(pool, '_max_overflow', 0), 0))
+
+    register_sampler(sample)
+
+
+class MetricsMiddleware:
+    """记录每个 HTTP 请求的耗时与 SQL 条数（纯 ASGI 中间件，不缓冲流式响应）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        stats = _RequestStats(scope)
+        token = _current_request.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        http_requests_in_progress.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_progress.dec()
+            route = stats.route
+            http_request_duration.labels(
+                method=scope['method'], route=route, status=str(status_code)
+            ).observe(time.perf_counter() - started)
+            db_queries_per_request.labels(route=route).observe(stats.db_queries)
+            _current_request.reset(token)
+
+
+def render() -> tuple[bytes, str]:
+    """生成 Prometheus 文本格式的指标"""
+    for sampler in _samplers:
+        sampler()
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,5 +1,7 @@
 import datetime
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text, JSON, Float
+from sqlalchemy import (
+    Boolean, Column, Date, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Text, JSON, Float, UniqueConstraint,
+)
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -17,19 +19,21 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_verified = Column(Boolean, default=False)
     push_url = Column(String(255), nullable=True)
+    shard = Column(Integer, nullable=True, index=True)  # 会话、消息、收藏所在的分片，为空表示在主库（见 app/database.py）
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
     # 关联
-    sessions = relationship("Session", back_populates="user", cascade="all, delete-orphan")
-    favorites = relationship("Favorite", back_populates="user", cascade="all, delete-orphan")
+    # 子表通过 ON DELETE CASCADE 由数据库删除，ORM 不再逐行加载
+    sessions = relationship("Session", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    favorites = relationship("Favorite", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class Session(Base):
     __tablename__ = "sessions"
 
     id = Column(String(50), primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     title = Column(String(255), default="新的对话")
     conversation_style = Column(String(20), default="casual")
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -37,30 +41,41 @@ class Session(Base):
 
     # 关联
     user = relationship("User", back_populates="sessions")
-    messages = relationship("Message", back_populates="session", cascade="all, delete-orphan")
+    messages = relationship("Message", back_populates="session", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        # 外键级联删除按 user_id 查找子行；会话列表按 updated_at 倒序
+        Index("ix_sessions_user_id_updated_at", "user_id", "updated_at"),
+    )
 
 
 class Message(Base):
     __tablename__ = "messages"
 
     id = Column(String(50), primary_key=True, index=True)
-    session_id = Column(String(50), ForeignKey("sessions.id"), nullable=False)
+    session_id = Column(String(50), ForeignKey("sessions.id", ondelete="CASCADE"), nullable=False)
     role = Column(String(20), nullable=False)  # 'user' or 'assistant'
     content = Column(Text, nullable=False)
     translation = Column(Text, nullable=True)
     feedback = Column(JSON, nullable=True)  # 存储 {correctedSentence, explanation, naturalnessScore}
     audio_base64 = Column(Text, nullable=True)
+    model = Column(String(100), nullable=True)  # 生成该回复的 Gemini 模型（模型路由可能故障转移）
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
     # 关联
     session = relationship("Session", back_populates="messages")
 
+    __table_args__ = (
+        # 外键级联删除按 session_id 查找子行；会话详情按 created_at 排序
+        Index("ix_messages_session_id_created_at", "session_id", "created_at"),
+    )
+
 
 class Favorite(Base):
     __tablename__ = "favorites"
 
     id = Column(String(50), primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     text = Column(Text, nullable=False)
     translation = Column(Text, nullable=True)
     source = Column(String(50), nullable=False)  # 'reply', 'feedback', 'selection'
@@ -68,6 +83,76 @@ class Favorite(Base):
     review_count = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     last_reviewed_at = Column(DateTime, nullable=True)
+    due_at = Column(DateTime, nullable=True)  # 下次复习时间（UTC），已掌握为空，见 app/services/reminders.py
 
     # 关联
     user = relationship("User", back_populates="favorites")
+
+    __table_args__ = (
+        # 复习提醒按到期时间范围扫描，user_id 放在索引中用于分组
+        Index("ix_favorites_due_at_user_id", "due_at", "user_id"),
+        # 外键级联删除按 user_id 查找子行；收藏列表按 created_at 倒序
+        Index("ix_favorites_user_id_created_at", "user_id", "created_at"),
+    )
+
+
+class UserDailyStats(Base):
+    """按用户本地日期聚合的学习统计，与消息/收藏写入在同一事务中增量更新"""
+    __tablename__ = "user_daily_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)  # 用户时区下的日期
+    turns = Column(Integer, nullable=False, default=0)  # 用户发言次数
+    score_count = Column(Integer, nullable=False, default=0)  # 带 naturalnessScore 的反馈条数
+    score_sum = Column(Integer, nullable=False, default=0)
+    score_min = Column(Integer, nullable=True)
+    score_max = Column(Integer, nullable=True)
+    favorites_added = Column(Integer, nullable=False, default=0)
+    favorites_reviewed = Column(Integer, nullable=False, default=0)
+
+
+class ArchivedSession(Base):
+    """长期未使用的会话归档：消息（不含音频）序列化为 JSON 后 zlib 压缩存放"""
+    __tablename__ = "archived_sessions"
+
+    id = Column(String(50), primary_key=True)  # 原会话 ID
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    title = Column(String(255))
+    conversation_style = Column(String(20))
+    message_count = Column(Integer, nullable=False, default=0)
+    payload = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class FeedbackCache(Base):
+    """按（规范化的用户句子、对话风格、提示词版本）缓存的纠错反馈，命中时模型只需生成回复"""
+    __tablename__ = "feedback_cache"
+
+    key = Column(String(64), primary_key=True)  # sha256(prompt_version, style, text)
+    text = Column(Text, nullable=False)  # 规范化后的用户句子
+    style = Column(String(20), nullable=False)
+    prompt_version = Column(String(16), nullable=False)
+    feedback = Column(JSON, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)  # TTL 从生成时算起
+    last_used_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)  # 超出容量时按此淘汰
+
+
+class ReminderDelivery(Base):
+    """复习提醒的发送记录：每个用户每个本地日期一行，先插入占位再发送，避免重复提醒"""
+    __tablename__ = "reminder_deliveries"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)  # 用户时区下的日期
+    due_count = Column(Integer, nullable=False, default=0)
+    status = Column(String(20), nullable=False, default="pending")  # 'pending', 'sent', 'failed'
+    attempts = Column(Integer, nullable=False, default=0)
+    http_status = Column(Integer, nullable=True)
+    error = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (UniqueConstraint("user_id", "day", name="uq_reminder_deliveries_user_day"),)
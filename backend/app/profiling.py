@@ -0,0 +1,224 @@
+"""线上性能分析（仅管理员，默认关闭）：进程内采样分析与单请求 cProfile
+
+- sample_stacks：后台线程按固定频率读取 sys._current_frames()，输出 collapsed stacks
+  （flamegraph.pl、speedscope 可直接打开）。不设置 profile/trace 钩子，被分析的代码没有额外开销。
+- ProfileMiddleware：管理员请求带 ?profile=1 时对该请求运行 cProfile，把统计摘要与原响应一起返回。
+
+两者只在配置了 ADMIN_EMAILS 时由 app.main 注册，未开启时不加载任何钩子；
+线程池调用的分析包装只在有请求被分析期间安装。
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from urllib.parse import parse_qs
+
+import anyio.to_thread
+from jose import JWTError, jwt
+
+from app.config import get_settings
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 栈顶为这些函数的线程在等待（事件循环空转、线程池等任务、锁等待），默认不计入
+IDLE_FUNCTIONS = frozenset({
+    ('selectors.py', 'select'),
+    ('threading.py', 'wait'),
+    ('queue.py', 'get'),
+    ('_base.py', 'result'),
+})
+
+# 同一时间只允许一次采样与一个被分析的请求（cProfile 每个线程只能有一个分析器）
+_sampling = threading.Lock()
+_request_profiling = threading.Lock()
+_labels: dict = {}
+
+
+def _label(code) -> str:
+    """栈帧名称：函数限定名与相对路径（collapsed 格式中不能出现分号）"""
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        if path.startswith(BACKEND_DIR):
+            path = os.path.relpath(path, BACKEND_DIR)
+        else:
+            path = '/'.join(path.split(os.sep)[-2:])
+        label = f'{code.co_qualname} ({path}:{code.co_firstlineno})'.replace(';', ',')
+        _labels[code] = label
+    return label
+
+
+def _stack(frame) -> tuple[list[str], tuple[str, str]]:
+    frames = []
+    leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+    while frame is not None:
+        frames.append(_label(frame.f_code))
+        frame = frame.f_back
+    frames.reverse()
+    return frames, leaf
+
+
+def sample_stacks(seconds: float, interval: float, include_idle: bool = False) -> tuple[Counter, int]:
+    """采样所有线程的调用栈 seconds 秒，返回 (collapsed 栈 -> 次数, 采样轮数)；已有采样进行中时抛出 RuntimeError"""
+    if not _sampling.acquire(blocking=False):
+        raise RuntimeError('已有采样正在进行')
+    try:
+        own = threading.get_ident()
+        stacks: Counter = Counter()
+        rounds = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                frames, leaf = _stack(frame)
+                if not include_idle and leaf in IDLE_FUNCTIONS:
+                    continue
+                stacks[';'.join([names.get(ident, f'thread-{ident}'), *frames])] += 1
+            rounds += 1
+            time.sleep(interval)
+        return stacks, rounds
+    finally:
+        _sampling.release()
+
+
+def collapsed(stacks: Counter) -> str:
+    """flamegraph.pl 的输入格式：每行 "帧;帧;帧 次数"，按次数降序"""
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+class RequestProfile:
+    """一个请求的 cProfile：事件循环线程一个分析器，线程池中每次调用各一个，结束时合并"""
+
+    def __init__(self):
+        self.loop_profiler = cProfile.Profile()
+        self.profilers: list[cProfile.Profile] = [self.loop_profiler]
+        self.lock = threading.Lock()
+
+    def wrap(self, func):
+        def run(*args):
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(func, *args)
+            finally:
+                with self.lock:
+                    self.profilers.append(profiler)
+        return run
+
+    def summary(self, sort: str, limit: int) -> str:
+        with self.lock:
+            stats = pstats.Stats(*self.profilers, stream=(stream := io.StringIO()))
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+_current: ContextVar[RequestProfile | None] = ContextVar('request_profile', default=None)
+_run_sync = anyio.to_thread.run_sync
+
+
+async def _profiled_run_sync(func, *args, **kwargs):
+    # 同步路由、依赖与响应校验都经 run_in_threadpool -> anyio.to_thread.run_sync 在线程池中执行；
+    # 只在分析期间替换，期间同时运行的其他请求的 _current 为 None，原样调用
+    profile = _current.get()
+    if profile is not None:
+        func = profile.wrap(func)
+    return await _run_sync(func, *args, **kwargs)
+
+
+def _is_admin(scope) -> bool:
+    settings = get_settings()
+    authorization = dict(scope.get('headers') or []).get(b'authorization', b'').decode('latin-1')
+    scheme, _, token = authorization.partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return False
+    try:
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+    except JWTError:
+        return False
+    return payload.get('sub') in settings.admin_emails
+
+
+class ProfileMiddleware:
+    """管理员请求带 ?profile=1 时用 cProfile 分析该请求，响应改为 JSON：原状态码、原响应与统计摘要
+
+    事件循环线程上的分析器在请求期间一直开启，同时在事件循环上运行的其他请求也会计入摘要；
+    非管理员或已有请求在分析时按普通请求处理。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or b'profile=' not in scope.get('query_string', b''):
+            await self.app(scope, receive, send)
+            return
+        query = parse_qs(scope['query_string'].decode('latin-1'))
+        if query.get('profile', [''])[-1] not in ('1', 'true') or not _is_admin(scope):
+            await self.app(scope, receive, send)
+            return
+        if not _request_profiling.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        settings = get_settings()
+        sort = query.get('profile_sort', ['cumulative'])[-1]
+        if sort not in ('cumulative', 'tottime', 'ncalls'):
+            sort = 'cumulative'
+        # 不压缩响应，便于解析原响应体
+        scope = {**scope, 'headers': [(k, v) for k, v in scope['headers'] if k != b'accept-encoding']}
+        start: dict = {}
+        body = bytearray()
+
+        async def buffer(message):
+            if message['type'] == 'http.response.start':
+                start.update(message)
+            elif message['type'] == 'http.response.body':
+                body.extend(message.get('body', b''))
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        anyio.to_thread.run_sync = _profiled_run_sync
+        started = time.perf_counter()
+        try:
+            profile.loop_profiler.enable()
+            try:
+                await self.app(scope, receive, buffer)
+            finally:
+                profile.loop_profiler.disable()
+        finally:
+            anyio.to_thread.run_sync = _run_sync
+            _current.reset(token)
+            _request_profiling.release()
+        elapsed = time.perf_counter() - started
+
+        headers = [(k, v) for k, v in start.get('headers', []) if k not in (b'content-length', b'content-type')]
+        content_type = dict(start.get('headers', [])).get(b'content-type', b'').decode('latin-1')
+        original: dict = {'content_type': content_type, 'bytes': len(body)}
+        if content_type.startswith('application/json') and body:
+            try:
+                original['body'] = json.loads(body)
+            except ValueError:
+                original['body'] = body.decode('utf-8', 'replace')
+        payload = json.dumps({
+            'status': start.get('status', 500),
+            'response': original,
+            'profile': {
+                'wall_ms': round(elapsed * 1000, 1),
+                'sort': sort,
+                'stats': profile.summary(sort, settings.profile_top_functions),
+            },
+        }, ensure_ascii=False).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': start.get('status', 500),
+            'headers': [*headers, (b'content-type', b'application/json'),
+                        (b'content-length', str(len(payload)).encode('latin-1'))],
+        })
+        await send({'type': 'http.response.body', 'body': payload})
@@ -0,0 +1,80 @@
+"""大列表与会话详情的快速 JSON 响应
+
+这些接口直接用 Core select() 取出所需列，绕过 ORM 对象与 Pydantic 校验，
+再用 orjson 编码；超过 compression_min_size 时按 Accept-Encoding 压缩。
+输出格式与 schemas_db 中的响应模型保持一致（datetime 为 isoformat() + 'Z'）。
+"""
+import gzip
+from typing import Any, Iterable
+
+import orjson
+from fastapi import Request, Response
+from pydantic import BaseModel
+from sqlalchemy import Column
+
+from app import timing
+from app.config import get_settings
+
+try:
+    import brotli
+except ImportError:  # 可选依赖：pip install -e ".[brotli]"
+    brotli = None
+
+# 数据库中的 datetime 均为不带时区的 UTC 时间
+_ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+
+
+def columns_for(model, schema: type[BaseModel]) -> list[Column]:
+    """按响应模型的字段顺序取出表中对应的列，模型字段变化时查询随之变化"""
+    table_columns = model.__table__.columns
+    return [getattr(model, name) for name in schema.model_fields if name in table_columns]
+
+
+def rows_to_dicts(result) -> list[dict[str, Any]]:
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, option=_ORJSON_OPTIONS)
+
+
+def _accepted_encodings(header: str) -> Iterable[str]:
+    """解析 Accept-Encoding，跳过 q=0 的编码"""
+    for item in header.split(','):
+        name, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            yield name.strip().lower()
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    accepted = set(_accepted_encodings(accept_encoding))
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def json_response(request: Request, content: Any, status_code: int = 200) -> Response:
+    """编码为 JSON，超过阈值且客户端支持时压缩"""
+    with timing.span('serialize'):
+        body = dumps(content)
+    headers = {'Vary': 'Accept-Encoding'}
+    min_size = get_settings().compression_min_size
+    if min_size and len(body) >= min_size:
+        encoding = choose_encoding(request.headers.get('accept-encoding', ''))
+        if encoding is not None:
+            with timing.span('compress'):
+                # 中等压缩级别：大列表上压缩率接近最高级别，CPU 开销小得多
+                body = brotli.compress(body, quality=4) if encoding == 'br' else gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = encoding
+    return Response(content=body, status_code=status_code, media_type='application/json', headers=headers)
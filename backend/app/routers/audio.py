@@ -0,0 +1,16 @@
+from fastapi import APIRouter, HTTPException, Query
+
+from app.container import services
+from app.schemas import AudioJobResponse
+
+router = APIRouter(prefix='/api/audio', tags=['audio'])
+
+
+@router.get('/jobs/{job_id}', response_model=AudioJobResponse)
+async def get_audio_job(job_id: str, wait: float = Query(0, ge=0, le=60)) -> AudioJobResponse:
+  """查询异步音频任务，wait > 0 时长轮询直到任务完成或超时"""
+  job = services.audio_jobs.get(job_id)
+  if job is None:
+    raise HTTPException(status_code=404, detail='音频任务不存在或已过期')
+  job = await services.audio_jobs.wait(job, wait)
+  return AudioJobResponse(id=job.id, status=job.status, audioBase64=job.audio_base64, error=job.error)
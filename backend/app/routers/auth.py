@@ -2,7 +2,7 @@ from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.database import assign_shard, get_db, register_shard_user
 from app.models import User
 from app.schemas_auth import UserRegister, UserLogin, Token, UserResponse, UserUpdate
 from app.auth import (
@@ -43,6 +43,11 @@ def register(user_data: UserRegister, db: Session = Depends(get_db)):
         hashed_password=hashed_password,
     )
     db.add(new_user)
+    db.flush()
+    # 开启分片时新用户直接放入目标分片；先在分片库登记，主库提交失败只会留下无害的占位行
+    new_user.shard = assign_shard(new_user.id)
+    if new_user.shard is not None:
+        register_shard_user(new_user.shard, new_user.id)
     db.commit()
     db.refresh(new_user)
     
@@ -1,23 +1,105 @@
-from fastapi import APIRouter
+import asyncio
+import logging
+from typing import AsyncIterator
 
-from app.schemas import ChatRequest, ChatResponse
-from app.services.gemini import gemini_service
-from app.services.voicevox import voicevox_service
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+
+from app import timing
+from app.container import services
+from app.schemas import ChatRequest, ChatResponse, ChatStreamEvent, Feedback
+from app.services import conversation, scheduler
+from app.services.audio_profiles import AudioProfile, get_profile
+from app.services.speech import synthesize
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix='/api', tags=['chat'])
 
 
 @router.post('/chat', response_model=ChatResponse)
-async def chat(payload: ChatRequest) -> ChatResponse:
-  data = gemini_service.chat(payload)
-  
-  # 使用 VOICEVOX 生成 AI 回复的音频
+async def chat(payload: ChatRequest, profile: AudioProfile = Depends(get_profile)) -> ChatResponse:
+  with scheduler.classify(scheduler.Priority.INTERACTIVE, f'session:{payload.session_id}'):
+    return await _chat(payload, profile)
+
+
+async def _chat(payload: ChatRequest, profile: AudioProfile) -> ChatResponse:
+  data, feedback = await conversation.wait_reply(payload)
+  data['feedback'] = await feedback
+
+  # 使用 VOICEVOX 生成 AI 回复的音频（熔断时立即跳过或降级到 Gemini TTS）
   if 'reply' in data:
+    if payload.async_audio:
+      # 先返回文本，音频交给后台任务，客户端凭 audioJobId 获取
+      try:
+        data['audioJobId'] = services.audio_jobs.submit(data['reply'], profile).id
+      except Exception as e:
+        logger.warning("Audio job submission failed in chat: %s", e)
+      data['audioBase64'] = None
+    else:
+      try:
+        data['audioBase64'] = await synthesize(data['reply'], profile)
+      except Exception as e:
+        logger.warning("VOICEVOX TTS generation failed in chat: %s", e)
+        # 即使 TTS 失败也继续返回文本响应
+        data['audioBase64'] = None
+
+  with timing.span('validate'):
+    return ChatResponse.model_validate(data)
+
+
+@router.post('/chat/stream')
+async def chat_stream(payload: ChatRequest, profile: AudioProfile = Depends(get_profile)) -> StreamingResponse:
+  """与 /api/chat 相同，但以 NDJSON 逐行返回：回复就绪立即输出 reply 行，随后是 feedback 行，
+  同步音频（asyncAudio=false）时最后是 audio 行。回复生成失败时直接返回错误状态码。"""
+  # 反馈与音频任务在此创建，继承对话的调度类别
+  with scheduler.classify(scheduler.Priority.INTERACTIVE, f'session:{payload.session_id}'):
+    return await _chat_stream(payload, profile)
+
+
+async def _chat_stream(payload: ChatRequest, profile: AudioProfile) -> StreamingResponse:
+  data, feedback = await conversation.wait_reply(payload)
+  reply = data.get('reply')
+  if not isinstance(reply, str) or not isinstance(data.get('replyTranslation'), str):
+    conversation.discard(feedback)
+    raise HTTPException(status_code=502, detail='AI 返回格式错误')
+
+  first = ChatStreamEvent(type='reply', reply=reply, replyTranslation=data['replyTranslation'], model=data.get('model'))
+  audio: asyncio.Future | None = None
+  if payload.async_audio:
     try:
-      data['audioBase64'] = await voicevox_service.tts(data['reply'])
+      first.audioJobId = services.audio_jobs.submit(reply, profile).id
     except Exception as e:
-      print(f"VOICEVOX TTS generation failed in chat: {e}")
-      # 即使 TTS 失败也继续返回文本响应
-      data['audioBase64'] = None
-  
-  return ChatResponse.model_validate(data)
+      logger.warning("Audio job submission failed in chat: %s", e)
+  else:
+    # 与反馈并行合成
+    audio = asyncio.ensure_future(synthesize(reply, profile))
+
+  async def stream() -> AsyncIterator[str]:
+    try:
+      yield first.model_dump_json(exclude_none=True) + '\n'
+      try:
+        event = ChatStreamEvent(type='feedback', feedback=Feedback.model_validate(await feedback))
+      except (HTTPException, ValidationError) as exc:
+        detail = exc.detail if isinstance(exc, HTTPException) else 'AI 返回格式错误'
+        event = ChatStreamEvent(type='error', detail=f'纠错反馈生成失败: {detail}')
+      except Exception as exc:
+        logger.warning("Feedback generation failed in chat stream: %s", exc)
+        event = ChatStreamEvent(type='error', detail='纠错反馈生成失败')
+      yield event.model_dump_json(exclude_none=True) + '\n'
+      if audio is not None:
+        try:
+          audio_base64 = await audio
+        except Exception as e:
+          logger.warning("VOICEVOX TTS generation failed in chat: %s", e)
+          audio_base64 = None
+        yield ChatStreamEvent(type='audio', audioBase64=audio_base64).model_dump_json(include={'type', 'audioBase64'}) + '\n'
+    finally:
+      # 客户端提前断开：反馈仍写入缓存，未完成的音频合成取消
+      conversation.discard(feedback)
+      if audio is not None and not audio.done():
+        audio.cancel()
+        conversation.discard(audio)
+
+  return StreamingResponse(stream(), media_type='application/x-ndjson')
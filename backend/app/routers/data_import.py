@@ -0,0 +1,59 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.auth import get_current_active_user
+from app.config import get_settings
+from app.database import get_db
+from app.models import User
+from app.schemas_db import ImportSummary
+from app.services import data_import
+
+router = APIRouter(prefix='/api/import', tags=['import'])
+
+
+@router.post('', response_model=ImportSummary)
+async def import_data(
+    request: Request,
+    import_id: Optional[str] = Query(None, max_length=64, description='客户端生成的导入 ID，导入期间可用 GET /api/import/{import_id} 查询进度'),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """导入 NDJSON 格式的会话、消息与收藏（格式见 app/services/data_import.py），可重复执行"""
+    settings = get_settings()
+    summary = ImportSummary(import_id=import_id)
+    if import_id:
+        data_import.track(current_user.id, import_id, summary)
+    importer = data_import.Importer(db, current_user, summary)
+
+    line_no = 0
+    try:
+        async for line in data_import.iter_lines(request.stream(), settings.import_max_line_bytes):
+            line_no += 1
+            importer.add(line_no, line)
+            # 写入期间不再读取请求体，上传速度受数据库写入速度约束
+            if importer.pending >= importer.batch_size:
+                await run_in_threadpool(importer.flush)
+        await run_in_threadpool(importer.flush)
+    except data_import.LineTooLong as exc:
+        # 之前的批次已提交，修正后重新上传整个文件即可（已导入的记录会被跳过）
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"第 {line_no + 1} 行: {exc}",
+        )
+    summary.done = True
+    return summary
+
+
+@router.get('/{import_id}', response_model=ImportSummary)
+def get_import_progress(
+    import_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """查询导入进度（保留 1 小时）"""
+    summary = data_import.get_progress(current_user.id, import_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="导入记录不存在")
+    return summary
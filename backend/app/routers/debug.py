@@ -0,0 +1,46 @@
+import os
+import time
+
+import anyio
+import anyio.to_thread
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+
+from app import profiling
+from app.auth import get_admin_user
+from app.config import get_settings
+from app.database import get_db
+from app.models import User
+
+# 只在配置了 ADMIN_EMAILS 时由 app.main 注册
+router = APIRouter(prefix='/debug', tags=['debug'], include_in_schema=False)
+
+# 采样线程不占用同步路由的线程池
+_sampler_limiter = anyio.CapacityLimiter(1)
+
+
+@router.get('/profile', response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10.0, gt=0, description='采样时长（秒）'),
+    idle: bool = Query(False, description='是否包含空闲线程（等待 I/O、锁、任务）的栈'),
+    current_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db),
+):
+    """对当前 worker 进程采样 seconds 秒，返回 collapsed stacks（flamegraph.pl / speedscope 格式）"""
+    settings = get_settings()
+    if seconds > settings.profile_max_seconds:
+        raise HTTPException(status_code=400, detail=f"采样时长不能超过 {settings.profile_max_seconds:g} 秒")
+    # 采样期间不占用数据库连接
+    db.close()
+    try:
+        stacks, rounds = await anyio.to_thread.run_sync(
+            profiling.sample_stacks, seconds, settings.profile_interval, idle, limiter=_sampler_limiter,
+        )
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    filename = f'profile-{os.getpid()}-{int(time.time())}.folded'
+    return PlainTextResponse(profiling.collapsed(stacks), headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Profile-Samples': str(rounds),
+    })
@@ -1,27 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import delete, select
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from nanoid import generate
-from datetime import datetime
+from datetime import datetime, timezone
 
 from app.database import get_db
 from app.models import User, Favorite
-from app.schemas_db import FavoriteCreate, FavoriteUpdate, FavoriteResponse
+from app.schemas_db import BulkDeleteResponse, FavoriteCreate, FavoriteUpdate, FavoriteResponse
 from app.auth import get_current_active_user
+from app.responses import columns_for, json_response, rows_to_dicts
+from app.services import reminders, stats
 
 router = APIRouter(prefix='/api/favorites', tags=['favorites'])
 
+FAVORITE_COLUMNS = columns_for(Favorite, FavoriteResponse)
+
 
 @router.get('/', response_model=List[FavoriteResponse])
 def get_favorites(
+    request: Request,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """获取当前用户的所有收藏"""
-    favorites = db.query(Favorite).filter(
-        Favorite.user_id == current_user.id
-    ).order_by(Favorite.created_at.desc()).all()
-    return favorites
+    result = db.execute(
+        select(*FAVORITE_COLUMNS)
+        .where(Favorite.user_id == current_user.id)
+        .order_by(Favorite.created_at.desc())
+    )
+    return json_response(request, rows_to_dicts(result))
 
 
 @router.post('/', response_model=FavoriteResponse, status_code=status.HTTP_201_CREATED)
@@ -36,14 +44,49 @@ def create_favorite(
         user_id=current_user.id,
         text=favorite_data.text,
         translation=favorite_data.translation,
-        source=favorite_data.source
+        source=favorite_data.source,
+        due_at=reminders.next_due('new', datetime.utcnow(), None),
     )
     db.add(new_favorite)
+    stats.record_favorite_added(db, current_user)
     db.commit()
     db.refresh(new_favorite)
     return new_favorite
 
 
+@router.delete('/', response_model=BulkDeleteResponse)
+def delete_favorites(
+    ids: Optional[List[str]] = Query(None, description='收藏 ID，可重复或用逗号分隔'),
+    mastery: Optional[str] = Query(None, description='熟悉度，如 mastered'),
+    source: Optional[str] = Query(None, description="来源：'reply'、'feedback'、'selection'"),
+    before: Optional[datetime] = Query(None, description='只删除此时间（UTC）之前创建的收藏'),
+    all: bool = Query(False, description='删除当前用户的全部收藏'),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """按条件批量删除收藏（条件之间为 AND），一条 DELETE 语句完成"""
+    conditions = []
+    if ids:
+        conditions.append(Favorite.id.in_([i for value in ids for i in value.split(',') if i]))
+    if mastery is not None:
+        conditions.append(Favorite.mastery == mastery)
+    if source is not None:
+        conditions.append(Favorite.source == source)
+    if before is not None:
+        if before.tzinfo is not None:
+            before = before.astimezone(timezone.utc).replace(tzinfo=None)
+        conditions.append(Favorite.created_at < before)
+    if not conditions and not all:
+        raise HTTPException(status_code=400, detail="请至少指定一个筛选条件，或使用 all=true 清空全部收藏")
+
+    deleted = db.execute(
+        delete(Favorite).where(Favorite.user_id == current_user.id, *conditions),
+        execution_options={'synchronize_session': False},
+    ).rowcount
+    db.commit()
+    return BulkDeleteResponse(deleted=deleted)
+
+
 @router.put('/{favorite_id}', response_model=FavoriteResponse)
 def update_favorite(
     favorite_id: str,
@@ -60,12 +103,18 @@ def update_favorite(
     if not favorite:
         raise HTTPException(status_code=404, detail="收藏不存在")
     
+    reviewed = False
     if favorite_data.mastery is not None:
         favorite.mastery = favorite_data.mastery
     if favorite_data.review_count is not None:
+        reviewed = favorite_data.review_count > (favorite.review_count or 0)
         favorite.review_count = favorite_data.review_count
     if favorite_data.last_reviewed_at is not None:
         favorite.last_reviewed_at = datetime.utcnow()
+        reviewed = True
+    if reviewed:
+        stats.record_favorite_reviewed(db, current_user)
+    favorite.due_at = reminders.next_due(favorite.mastery, favorite.created_at, favorite.last_reviewed_at)
     
     db.commit()
     db.refresh(favorite)
@@ -79,14 +128,16 @@ def delete_favorite(
     db: Session = Depends(get_db)
 ):
     """删除收藏"""
-    favorite = db.query(Favorite).filter(
-        Favorite.id == favorite_id,
-        Favorite.user_id == current_user.id
-    ).first()
+    deleted = db.execute(
+        delete(Favorite).where(
+            Favorite.id == favorite_id,
+            Favorite.user_id == current_user.id
+        ),
+        execution_options={'synchronize_session': False},
+    ).rowcount
     
-    if not favorite:
+    if not deleted:
         raise HTTPException(status_code=404, detail="收藏不存在")
     
-    db.delete(favorite)
     db.commit()
     return None
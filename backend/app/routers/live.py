@@ -0,0 +1,366 @@
+"""WebSocket 实时对话通道：WS /api/sessions/{session_id}/live
+
+连接时认证一次（?token= 或 Authorization 头）并加载会话最近的消息，之后客户端每轮只发送
+用户输入，服务端在同一连接上推送回复增量、纠错反馈、分句语音和消息保存确认（见 LiveEvent）。
+
+- 每个连接按顺序逐轮处理，最多排队 live_max_pending_turns 轮，超出时以 error 事件拒绝
+- 待发送事件进入有界队列：队列满时回复增量合并到下一次发送，其余事件最多等待
+  live_send_timeout 秒，仍无法入队视为客户端接收过慢并断开（1008）
+- 没有回合进行且 live_idle_timeout 秒未收到消息（含 ping）时正常关闭（1000）
+- 每个 worker 最多 live_max_connections 个连接，超出时以 1013 关闭
+"""
+import asyncio
+import base64
+import logging
+from datetime import datetime
+from typing import Any
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from nanoid import generate
+from pydantic import ValidationError
+from sqlalchemy import select, update
+
+from app import metrics
+from app.auth import user_for_token
+from app.config import get_settings
+from app.database import SessionLocal, shard_session
+from app.models import Message, Session as DBSession, User
+from app.schemas import ChatRequest, Feedback, LiveClientMessage, LiveEvent
+from app.services import conversation, scheduler, stats
+from app.services.audio import concat_wavs, split_sentences
+from app.services.audio_profiles import STANDARD, AudioProfile, encode_base64, resolve_profile
+from app.services.speech import synthesize
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix='/api/sessions', tags=['live'])
+
+_connections = 0
+
+
+class LiveRejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class SlowConsumer(Exception):
+    """发送队列长时间已满，客户端没有及时接收"""
+
+
+def _load(token: str, session_id: str, history_size: int) -> tuple[User, str, list[dict[str, str]]]:
+    """认证并加载会话风格与最近的消息；返回的 User 已脱离数据库会话，只读取已加载的列"""
+    db = SessionLocal()
+    try:
+        user = user_for_token(token, db)
+        if user is None or not user.is_active:
+            raise LiveRejected('无效的认证凭据')
+        style = db.execute(
+            select(DBSession.conversation_style).where(DBSession.id == session_id, DBSession.user_id == user.id)
+        ).scalar()
+        if style is None:
+            raise LiveRejected('会话不存在')
+        rows = db.execute(
+            select(Message.role, Message.content)
+            .where(Message.session_id == session_id)
+            .order_by(Message.created_at.desc())
+            .limit(history_size)
+        ).all()
+        return user, style, [{'role': role, 'content': content} for role, content in reversed(rows)]
+    finally:
+        db.close()
+
+
+def _save_message(user: User, session_id: str, role: str, content: str, **fields: Any) -> str:
+    """与 POST /api/sessions/{id}/messages 相同：保存消息并在同一事务中更新学习统计"""
+    db = shard_session(user.shard)
+    try:
+        message_id = generate(size=21)
+        db.add(Message(id=message_id, session_id=session_id, role=role, content=content, **fields))
+        db.execute(update(DBSession).where(DBSession.id == session_id).values(updated_at=datetime.utcnow()))
+        stats.record_message(db, user, role, fields.get('feedback'))
+        db.commit()
+        return message_id
+    finally:
+        db.close()
+
+
+def _attach_audio(shard: int | None, message_id: str, audio_base64: str) -> None:
+    db = shard_session(shard)
+    try:
+        db.execute(update(Message).where(Message.id == message_id).values(audio_base64=audio_base64))
+        db.commit()
+    finally:
+        db.close()
+
+
+class LiveConnection:
+    def __init__(
+        self, websocket: WebSocket, user: User, session_id: str, style: str, history: list[dict[str, str]],
+        profile: AudioProfile = STANDARD,
+    ):
+        settings = get_settings()
+        self.websocket = websocket
+        self.profile = profile
+        self.user = user
+        self.session_id = session_id
+        self.style = style
+        self.history = history
+        self.history_size = settings.live_history_messages
+        self.send_timeout = settings.live_send_timeout
+        self.outbox: asyncio.Queue[str] = asyncio.Queue(settings.live_send_queue_size)
+        self.loop = asyncio.get_running_loop()
+        self.turns: asyncio.Queue[tuple[str, str, bool]] = asyncio.Queue(settings.live_max_pending_turns)
+        self.busy = False
+        self.worker: asyncio.Task | None = None
+        self.writer: asyncio.Task | None = None
+        # 正在流式输出的回合及已推送的回复文本
+        self._streaming: str | None = None
+        self._streamed = ''
+
+    async def send(self, event: LiveEvent) -> None:
+        try:
+            await asyncio.wait_for(self.outbox.put(event.model_dump_json(exclude_none=True)), self.send_timeout)
+        except asyncio.TimeoutError:
+            raise SlowConsumer from None
+
+    def push_reply(self, turn_id: str, text: str) -> None:
+        """推送回复增量（在事件循环中执行）；队列满时不等待，下一次推送时合并"""
+        if turn_id != self._streaming:
+            return
+        reset = not text.startswith(self._streamed)
+        delta = text if reset else text[len(self._streamed):]
+        if not delta and not reset:
+            return
+        event = LiveEvent(type='reply_delta', turnId=turn_id, delta=delta, reset=reset or None)
+        try:
+            self.outbox.put_nowait(event.model_dump_json(exclude_none=True))
+        except asyncio.QueueFull:
+            metrics.live_deltas_coalesced.inc()
+            return
+        self._streamed = text
+
+    async def write(self) -> None:
+        while True:
+            await self.websocket.send_text(await self.outbox.get())
+
+    async def work(self) -> None:
+        # 回合中的上游调用（含其中创建的任务）都按该用户的对话排队
+        with scheduler.classify(scheduler.Priority.INTERACTIVE, f'user:{self.user.id}'):
+            while True:
+                turn = await self.turns.get()
+                self.busy = True
+                try:
+                    await self.run_turn(*turn)
+                finally:
+                    self.busy = False
+
+    async def close(self, code: int, reason: str) -> None:
+        if self.writer is not None:
+            self.writer.cancel()
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except RuntimeError:
+            pass  # 连接已关闭
+
+    async def serve(self) -> None:
+        """接收循环：分发回合与 ping，处理空闲超时；客户端断开时抛出 WebSocketDisconnect"""
+        settings = get_settings()
+        self.writer = asyncio.ensure_future(self.write())
+        self.worker = asyncio.ensure_future(self.work())
+        await self.send(LiveEvent(type='ready', sessionId=self.session_id))
+        while True:
+            try:
+                frame = await asyncio.wait_for(self.websocket.receive(), settings.live_idle_timeout)
+            except asyncio.TimeoutError:
+                if self.busy or not self.turns.empty():
+                    continue
+                await self.close(status.WS_1000_NORMAL_CLOSURE, 'idle timeout')
+                return
+            if frame['type'] == 'websocket.disconnect':
+                raise WebSocketDisconnect(frame.get('code', status.WS_1000_NORMAL_CLOSURE))
+
+            try:
+                message = LiveClientMessage.model_validate_json(frame.get('text') or frame.get('bytes') or b'')
+            except ValidationError:
+                await self.send(LiveEvent(type='error', detail='消息格式错误'))
+                continue
+            if message.type == 'ping':
+                await self.send(LiveEvent(type='pong', turnId=message.turnId))
+                continue
+
+            turn_id = message.turnId or generate(size=10)
+            content = message.content.strip()
+            if not content or len(content) > settings.live_max_turn_chars:
+                await self.send(LiveEvent(
+                    type='error', turnId=turn_id, detail=f'输入不能为空且不超过 {settings.live_max_turn_chars} 字',
+                ))
+                continue
+            try:
+                self.turns.put_nowait((turn_id, content, message.audio))
+            except asyncio.QueueFull:
+                metrics.live_turns.labels(result='busy').inc()
+                await self.send(LiveEvent(type='error', turnId=turn_id, detail='待处理的输入过多，请等待回复'))
+
+    async def run_turn(self, turn_id: str, content: str, with_audio: bool) -> None:
+        turn = {'role': 'user', 'content': content}
+        payload = ChatRequest(
+            sessionId=self.session_id, messages=[*self.history, turn][-self.history_size:], style=self.style,
+        )
+
+        self._streaming, self._streamed = turn_id, ''
+
+        def on_reply(text: str) -> None:
+            self.loop.call_soon_threadsafe(self.push_reply, turn_id, text)
+
+        generation = asyncio.ensure_future(conversation.wait_reply(payload, on_reply))
+        audio: asyncio.Future | None = None
+        try:
+            message_id = await run_in_threadpool(_save_message, self.user, self.session_id, 'user', content)
+            await self.send(LiveEvent(type='persisted', turnId=turn_id, role='user', messageId=message_id))
+
+            data, feedback = await generation
+            self._streaming = None
+            reply, translation = data.get('reply'), data.get('replyTranslation')
+            if not isinstance(reply, str) or not isinstance(translation, str):
+                conversation.discard(feedback)
+                raise HTTPException(status_code=502, detail='AI 返回格式错误')
+            await self.send(LiveEvent(
+                type='reply', turnId=turn_id, reply=reply, replyTranslation=translation, model=data.get('model'),
+            ))
+            # 回复成功后才写入对话记录：失败或超时的回合不会以孤立的用户消息出现在下一轮
+            self.history += [turn, {'role': 'assistant', 'content': reply}]
+            del self.history[:-self.history_size]
+            if with_audio:
+                # 与反馈、保存并行合成
+                audio = asyncio.ensure_future(self.stream_audio(turn_id, reply))
+
+            try:
+                feedback_data = Feedback.model_validate(await feedback).model_dump()
+                await self.send(LiveEvent(type='feedback', turnId=turn_id, feedback=feedback_data))
+            except (HTTPException, ValidationError) as exc:
+                detail = exc.detail if isinstance(exc, HTTPException) else 'AI 返回格式错误'
+                feedback_data = None
+                await self.send(LiveEvent(type='error', turnId=turn_id, detail=f'纠错反馈生成失败: {detail}'))
+
+            message_id = await run_in_threadpool(
+                _save_message, self.user, self.session_id, 'assistant', reply,
+                translation=translation, feedback=feedback_data, model=data.get('model'),
+            )
+            await self.send(LiveEvent(type='persisted', turnId=turn_id, role='assistant', messageId=message_id))
+
+            if audio is not None:
+                audio_base64 = await audio
+                if audio_base64:
+                    await run_in_threadpool(_attach_audio, self.user.shard, message_id, audio_base64)
+            await self.send(LiveEvent(type='done', turnId=turn_id))
+        except SlowConsumer:
+            metrics.live_turns.labels(result='error').inc()
+            await self.close(status.WS_1008_POLICY_VIOLATION, '客户端接收过慢')
+            return
+        except HTTPException as exc:
+            metrics.live_turns.labels(result='error').inc()
+            await self._report(turn_id, str(exc.detail))
+            return
+        except Exception as exc:
+            metrics.live_turns.labels(result='error').inc()
+            logger.warning("Live turn failed: %s", exc)
+            await self._report(turn_id, '本轮处理失败')
+            return
+        finally:
+            self._streaming = None
+            if not generation.done():
+                generation.cancel()
+            if audio is not None and not audio.done():
+                audio.cancel()
+                conversation.discard(audio)
+        metrics.live_turns.labels(result='ok').inc()
+
+    async def _report(self, turn_id: str, detail: str) -> None:
+        """回合失败：发送 error 与 done"""
+        try:
+            await self.send(LiveEvent(type='error', turnId=turn_id, detail=detail))
+            await self.send(LiveEvent(type='done', turnId=turn_id))
+        except SlowConsumer:
+            await self.close(status.WS_1008_POLICY_VIOLATION, '客户端接收过慢')
+
+    async def stream_audio(self, turn_id: str, reply: str) -> str | None:
+        """逐句合成（并行）并按顺序推送，首句合成完即可播放；返回拼接后的整段原始音频用于保存
+
+        按连接的档位推送；保存的音频始终是 standard，其它设备也能播放。
+        """
+        tasks = [
+            asyncio.ensure_future(self.synthesize_sentence(sentence)) for sentence in split_sentences(reply, 1)
+        ]
+        wavs: list[bytes] = []
+        try:
+            for seq, task in enumerate(tasks):
+                try:
+                    standard, audio_base64 = await task
+                except Exception as exc:
+                    logger.warning("VOICEVOX TTS generation failed in live turn: %s", exc)
+                    await self.send(LiveEvent(type='error', turnId=turn_id, detail='语音合成失败'))
+                    return None
+                wavs.append(base64.b64decode(standard))
+                await self.send(LiveEvent(
+                    type='audio', turnId=turn_id, seq=seq, audioBase64=audio_base64, final=seq == len(tasks) - 1,
+                ))
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                conversation.discard(task)
+        try:
+            return base64.b64encode(concat_wavs(wavs)).decode('ascii')
+        except ValueError:
+            return None
+
+    async def synthesize_sentence(self, sentence: str) -> tuple[str, str]:
+        """返回（原始音频，按档位转换后的音频）"""
+        standard = await synthesize(sentence)
+        return standard, await run_in_threadpool(encode_base64, standard, self.profile)
+
+
+def _bearer(websocket: WebSocket) -> str:
+    scheme, _, credentials = websocket.headers.get('authorization', '').partition(' ')
+    return credentials if scheme.lower() == 'bearer' else ''
+
+
+@router.websocket('/{session_id}/live')
+async def live(websocket: WebSocket, session_id: str, token: str = '', profile: str = 'standard', codecs: str = ''):
+    """实时对话通道，事件格式见 LiveClientMessage / LiveEvent；profile 为语音档位，codecs 见 resolve_profile"""
+    global _connections
+    settings = get_settings()
+    await websocket.accept()
+    if _connections >= settings.live_max_connections:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason='连接数已满')
+        return
+    try:
+        audio_profile = resolve_profile(profile, codecs)
+    except ValueError as exc:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(exc))
+        return
+    try:
+        user, style, history = await run_in_threadpool(
+            _load, token or _bearer(websocket), session_id, settings.live_history_messages
+        )
+    except LiveRejected as exc:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=exc.reason)
+        return
+
+    connection = LiveConnection(websocket, user, session_id, style, history, audio_profile)
+    _connections += 1
+    metrics.live_connections.inc()
+    try:
+        await connection.serve()
+    except WebSocketDisconnect:
+        pass
+    except SlowConsumer:
+        await connection.close(status.WS_1008_POLICY_VIOLATION, '客户端接收过慢')
+    finally:
+        _connections -= 1
+        metrics.live_connections.dec()
+        for task in (connection.worker, connection.writer):
+            if task is not None and not task.done():
+                task.cancel()
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import delete, select
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from nanoid import generate
+from datetime import datetime
 
 from app.database import get_db
 from app.models import User, Session as DBSession, Message, Favorite
 from app.schemas_db import (
+    BulkDeleteResponse,
     SessionCreate,
     SessionTitleUpdate,
     SessionResponse,
@@ -17,18 +20,30 @@ from app.schemas_db import (
     FavoriteResponse,
 )
 from app.auth import get_current_active_user
+from app.container import services
+from app.responses import columns_for, json_response, rows_to_dicts
+from app.services import stats
 
 router = APIRouter(prefix='/api/sessions', tags=['sessions'])
 
+# 列表与详情接口直接查询所需列并用 orjson 编码（见 app/responses.py）
+SESSION_COLUMNS = columns_for(DBSession, SessionResponse)
+MESSAGE_COLUMNS = columns_for(Message, MessageResponse)
+
 
 @router.get('/', response_model=List[SessionResponse])
 def get_sessions(
+    request: Request,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """获取当前用户的所有会话"""
-    sessions = db.query(DBSession).filter(DBSession.user_id == current_user.id).order_by(DBSession.updated_at.desc()).all()
-    return sessions
+    result = db.execute(
+        select(*SESSION_COLUMNS)
+        .where(DBSession.user_id == current_user.id)
+        .order_by(DBSession.updated_at.desc())
+    )
+    return json_response(request, rows_to_dicts(result))
 
 
 @router.post('/', response_model=SessionResponse, status_code=status.HTTP_201_CREATED)
@@ -50,22 +65,49 @@ def create_session(
     return new_session
 
 
+@router.delete('/', response_model=BulkDeleteResponse)
+def delete_sessions(
+    ids: Optional[List[str]] = Query(None, description='要删除的会话 ID，可重复或用逗号分隔'),
+    all: bool = Query(False, description='删除当前用户的全部会话'),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """批量删除会话：一条 DELETE 语句，消息由外键 ON DELETE CASCADE 删除"""
+    stmt = delete(DBSession).where(DBSession.user_id == current_user.id)
+    if ids:
+        stmt = stmt.where(DBSession.id.in_([i for value in ids for i in value.split(',') if i]))
+    elif not all:
+        raise HTTPException(status_code=400, detail="请指定 ids，或使用 all=true 清空全部会话")
+    deleted = db.execute(stmt, execution_options={'synchronize_session': False}).rowcount
+    db.commit()
+    return BulkDeleteResponse(deleted=deleted)
+
+
 @router.get('/{session_id}', response_model=SessionWithMessages)
 def get_session(
     session_id: str,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """获取指定会话及其消息"""
-    session = db.query(DBSession).filter(
-        DBSession.id == session_id,
-        DBSession.user_id == current_user.id
-    ).first()
+    sessions = rows_to_dicts(db.execute(
+        select(*SESSION_COLUMNS).where(
+            DBSession.id == session_id,
+            DBSession.user_id == current_user.id
+        )
+    ))
     
-    if not session:
+    if not sessions:
         raise HTTPException(status_code=404, detail="会话不存在")
     
-    return session
+    session = sessions[0]
+    session['messages'] = rows_to_dicts(db.execute(
+        select(*MESSAGE_COLUMNS)
+        .where(Message.session_id == session_id)
+        .order_by(Message.created_at)
+    ))
+    return json_response(request, session)
 
 
 @router.delete('/{session_id}', status_code=status.HTTP_204_NO_CONTENT)
@@ -74,16 +116,18 @@ def delete_session(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """删除会话"""
-    session = db.query(DBSession).filter(
-        DBSession.id == session_id,
-        DBSession.user_id == current_user.id
-    ).first()
+    """删除会话（不加载消息，由数据库级联删除）"""
+    deleted = db.execute(
+        delete(DBSession).where(
+            DBSession.id == session_id,
+            DBSession.user_id == current_user.id
+        ),
+        execution_options={'synchronize_session': False},
+    ).rowcount
     
-    if not session:
+    if not deleted:
         raise HTTPException(status_code=404, detail="会话不存在")
     
-    db.delete(session)
     db.commit()
     return None
 
@@ -127,16 +171,29 @@ def add_message(
     if not session:
         raise HTTPException(status_code=404, detail="会话不存在")
     
+    message_id = generate(size=21)
     new_message = Message(
-        id=generate(size=21),
+        id=message_id,
         session_id=session_id,
         role=message_data.role,
         content=message_data.content,
         translation=message_data.translation,
         feedback=message_data.feedback,
-        audio_base64=message_data.audio_base64
+        audio_base64=message_data.audio_base64,
+        model=message_data.model
     )
     db.add(new_message)
+    # 会话列表按 updated_at 排序，闲置归档也以此判断
+    session.updated_at = datetime.utcnow()
+    # 学习统计与消息在同一事务中提交
+    stats.record_message(db, current_user, message_data.role, message_data.feedback)
     db.commit()
+
+    if message_data.audio_job_id and not message_data.audio_base64:
+        # 消息提交后再关联任务：音频已合成则直接写入，否则由后台任务完成后回写（此时消息行一定存在）
+        audio_base64 = services.audio_jobs.attach(message_data.audio_job_id, message_id, current_user.shard)
+        if audio_base64:
+            new_message.audio_base64 = audio_base64
+            db.commit()
     db.refresh(new_message)
     return new_message
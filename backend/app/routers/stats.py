@@ -0,0 +1,65 @@
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.auth import get_current_active_user
+from app.database import get_db
+from app.models import User
+from app.schemas_db import DailyStats, StatsResponse
+from app.services import stats
+from app.timezone_utils import local_date
+
+router = APIRouter(prefix='/api/stats', tags=['stats'])
+
+MAX_RANGE_DAYS = 366
+
+
+def _daily(day: date, turns: int, score_count: int, score_sum: int, score_min: Optional[int],
+           score_max: Optional[int], favorites_added: int, favorites_reviewed: int) -> DailyStats:
+    return DailyStats(
+        day=day,
+        turns=turns,
+        average_score=round(score_sum / score_count, 1) if score_count else None,
+        min_score=score_min,
+        max_score=score_max,
+        favorites_added=favorites_added,
+        favorites_reviewed=favorites_reviewed,
+    )
+
+
+@router.get('', response_model=StatsResponse)
+def get_stats(
+    start: Optional[date] = Query(None, alias='from', description='开始日期（含），默认结束日期前 29 天'),
+    end: Optional[date] = Query(None, alias='to', description='结束日期（含），默认用户时区的今天'),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """按天返回学习统计（对话轮数、自然度分数、收藏新增与复习），只读取聚合表"""
+    end = end or local_date(datetime.utcnow(), current_user.timezone)
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="开始日期不能晚于结束日期")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"查询区间不能超过 {MAX_RANGE_DAYS} 天")
+
+    rows = {row.day: row for row in stats.get_daily_stats(db, current_user.id, start, end)}
+    days = []
+    totals = dict(turns=0, score_count=0, score_sum=0, score_min=None, score_max=None,
+                  favorites_added=0, favorites_reviewed=0)
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        row = rows.get(day)
+        if row is None:
+            days.append(DailyStats(day=day))
+            continue
+        days.append(_daily(day, row.turns, row.score_count, row.score_sum, row.score_min, row.score_max,
+                           row.favorites_added, row.favorites_reviewed))
+        for name in stats.COUNTERS:
+            totals[name] += getattr(row, name)
+        if row.score_min is not None:
+            totals['score_min'] = row.score_min if totals['score_min'] is None else min(totals['score_min'], row.score_min)
+            totals['score_max'] = row.score_max if totals['score_max'] is None else max(totals['score_max'], row.score_max)
+
+    return StatsResponse(start_date=start, end_date=end, days=days, totals=_daily(end, **totals))
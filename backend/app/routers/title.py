@@ -1,12 +1,15 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 
+from app.container import services
 from app.schemas import TitleRequest, TitleResponse
-from app.services.gemini import gemini_service
+from app.services import scheduler
 
 router = APIRouter(prefix='/api', tags=['title'])
 
 
 @router.post('/title', response_model=TitleResponse)
-async def summarize(payload: TitleRequest) -> TitleResponse:
-  title = gemini_service.title(payload.transcript)
+async def summarize(payload: TitleRequest, request: Request) -> TitleResponse:
+  # Gemini SDK 是同步调用：经调度器排队后在线程池中执行，不阻塞事件循环
+  with scheduler.classify(scheduler.Priority.TITLE, f'ip:{request.client.host if request.client else "-"}'):
+    title = await services.scheduler.gemini(services.gemini.title, payload.transcript)
   return TitleResponse(title=title)
@@ -1,12 +1,67 @@
-from fastapi import APIRouter
+from typing import AsyncIterator
 
-from app.schemas import TtsRequest, TtsResponse
-from app.services.voicevox import voicevox_service
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.auth import get_current_active_user
+from app.config import get_settings
+from app.database import get_db
+from app.models import Favorite, User
+from app.schemas import TtsBatchItem, TtsBatchRequest, TtsRequest, TtsResponse
+from app.services import scheduler, speech
+from app.services.audio_profiles import AudioProfile, get_profile
 
 router = APIRouter(prefix='/api', tags=['tts'])
 
 
 @router.post('/tts', response_model=TtsResponse)
-async def synthesize(payload: TtsRequest) -> TtsResponse:
-  audio = await voicevox_service.tts(payload.text)
+async def synthesize(
+  payload: TtsRequest,
+  request: Request,
+  profile: AudioProfile = Depends(get_profile),
+) -> TtsResponse:
+  with scheduler.classify(scheduler.Priority.TTS, f'ip:{request.client.host if request.client else "-"}'):
+    audio = await speech.synthesize(payload.text, profile)
   return TtsResponse(audioBase64=audio)
+
+
+@router.post('/tts/batch')
+async def synthesize_batch(
+  payload: TtsBatchRequest,
+  current_user: User = Depends(get_current_active_user),
+  db: Session = Depends(get_db),
+  profile: AudioProfile = Depends(get_profile),
+) -> StreamingResponse:
+  """批量合成（如抽认卡整组预取），以 NDJSON 按完成顺序逐行返回"""
+  favorite_ids_by_text: dict[str, list[str]] = {}
+  if payload.favoriteIds:
+    rows = db.query(Favorite.id, Favorite.text).filter(
+      Favorite.user_id == current_user.id,
+      Favorite.id.in_(payload.favoriteIds),
+    ).all()
+    for favorite_id, text in rows:
+      favorite_ids_by_text.setdefault(text, []).append(favorite_id)
+
+  # 去重并保持请求顺序
+  texts = [text for text in dict.fromkeys([*payload.texts, *favorite_ids_by_text]) if text.strip()]
+  limit = get_settings().tts_batch_max_items
+  if len(texts) > limit:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail=f'单次最多合成 {limit} 条',
+    )
+
+  async def stream() -> AsyncIterator[str]:
+    # 预取让位于对话与按需播放，排队过久的条目以 error 返回
+    with scheduler.classify(scheduler.Priority.BACKGROUND, f'user:{current_user.id}'):
+      async for text, audio, error in speech.synthesize_many(texts, profile):
+        item = TtsBatchItem(
+          text=text,
+          favoriteIds=favorite_ids_by_text.get(text, []),
+          audioBase64=audio,
+          error=error,
+        )
+        yield item.model_dump_json() + '\n'
+
+  return StreamingResponse(stream(), media_type='application/x-ndjson')
@@ -16,6 +16,10 @@ class ChatRequest(BaseModel):
   session_id: str = Field(..., alias='sessionId')
   messages: list[Message]
   style: ConversationStyle = 'casual'
+  async_audio: bool = Field(False, alias='asyncAudio')
+
+  def last_user_message(self) -> str:
+    return next((msg.content for msg in reversed(self.messages) if msg.role == 'user'), '')
 
 
 class Feedback(BaseModel):
@@ -29,6 +33,58 @@ class ChatResponse(BaseModel):
   replyTranslation: str
   feedback: Feedback
   audioBase64: str | None = None
+  audioJobId: str | None = None
+  model: str | None = None  # 生成回复的模型，保存消息时一并提交
+
+
+class ChatStreamEvent(BaseModel):
+  """/api/chat/stream 的一行：先 reply，随后 feedback 与 audio（同步音频时）"""
+  type: Literal['reply', 'feedback', 'audio', 'error']
+  reply: str | None = None
+  replyTranslation: str | None = None
+  feedback: Feedback | None = None
+  audioBase64: str | None = None
+  audioJobId: str | None = None
+  model: str | None = None
+  detail: str | None = None
+
+
+class LiveClientMessage(BaseModel):
+  """WebSocket 实时通道中客户端发送的消息：turn 为一轮用户输入，ping 用于保活"""
+  type: Literal['turn', 'ping']
+  turnId: str | None = Field(None, max_length=64)  # 客户端生成，原样出现在该轮的所有事件中
+  content: str = ''
+  audio: bool = True  # 是否按句推送回复语音
+
+
+class LiveEvent(BaseModel):
+  """WebSocket 实时通道中服务端推送的事件
+
+  每轮依次为：persisted(user) → reply_delta* → reply → feedback → persisted(assistant)，
+  audio 分句推送，与 feedback 和 persisted 交错，最后一段 final=true；每轮以 done 结束（包括失败时）。
+  """
+  type: Literal['ready', 'persisted', 'reply_delta', 'reply', 'feedback', 'audio', 'error', 'done', 'pong']
+  turnId: str | None = None
+  sessionId: str | None = None
+  delta: str | None = None
+  reset: bool | None = None  # 回复改由下一个模型重新生成，客户端应清空已显示的增量
+  reply: str | None = None
+  replyTranslation: str | None = None
+  model: str | None = None
+  feedback: Feedback | None = None
+  audioBase64: str | None = None
+  seq: int | None = None
+  final: bool | None = None
+  role: Literal['user', 'assistant'] | None = None
+  messageId: str | None = None
+  detail: str | None = None
+
+
+class AudioJobResponse(BaseModel):
+  id: str
+  status: Literal['pending', 'running', 'done', 'failed']
+  audioBase64: str | None = None
+  error: str | None = None
 
 
 class TtsRequest(BaseModel):
@@ -39,6 +95,18 @@ class TtsResponse(BaseModel):
   audioBase64: str
 
 
+class TtsBatchRequest(BaseModel):
+  texts: list[str] = []
+  favoriteIds: list[str] = []
+
+
+class TtsBatchItem(BaseModel):
+  text: str
+  favoriteIds: list[str] = []
+  audioBase64: str | None = None
+  error: str | None = None
+
+
 class TitleRequest(BaseModel):
   transcript: str
 
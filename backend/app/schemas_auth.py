@@ -1,6 +1,8 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 from typing import Optional
 
+from app.url_safety import check_push_url
+
 
 # 用户注册请求
 class UserRegister(BaseModel):
@@ -23,6 +25,14 @@ class UserUpdate(BaseModel):
     new_password: Optional[str] = None
     push_url: Optional[str] = None
 
+    @field_validator('push_url')
+    @classmethod
+    def validate_push_url(cls, v: Optional[str]) -> Optional[str]:
+        # 空字符串表示关闭提醒
+        if v:
+            return check_push_url(v.strip())
+        return v
+
 
 # Token 响应
 class Token(BaseModel):
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from pydantic.alias_generators import to_camel
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime, timezone
 
 
 # Session schemas
@@ -30,6 +31,8 @@ class MessageCreate(BaseModel):
     translation: Optional[str] = None
     feedback: Optional[dict] = None
     audio_base64: Optional[str] = None
+    audio_job_id: Optional[str] = None  # /api/chat 异步音频任务 ID，完成后自动回写音频
+    model: Optional[str] = None  # /api/chat 返回的 model
 
 
 class MessageResponse(BaseModel):
@@ -41,6 +44,7 @@ class MessageResponse(BaseModel):
     translation: Optional[str] = None
     feedback: Optional[dict] = None
     audio_base64: Optional[str] = None
+    model: Optional[str] = None
     created_at: datetime
 
 
@@ -73,3 +77,93 @@ class FavoriteResponse(BaseModel):
 # Session with messages
 class SessionWithMessages(SessionResponse):
     messages: List[MessageResponse] = []
+
+
+# Bulk delete
+class BulkDeleteResponse(BaseModel):
+    deleted: int
+
+
+# Stats schemas
+class DailyStats(BaseModel):
+    day: date
+    turns: int = 0
+    average_score: Optional[float] = None
+    min_score: Optional[int] = None
+    max_score: Optional[int] = None
+    favorites_added: int = 0
+    favorites_reviewed: int = 0
+
+
+class StatsResponse(BaseModel):
+    start_date: date
+    end_date: date
+    days: List[DailyStats]  # 区间内每天一项（没有数据的日期为 0）
+    totals: DailyStats  # day 为 end_date
+
+
+# Import schemas（NDJSON 每行一条记录，字段兼容前端 localStorage 的 camelCase 写法）
+class ImportRecord(BaseModel):
+    model_config = ConfigDict(alias_generator=to_camel, populate_by_name=True, extra='ignore')
+
+    @field_validator('*')
+    @classmethod
+    def _to_naive_utc(cls, value):
+        # 数据库统一保存无时区的 UTC 时间；毫秒时间戳由 pydantic 自动识别
+        if isinstance(value, datetime) and value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+
+class ImportMessage(ImportRecord):
+    id: str = Field(min_length=1, max_length=50)
+    session_id: Optional[str] = None  # 内嵌在会话中时可省略
+    role: str
+    content: str
+    translation: Optional[str] = None
+    feedback: Optional[dict] = None
+    audio_base64: Optional[str] = None
+    model: Optional[str] = Field(default=None, max_length=100)
+    created_at: Optional[datetime] = None
+
+
+class ImportSession(ImportRecord):
+    id: str = Field(min_length=1, max_length=50)
+    title: str = "新的对话"
+    conversation_style: str = "casual"
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    messages: List[ImportMessage] = []
+
+
+class ImportFavorite(ImportRecord):
+    id: str = Field(min_length=1, max_length=50)
+    text: str
+    translation: Optional[str] = None
+    source: str
+    mastery: str = "new"
+    review_count: int = 0
+    created_at: Optional[datetime] = None
+    last_reviewed_at: Optional[datetime] = None
+
+    @field_validator('source')
+    @classmethod
+    def _normalize_source(cls, value: str) -> str:
+        # 前端收藏来源为 'ai-reply' / 'ai-feedback'
+        return value.removeprefix('ai-')
+
+
+class ImportCounts(BaseModel):
+    inserted: int = 0
+    skipped: int = 0  # 已存在（重复导入）或归属其他用户
+
+
+class ImportSummary(BaseModel):
+    import_id: Optional[str] = None
+    done: bool = False
+    lines: int = 0
+    invalid: int = 0
+    sessions: ImportCounts = ImportCounts()
+    messages: ImportCounts = ImportCounts()
+    favorites: ImportCounts = ImportCounts()
+    errors: List[str] = []  # 最多 IMPORT_MAX_ERRORS 条，格式为 "第 N 行: 原因"
@@ -0,0 +1,87 @@
+"""WAV 音频工具"""
+from __future__ import annotations
+
+import re
+import struct
+from dataclasses import dataclass
+
+# 这个函数为原始 PCM 音频数据添加 WAV 头，以便于播放，如果需要的话可以调整采样率、通道数和采样宽度
+# 默认假设 Gemini 返回的是 24kHz 单声道 16位 PCM 数据
+# https://docs.fileformat.com/audio/wav/
+def add_wav_header(pcm_data: bytes, sample_rate: int = 24000, channels: int = 1, sample_width: int = 2) -> bytes:
+  header = b'RIFF'
+  header += struct.pack('<I', 36 + len(pcm_data))
+  header += b'WAVE'
+  header += b'fmt '
+  header += struct.pack('<I', 16)
+  header += struct.pack('<H', 1)
+  header += struct.pack('<H', channels)
+  header += struct.pack('<I', sample_rate)
+  header += struct.pack('<I', sample_rate * channels * sample_width)
+  header += struct.pack('<H', channels * sample_width)
+  header += struct.pack('<H', sample_width * 8)
+  header += b'data'
+  header += struct.pack('<I', len(pcm_data))
+  return header + pcm_data
+
+
+@dataclass
+class WavInfo:
+  sample_rate: int
+  channels: int
+  sample_width: int
+  pcm: bytes
+
+
+def parse_wav(wav_data: bytes) -> WavInfo:
+  """解析 PCM WAV，返回格式信息与 data 块内容（跳过 LIST 等附加块）"""
+  if wav_data[:4] != b'RIFF' or wav_data[8:12] != b'WAVE':
+    raise ValueError('不是有效的 WAV 数据')
+  offset = 12
+  fmt: tuple[int, int, int] | None = None
+  while offset + 8 <= len(wav_data):
+    chunk_id = wav_data[offset:offset + 4]
+    (chunk_size,) = struct.unpack('<I', wav_data[offset + 4:offset + 8])
+    body = wav_data[offset + 8:offset + 8 + chunk_size]
+    if chunk_id == b'fmt ':
+      _, channels, sample_rate, _, _, bits = struct.unpack('<HHIIHH', body[:16])
+      fmt = (sample_rate, channels, bits // 8)
+    elif chunk_id == b'data':
+      if fmt is None:
+        raise ValueError('WAV 缺少 fmt 块')
+      return WavInfo(sample_rate=fmt[0], channels=fmt[1], sample_width=fmt[2], pcm=body)
+    # 块按偶数字节对齐
+    offset += 8 + chunk_size + (chunk_size & 1)
+  raise ValueError('WAV 缺少 data 块')
+
+
+def concat_wavs(wavs: list[bytes]) -> bytes:
+  """按顺序拼接多段同格式 WAV，重写为单个 WAV 头"""
+  if len(wavs) == 1:
+    return wavs[0]
+  parts = [parse_wav(wav) for wav in wavs]
+  first = parts[0]
+  for part in parts[1:]:
+    if (part.sample_rate, part.channels, part.sample_width) != (first.sample_rate, first.channels, first.sample_width):
+      raise ValueError('WAV 片段格式不一致，无法拼接')
+  pcm = b''.join(part.pcm for part in parts)
+  return add_wav_header(pcm, first.sample_rate, first.channels, first.sample_width)
+
+
+_SENTENCE_END = re.compile(r'(?<=[。！？!?\n])')
+
+
+def split_sentences(text: str, max_chars: int) -> list[str]:
+  """在句末标点处切分长文本，相邻短句合并到不超过 max_chars 的片段"""
+  segments: list[str] = []
+  current = ''
+  for sentence in _SENTENCE_END.split(text):
+    if not sentence.strip():
+      continue
+    if current and len(current) + len(sentence) > max_chars:
+      segments.append(current)
+      current = ''
+    current += sentence
+  if current.strip():
+    segments.append(current)
+  return segments or [text]
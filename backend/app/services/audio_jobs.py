@@ -0,0 +1,195 @@
+"""后台音频合成任务队列
+
+/api/chat 开启 asyncAudio 时先返回文本，语音合成交给这里的 worker 异步完成，
+客户端通过 GET /api/audio/jobs/{id} 长轮询取回结果。
+"""
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from nanoid import generate
+
+from app import metrics
+from app.database import shard_session
+from app.models import Message
+from app.services import scheduler, speech
+from app.services.audio_profiles import STANDARD, AudioProfile, encode_base64
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+@dataclass
+class AudioJob:
+    id: str
+    text: str
+    profile: AudioProfile = STANDARD
+    status: str = PENDING
+    audio_base64: str | None = None  # 按档位转换后返回给客户端的音频
+    standard_base64: str | None = None  # 保存到消息的原始音频
+    error: str | None = None
+    message_id: str | None = None
+    shard: int | None = None  # message_id 所在的分片
+    # 提交时的调度类别与用户；worker 任务是首次提交时创建的，不能沿用其上下文
+    work: scheduler.Work = field(default_factory=scheduler.current)
+    created_at: float = field(default_factory=time.monotonic)
+    finished: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+
+class AudioJobManager:
+    """有界并发的音频任务管理器（进程内）"""
+
+    def __init__(self, workers: int, queue_size: int, ttl_seconds: float):
+        self.worker_count = workers
+        self.queue_size = queue_size
+        self.ttl_seconds = ttl_seconds
+        self._jobs: dict[str, AudioJob] = {}
+        self._queue: asyncio.Queue[AudioJob] | None = None
+        self._workers: list[asyncio.Task] = []
+        # add_message 运行在线程池中，与 worker 并发读写任务状态
+        self._lock = threading.Lock()
+
+    def submit(self, text: str, profile: AudioProfile = STANDARD) -> AudioJob:
+        """提交合成任务，首次调用时启动 worker"""
+        self._ensure_workers()
+        self._evict_expired()
+        job = AudioJob(id=generate(size=21), text=text, profile=profile)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull as exc:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="语音合成队列已满，请稍后再试"
+            ) from exc
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> AudioJob | None:
+        return self._jobs.get(job_id)
+
+    async def wait(self, job: AudioJob, timeout: float) -> AudioJob:
+        """长轮询：最多等待 timeout 秒直到任务结束"""
+        if not job.is_finished and timeout > 0:
+            try:
+                await asyncio.wait_for(job.finished.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    def attach(self, job_id: str, message_id: str, shard: int | None = None) -> str | None:
+        """将任务结果关联到已提交的消息
+
+        任务已完成时直接返回原始音频，由调用方写入；否则登记 message_id，完成时由 worker 回写。
+        必须在消息提交之后调用，否则 worker 回写时可能找不到消息行。
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == DONE:
+                return job.standard_base64
+            job.message_id = message_id
+            job.shard = shard
+            return None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'queued': self._queue.qsize() if self._queue else 0,
+            'running': sum(1 for job in self._jobs.values() if job.status == RUNNING),
+            'workers': sum(1 for task in self._workers if not task.done()),
+        }
+
+    def sample_metrics(self) -> None:
+        stats = self.stats()
+        metrics.audio_jobs_queued.set(stats['queued'])
+        metrics.audio_jobs_running.set(stats['running'])
+
+    async def shutdown(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def _ensure_workers(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        # 补齐意外退出的 worker
+        self._workers = [task for task in self._workers if not task.done()]
+        if len(self._workers) < self.worker_count:
+            loop = asyncio.get_running_loop()
+            self._workers += [loop.create_task(self._worker()) for _ in range(self.worker_count - len(self._workers))]
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.is_finished and now - job.created_at > self.ttl_seconds
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except Exception:
+                logger.exception("Audio job %s failed unexpectedly", job.id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: AudioJob) -> None:
+        job.status = RUNNING
+        try:
+            with scheduler.classify(job.work.priority, job.work.user):
+                standard = await speech.synthesize(job.text)
+            # 保存原始音频，档位只作用于返回给客户端的副本
+            audio = standard if job.profile.is_standard else await run_in_threadpool(encode_base64, standard, job.profile)
+        except HTTPException as exc:
+            job.error = str(exc.detail)
+            job.status = FAILED
+        except Exception as exc:
+            job.error = str(exc)
+            job.status = FAILED
+        else:
+            with self._lock:
+                job.audio_base64 = audio
+                job.standard_base64 = standard
+                job.status = DONE
+                message_id, shard = job.message_id, job.shard
+            if message_id:
+                # 回写失败不影响任务结果：音频仍可通过长轮询取回
+                try:
+                    await run_in_threadpool(_store_audio, shard, message_id, standard)
+                except Exception:
+                    logger.exception("Failed to store audio job %s result for message %s", job.id, message_id)
+        finally:
+            job.finished.set()
+
+
+def _store_audio(shard: int | None, message_id: str, audio_base64: str) -> None:
+    """把合成结果写回已保存的消息"""
+    db = shard_session(shard)
+    try:
+        updated = db.query(Message).filter(Message.id == message_id).update(
+            {Message.audio_base64: audio_base64}, synchronize_session=False
+        )
+        db.commit()
+        if not updated:
+            logger.warning("Audio job result not stored: message %s not found", message_id)
+    finally:
+        db.close()
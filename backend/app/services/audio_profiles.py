@@ -0,0 +1,259 @@
+"""语音输出档位：按客户端网络条件降低采样率、改用压缩编码并裁掉首尾静音
+
+VOICEVOX 与 Gemini TTS 都输出 24kHz 16 位单声道 PCM WAV（约 48KB/秒，base64 后再大三分之一）。
+客户端通过 ?profile= 选择档位，默认 standard 原样返回：
+
+| 档位 | 采样率 | 编码 | 码率 |
+| --- | --- | --- | --- |
+| standard | 原始 | 16 位 PCM | 384 kbps |
+| compact | 16kHz | 16 位 PCM | 256 kbps |
+| low | 16kHz | 8 位 μ-law（G.711） | 128 kbps |
+| minimal | 16kHz | 4 位 IMA ADPCM | 约 65 kbps |
+
+minimal 使用的 IMA ADPCM 浏览器的 decodeAudioData 无法解码，客户端需要通过 ?codecs=ima_adpcm 声明能自行解码
+（如 WebAssembly 解码器）才能选择。保存到数据库的音频始终是 standard，档位只作用于返回给本次请求的副本。
+
+除 standard 外都会裁掉首尾静音（各保留 SILENCE_PAD 秒）。编码用纯 Python 实现（不依赖 NumPy）：
+重采样按相位切片后整体插值，μ-law 查表，只有 ADPCM 需要逐样本循环。编码是 CPU 操作，
+调用方应放到线程池中执行。
+"""
+import base64
+import struct
+import time
+from array import array
+from dataclasses import dataclass
+from math import gcd
+
+from fastapi import HTTPException, Query, status
+
+from app import metrics
+from app.services.audio import add_wav_header, parse_wav
+
+# 首尾静音判定阈值（约 -40 dBFS）与裁剪后保留的时长
+SILENCE_THRESHOLD = 328
+SILENCE_PAD = 0.05
+
+WAVE_FORMAT_MULAW = 0x0007
+WAVE_FORMAT_IMA_ADPCM = 0x0011
+ADPCM_BLOCK_ALIGN = 256
+
+
+@dataclass(frozen=True)
+class AudioProfile:
+    name: str
+    sample_rate: int | None = None  # None 表示保持原始采样率
+    encoding: str = 'pcm'  # pcm / mulaw / ima_adpcm
+    trim_silence: bool = False
+
+    @property
+    def is_standard(self) -> bool:
+        return self.sample_rate is None and self.encoding == 'pcm' and not self.trim_silence
+
+
+STANDARD = AudioProfile('standard')
+
+PROFILES = {
+    profile.name: profile
+    for profile in (
+        STANDARD,
+        AudioProfile('compact', sample_rate=16000, trim_silence=True),
+        AudioProfile('low', sample_rate=16000, encoding='mulaw', trim_silence=True),
+        AudioProfile('minimal', sample_rate=16000, encoding='ima_adpcm', trim_silence=True),
+    )
+}
+
+
+# 浏览器无法原生解码、需要客户端在 ?codecs= 中声明支持的编码
+OPT_IN_ENCODINGS = frozenset({'ima_adpcm'})
+
+
+def resolve_profile(name: str, codecs: str = '') -> AudioProfile:
+    """按名称取档位，并检查客户端是否声明了该档位需要的编码；不可用时抛出 ValueError"""
+    profile = PROFILES.get(name)
+    if profile is None:
+        raise ValueError(f"未知的语音档位: {name}，可选 {', '.join(PROFILES)}")
+    if profile.encoding in OPT_IN_ENCODINGS and profile.encoding not in codecs.split(','):
+        raise ValueError(f"语音档位 {name} 需要客户端支持 {profile.encoding} 解码（?codecs={profile.encoding}）")
+    return profile
+
+
+def get_profile(
+    profile: str = Query('standard', description='语音档位：standard / compact / low / minimal'),
+    codecs: str = Query('', description='客户端能自行解码的编码，逗号分隔；minimal 需要 ima_adpcm'),
+) -> AudioProfile:
+    """路由依赖：解析 ?profile= 参数"""
+    try:
+        return resolve_profile(profile, codecs)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from None
+
+
+def encode(wav_data: bytes, profile: AudioProfile) -> bytes:
+    """把 16 位 PCM WAV 转换为档位对应的 WAV；其它格式原样返回"""
+    if profile.is_standard:
+        return wav_data
+    started = time.perf_counter()
+    info = parse_wav(wav_data)
+    if info.sample_width != 2 or info.channels != 1:
+        return wav_data
+    samples = array('h')
+    samples.frombytes(info.pcm[:len(info.pcm) & ~1])
+    rate = info.sample_rate
+    if profile.trim_silence:
+        samples = trim_silence(samples, rate)
+    if profile.sample_rate and profile.sample_rate != rate:
+        samples = resample(samples, rate, profile.sample_rate)
+        rate = profile.sample_rate
+
+    if profile.encoding == 'mulaw':
+        result = _wav(WAVE_FORMAT_MULAW, rate, 8, 1, rate, mulaw_encode(samples), len(samples))
+    elif profile.encoding == 'ima_adpcm':
+        samples_per_block = (ADPCM_BLOCK_ALIGN - 4) * 2 + 1
+        result = _wav(
+            WAVE_FORMAT_IMA_ADPCM, rate, 4, ADPCM_BLOCK_ALIGN, rate * ADPCM_BLOCK_ALIGN // samples_per_block,
+            adpcm_encode(samples), len(samples), extra=struct.pack('<H', samples_per_block),
+        )
+    else:
+        result = add_wav_header(samples.tobytes(), rate)
+    metrics.audio_encode_duration.labels(profile=profile.name).observe(time.perf_counter() - started)
+    return result
+
+
+def encode_base64(audio_base64: str, profile: AudioProfile) -> str:
+    if profile.is_standard:
+        return audio_base64
+    return base64.b64encode(encode(base64.b64decode(audio_base64), profile)).decode('ascii')
+
+
+def trim_silence(samples: array, sample_rate: int) -> array:
+    """裁掉首尾低于阈值的部分，各保留 SILENCE_PAD 秒；整段静音时原样返回"""
+    loud = lambda sample: sample > SILENCE_THRESHOLD or sample < -SILENCE_THRESHOLD  # noqa: E731
+    first = next((i for i, sample in enumerate(samples) if loud(sample)), None)
+    if first is None:
+        return samples
+    last = next(i for i in range(len(samples) - 1, -1, -1) if loud(samples[i]))
+    pad = int(sample_rate * SILENCE_PAD)
+    return samples[max(0, first - pad):last + pad + 1]
+
+
+def resample(samples: array, src_rate: int, dst_rate: int) -> array:
+    """线性插值重采样；降采样前先做 [1, 2, 1] / 4 低通，减轻混叠
+
+    输出样本按相位（dst/src 约分后的分子）分组，每组在输入中的位置间隔相同，
+    可以用切片和 zip 整体计算，避免逐样本的 Python 循环。
+    """
+    if len(samples) < 3:
+        return samples
+    if dst_rate < src_rate:
+        x = [samples[0], *((a + 2 * b + c) >> 2 for a, b, c in zip(samples, samples[1:], samples[2:])), samples[-1]]
+    else:
+        x = list(samples)
+    x.append(x[-1])  # 最后一个样本插值时的右邻点
+    divisor = gcd(src_rate, dst_rate)
+    up, down = dst_rate // divisor, src_rate // divisor
+    count = (len(samples) * up) // down
+    out = [0] * count
+    for phase in range(up):
+        offset, remainder = divmod(phase * down, up)
+        n = len(range(phase, count, up))
+        left = x[offset:offset + n * down:down]
+        if remainder:
+            right = x[offset + 1:offset + 1 + n * down:down]
+            out[phase::up] = [(a * (up - remainder) + b * remainder) // up for a, b in zip(left, right)]
+        else:
+            out[phase::up] = left
+    return array('h', out)
+
+
+def _mulaw_byte(sample: int) -> int:
+    """G.711 μ-law 编码单个 16 位样本"""
+    sign = 0x80 if sample < 0 else 0
+    magnitude = min(-sample if sample < 0 else sample, 32635) + 0x84
+    exponent = magnitude.bit_length() - 8
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    return ~(sign | (exponent << 4) | mantissa) & 0xFF
+
+
+# 按无符号 16 位值索引的编码表（64KB），负数样本的补码落在后半段
+_MULAW_TABLE = bytes(_mulaw_byte(value - 65536 if value >= 32768 else value) for value in range(65536))
+
+
+def mulaw_encode(samples: array) -> bytes:
+    unsigned = array('H')
+    unsigned.frombytes(samples.tobytes())
+    return bytes(map(_MULAW_TABLE.__getitem__, unsigned))
+
+
+_ADPCM_STEPS = (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45, 50, 55, 60, 66, 73, 80, 88,
+    97, 107, 118, 130, 143, 157, 173, 190, 209, 230, 253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658,
+    724, 796, 876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327, 3660,
+    4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442, 11487, 12635, 13899, 15289, 16818,
+    18500, 20350, 22385, 24623, 27086, 29794, 32767,
+)
+_ADPCM_INDEX = (-1, -1, -1, -1, 2, 4, 6, 8) * 2
+
+
+def adpcm_encode(samples: array) -> bytes:
+    """IMA ADPCM（WAV 0x0011）编码，每块 ADPCM_BLOCK_ALIGN 字节；最后一块以静音补齐"""
+    samples_per_block = (ADPCM_BLOCK_ALIGN - 4) * 2 + 1
+    steps, index_table = _ADPCM_STEPS, _ADPCM_INDEX
+    out = bytearray()
+    index = 0
+    for start in range(0, len(samples), samples_per_block):
+        block = samples[start:start + samples_per_block].tolist()
+        block += [0] * (samples_per_block - len(block))
+        predictor = block[0]
+        # 块头：首样本、步长索引、保留字节
+        out += struct.pack('<hBB', predictor, index, 0)
+        low = None
+        for sample in block[1:]:
+            step = steps[index]
+            diff = sample - predictor
+            nibble = 0
+            if diff < 0:
+                nibble = 8
+                diff = -diff
+            delta = step >> 3
+            if diff >= step:
+                nibble |= 4
+                diff -= step
+                delta += step
+            step >>= 1
+            if diff >= step:
+                nibble |= 2
+                diff -= step
+                delta += step
+            step >>= 1
+            if diff >= step:
+                nibble |= 1
+                delta += step
+            predictor = predictor - delta if nibble & 8 else predictor + delta
+            if predictor > 32767:
+                predictor = 32767
+            elif predictor < -32768:
+                predictor = -32768
+            index += index_table[nibble]
+            if index < 0:
+                index = 0
+            elif index > 88:
+                index = 88
+            # 每字节两个样本，低 4 位在前
+            if low is None:
+                low = nibble
+            else:
+                out.append(low | (nibble << 4))
+                low = None
+    return bytes(out)
+
+
+def _wav(
+    format_tag: int, sample_rate: int, bits: int, block_align: int, byte_rate: int,
+    data: bytes, frames: int, extra: bytes = b'',
+) -> bytes:
+    """非 PCM 格式的 WAV：fmt 块带扩展字段，另有 fact 块记录样本数"""
+    fmt = struct.pack('<HHIIHHH', format_tag, 1, sample_rate, byte_rate, block_align, bits, len(extra)) + extra
+    chunks = b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+    chunks += b'fact' + struct.pack('<II', 4, frames)
+    chunks += b'data' + struct.pack('<I', len(data)) + data + (b'\0' if len(data) & 1 else b'')
+    return b'RIFF' + struct.pack('<I', 4 + len(chunks)) + b'WAVE' + chunks
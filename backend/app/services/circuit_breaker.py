@@ -0,0 +1,153 @@
+"""上游服务熔断器"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable
+
+from app import metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """基于失败率滑动窗口的熔断器
+
+    - closed: 正常放行，记录最近 window_size 次调用结果
+    - open: 失败率超过阈值后立即拒绝请求，并在后台定期探活
+    - half_open: 冷却期结束或探活成功后放行少量试探请求，成功则恢复 closed；
+      试探请求超过 half_open_timeout 仍无结果时视为失败，重新熔断
+
+    Gemini 调用在线程池中记录结果，状态的检查与更新都在锁内进行。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_rate_threshold: float = 0.5,
+        window_size: int = 20,
+        min_calls: int = 5,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        half_open_timeout: float = 60.0,
+        probe: Callable[[], Awaitable[bool]] | None = None,
+        probe_interval: float = 5.0,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.half_open_timeout = half_open_timeout
+        self.probe = probe
+        self.probe_interval = probe_interval
+
+        self._results: deque[bool] = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._half_open_started = 0.0
+        self._probe_task: asyncio.Task | None = None
+        self._lock = threading.RLock()
+        metrics.set_circuit_state(self.name, self._state, transition=False)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        # 冷却期结束后自动进入半开状态
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+        # 试探请求迟迟没有结果（如被取消后未归还名额）时重新熔断，避免一直停在半开
+        elif (self._state == HALF_OPEN and self._half_open_calls
+              and time.monotonic() - self._half_open_started >= self.half_open_timeout):
+            self._trip()
+        return self._state
+
+    def allow_request(self) -> bool:
+        """当前是否允许请求通过"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                self._half_open_started = time.monotonic()
+                return True
+            return False
+
+    def record_cancelled(self) -> None:
+        """请求被取消（如客户端断开），不计入结果，只归还半开试探名额"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_calls:
+                self._half_open_calls -= 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._transition(CLOSED)
+                return
+            self._results.append(True)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trip()
+                return
+            self._results.append(False)
+            if self._state == CLOSED and len(self._results) >= self.min_calls:
+                failures = self._results.count(False)
+                if failures / len(self._results) >= self.failure_rate_threshold:
+                    self._trip()
+
+    def snapshot(self) -> dict:
+        """返回熔断器状态，供健康检查与指标使用"""
+        with self._lock:
+            total = len(self._results)
+            failures = self._results.count(False)
+            return {
+                'name': self.name,
+                'state': self._current_state(),
+                'calls': total,
+                'failure_rate': failures / total if total else 0.0,
+            }
+
+    def _trip(self) -> None:
+        self._opened_at = time.monotonic()
+        self._transition(OPEN)
+        self._start_probe()
+
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        self._state = state
+        self._half_open_calls = 0
+        if state == CLOSED:
+            self._results.clear()
+        metrics.set_circuit_state(self.name, state)
+
+    def _start_probe(self) -> None:
+        """熔断期间在后台探活，服务恢复后提前进入半开状态"""
+        if self.probe is None or (self._probe_task and not self._probe_task.done()):
+            return
+        try:
+            self._probe_task = asyncio.get_running_loop().create_task(self._probe_loop())
+        except RuntimeError:
+            # 没有运行中的事件循环时只依赖冷却时间恢复
+            self._probe_task = None
+
+    async def _probe_loop(self) -> None:
+        while self._state == OPEN:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                healthy = await self.probe()
+            except Exception:
+                healthy = False
+            with self._lock:
+                if healthy and self._state == OPEN:
+                    self._transition(HALF_OPEN)
@@ -0,0 +1,82 @@
+"""一轮对话的生成流程，供 /api/chat、/api/chat/stream 与 WebSocket 实时通道共用
+
+先查纠错反馈缓存；拆分模式下回复与反馈两次并发调用，否则一次调用同时生成。
+缓存读写与 Gemini SDK 都是阻塞调用，均在线程池中执行；Gemini 调用先经调度器取得额度，
+类别与用户由调用方通过 scheduler.classify() 标记。
+"""
+import asyncio
+import time
+from typing import Any, Callable
+
+from fastapi.concurrency import run_in_threadpool
+
+from app import metrics, timing
+from app.config import get_settings
+from app.container import services
+from app.schemas import ChatRequest
+from app.services import feedback_cache
+
+ReplyCallback = Callable[[str], None]
+
+
+def _combined(payload: ChatRequest, feedback: dict[str, Any] | None, on_reply: ReplyCallback | None) -> dict[str, Any]:
+    """一次调用生成回复与反馈；反馈命中缓存时模型只生成回复，未命中时缓存新生成的反馈"""
+    data = services.gemini.chat(payload, feedback=feedback, on_reply=on_reply)
+    if feedback is None and 'feedback' in data:
+        with timing.span('feedback_cache'):
+            feedback_cache.store(payload.last_user_message(), payload.style, data['feedback'])
+    return data
+
+
+def _feedback(sentence: str, style: str) -> dict[str, Any]:
+    feedback = services.gemini.feedback(sentence, style)
+    with timing.span('feedback_cache'):
+        feedback_cache.store(sentence, style, feedback)
+    return feedback
+
+
+def discard(task: asyncio.Future) -> None:
+    """不再等待的任务：取走异常，避免 "exception was never retrieved" 日志"""
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+async def start(payload: ChatRequest, on_reply: ReplyCallback | None = None) -> tuple[asyncio.Future, asyncio.Future]:
+    """启动生成，返回（回复与翻译，纠错反馈）两个任务
+
+    拆分模式下回复任务只等待回复本身；否则两个任务都来自同一次调用。
+    传入 on_reply 时流式生成回复，回调在线程池中执行。
+    """
+    sentence = payload.last_user_message()
+    with timing.span('feedback_cache'):
+        cached = await run_in_threadpool(feedback_cache.lookup, sentence, payload.style)
+
+    if not get_settings().chat_split_mode:
+        combined = asyncio.ensure_future(services.scheduler.gemini(_combined, payload, cached, on_reply))
+
+        async def feedback_of() -> Any:
+            return (await combined).get('feedback')
+
+        return combined, asyncio.ensure_future(feedback_of())
+
+    reply = asyncio.ensure_future(services.scheduler.gemini(services.gemini.reply, payload, on_reply))
+    if cached is not None:
+        feedback = asyncio.get_running_loop().create_future()
+        feedback.set_result(cached)
+    else:
+        feedback = asyncio.ensure_future(services.scheduler.gemini(_feedback, sentence, payload.style))
+    return reply, feedback
+
+
+async def wait_reply(payload: ChatRequest, on_reply: ReplyCallback | None = None) -> tuple[dict[str, Any], asyncio.Future]:
+    """等待回复就绪并记录 time-to-reply；失败时不再等待反馈"""
+    started = time.perf_counter()
+    reply, feedback = await start(payload, on_reply)
+    try:
+        data = await reply
+    except BaseException:
+        discard(feedback)
+        raise
+    metrics.chat_time_to_reply.labels(mode='split' if get_settings().chat_split_mode else 'combined').observe(
+        time.perf_counter() - started
+    )
+    return data, feedback
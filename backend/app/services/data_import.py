@@ -0,0 +1,265 @@
+"""批量导入：把前端 localStorage 导出的会话、消息与收藏写入数据库
+
+请求体为 NDJSON，每行一条记录，按 type 区分：
+
+    {"type": "session", "id": "...", "title": "...", "createdAt": 1700000000000, "messages": [...]}
+    {"type": "message", "id": "...", "sessionId": "...", "role": "user", "content": "..."}
+    {"type": "favorite", "id": "...", "text": "...", "source": "ai-reply", "mastery": "new"}
+
+- 边读边解析，攒满 import_batch_size 条记录后在一个事务中 executemany 写入，内存只与批大小有关
+- 以客户端 ID 作为主键，已存在的记录跳过，重复导入（或中断后重传）是幂等的
+- 单独的 message 行必须出现在其会话之后（或会话已存在于数据库中）
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator
+
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import bindparam, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app import metrics
+from app.config import get_settings
+from app.models import Favorite, Message, Session as DBSession, User
+from app.schemas_db import ImportFavorite, ImportMessage, ImportSession, ImportSummary
+from app.services import reminders, stats
+
+RECORD_TYPES = {'session': ImportSession, 'message': ImportMessage, 'favorite': ImportFavorite}
+
+# 进行中与最近完成的导入进度，供 GET /api/import/{import_id} 轮询
+PROGRESS_TTL = 3600
+_progress: dict[tuple[int, str], tuple[float, ImportSummary]] = {}
+_progress_lock = threading.Lock()
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+def track(user_id: int, import_id: str, summary: ImportSummary) -> None:
+    now = time.monotonic()
+    with _progress_lock:
+        for key in [key for key, (started, _) in _progress.items() if now - started > PROGRESS_TTL]:
+            del _progress[key]
+        _progress[(user_id, import_id)] = (now, summary)
+
+
+def get_progress(user_id: int, import_id: str) -> ImportSummary | None:
+    with _progress_lock:
+        entry = _progress.get((user_id, import_id))
+    return entry[1] if entry else None
+
+
+async def iter_lines(chunks: AsyncIterable[bytes], max_line_bytes: int) -> AsyncIterator[bytes]:
+    """把请求体按行切分，单行超过 max_line_bytes 时抛出 LineTooLong"""
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while (end := buffer.find(b'\n', start)) >= 0:
+            if end - start > max_line_bytes:
+                raise LineTooLong(f"单行超过 {max_line_bytes} 字节")
+            yield bytes(buffer[start:end])
+            start = end + 1
+        del buffer[:start]
+        if len(buffer) > max_line_bytes:
+            raise LineTooLong(f"单行超过 {max_line_bytes} 字节")
+    if buffer.strip():
+        yield bytes(buffer)
+
+
+class Importer:
+    """按批写入导入记录；add() 解析一行，pending 达到批大小后由调用方执行 flush()"""
+
+    def __init__(self, db: Session, user: User, summary: ImportSummary) -> None:
+        settings = get_settings()
+        self.db = db
+        self.user = user
+        self.summary = summary
+        self.batch_size = max(1, settings.import_batch_size)
+        self.max_errors = settings.import_max_errors
+        self._sessions: dict[str, dict[str, Any]] = {}
+        self._messages: dict[str, dict[str, Any]] = {}
+        self._favorites: dict[str, dict[str, Any]] = {}
+        # 已确认属于当前用户的会话 ID（只保存 ID，用于校验后续消息）
+        self._owned_sessions: set[str] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._sessions) + len(self._messages) + len(self._favorites)
+
+    def error(self, line_no: int, reason: str) -> None:
+        self.summary.invalid += 1
+        if len(self.summary.errors) < self.max_errors:
+            self.summary.errors.append(f"第 {line_no} 行: {reason}")
+
+    def add(self, line_no: int, line: bytes) -> None:
+        self.summary.lines += 1
+        if not line.strip():
+            return
+        try:
+            data = orjson.loads(line)
+            kind = data.pop('type', None) if isinstance(data, dict) else None
+            schema = RECORD_TYPES.get(kind)
+            if schema is None:
+                raise ValueError("type 必须是 session、message 或 favorite")
+            record = schema.model_validate(data)
+        except ValidationError as exc:
+            first = exc.errors()[0]
+            self.error(line_no, f"{'.'.join(map(str, first['loc']))}: {first['msg']}")
+            return
+        except ValueError as exc:
+            self.error(line_no, str(exc))
+            return
+
+        if isinstance(record, ImportSession):
+            self._sessions.setdefault(record.id, {
+                'id': record.id,
+                'user_id': self.user.id,
+                'title': record.title,
+                'conversation_style': record.conversation_style,
+                'created_at': record.created_at or record.updated_at,
+                'updated_at': record.updated_at or record.created_at,
+            })
+            for message in record.messages:
+                self._add_message(line_no, message, record.id)
+        elif isinstance(record, ImportMessage):
+            if not record.session_id:
+                self.error(line_no, "message 缺少 sessionId")
+                return
+            self._add_message(line_no, record, record.session_id)
+        else:
+            self._favorites.setdefault(record.id, {
+                'id': record.id,
+                'user_id': self.user.id,
+                'text': record.text,
+                'translation': record.translation,
+                'source': record.source,
+                'mastery': record.mastery,
+                'review_count': record.review_count,
+                'created_at': record.created_at,
+                'last_reviewed_at': record.last_reviewed_at,
+                'due_at': reminders.next_due(record.mastery, record.created_at, record.last_reviewed_at),
+            })
+
+    def _add_message(self, line_no: int, message: ImportMessage, session_id: str) -> None:
+        self._messages.setdefault(message.id, {
+            'id': message.id,
+            'session_id': session_id,
+            'role': message.role,
+            'content': message.content,
+            'translation': message.translation,
+            'feedback': message.feedback,
+            'audio_base64': message.audio_base64,
+            'model': message.model,
+            'created_at': message.created_at,
+            '_line': line_no,
+        })
+
+    def flush(self) -> None:
+        """在一个事务中写入当前批次：每种记录一次查重 SELECT 加一次 executemany INSERT"""
+        if not self.pending:
+            return
+        try:
+            self._flush_sessions()
+            inserted_messages = self._flush_messages()
+            inserted_favorites = self._flush_favorites()
+            stats.record_many(
+                self.db, self.user,
+                messages=[(row['role'], row['feedback'], row['created_at']) for row in inserted_messages],
+                favorites=[(row['created_at'], row['last_reviewed_at']) for row in inserted_favorites],
+            )
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            self._sessions.clear()
+            self._messages.clear()
+            self._favorites.clear()
+
+    def _fill_timestamps(self, rows: list[dict[str, Any]], *names: str) -> None:
+        # executemany 要求每行的列一致，缺省时间在这里补齐而不是依赖列默认值
+        now = datetime.utcnow()
+        for row in rows:
+            for name in names:
+                if row[name] is None:
+                    row[name] = now
+
+    def _flush_sessions(self) -> None:
+        if not self._sessions:
+            return
+        existing = dict(self.db.execute(
+            select(DBSession.id, DBSession.user_id).where(DBSession.id.in_(list(self._sessions)))
+        ).all())
+        rows = [row for session_id, row in self._sessions.items() if session_id not in existing]
+        self._owned_sessions.update(session_id for session_id, user_id in existing.items() if user_id == self.user.id)
+        self._record('sessions', inserted=len(rows), skipped=len(existing))
+        if rows:
+            self._fill_timestamps(rows, 'created_at', 'updated_at')
+            self.db.execute(insert(DBSession), rows)
+            self._owned_sessions.update(row['id'] for row in rows)
+
+    def _flush_messages(self) -> list[dict[str, Any]]:
+        if not self._messages:
+            return []
+        unknown = {row['session_id'] for row in self._messages.values()} - self._owned_sessions
+        if unknown:
+            self._owned_sessions.update(self.db.execute(
+                select(DBSession.id).where(DBSession.id.in_(list(unknown)), DBSession.user_id == self.user.id)
+            ).scalars())
+        existing = set(self.db.execute(
+            select(Message.id).where(Message.id.in_(list(self._messages)))
+        ).scalars())
+        rows = []
+        for message_id, row in self._messages.items():
+            line_no = row.pop('_line')
+            if message_id in existing:
+                continue
+            if row['session_id'] not in self._owned_sessions:
+                self.error(line_no, f"会话 {row['session_id']} 不存在")
+                continue
+            rows.append(row)
+        self._record('messages', inserted=len(rows), skipped=len(existing))
+        if rows:
+            self._fill_timestamps(rows, 'created_at')
+            self.db.execute(insert(Message), rows)
+            self._touch_sessions(rows)
+        return rows
+
+    def _touch_sessions(self, rows: list[dict[str, Any]]) -> None:
+        # 会话的 updated_at 不早于其中最新的消息，否则仍在使用的会话会被当作闲置归档
+        latest: dict[str, datetime] = {}
+        for row in rows:
+            if row['created_at'] > latest.get(row['session_id'], datetime.min):
+                latest[row['session_id']] = row['created_at']
+        sessions = DBSession.__table__
+        self.db.execute(
+            update(sessions)
+            .where(sessions.c.id == bindparam('sid'),
+                   or_(sessions.c.updated_at.is_(None), sessions.c.updated_at < bindparam('latest')))
+            .values(updated_at=bindparam('latest')),
+            [{'sid': session_id, 'latest': created_at} for session_id, created_at in latest.items()],
+        )
+
+    def _flush_favorites(self) -> list[dict[str, Any]]:
+        if not self._favorites:
+            return []
+        existing = set(self.db.execute(
+            select(Favorite.id).where(Favorite.id.in_(list(self._favorites)))
+        ).scalars())
+        rows = [row for favorite_id, row in self._favorites.items() if favorite_id not in existing]
+        self._record('favorites', inserted=len(rows), skipped=len(existing))
+        if rows:
+            self._fill_timestamps(rows, 'created_at')
+            self.db.execute(insert(Favorite), rows)
+        return rows
+
+    def _record(self, kind: str, inserted: int, skipped: int) -> None:
+        counts = getattr(self.summary, kind)
+        counts.inserted += inserted
+        counts.skipped += skipped
+        metrics.import_rows.labels(kind=kind, result='inserted').inc(inserted)
+        metrics.import_rows.labels(kind=kind, result='skipped').inc(skipped)
@@ -0,0 +1,160 @@
+"""纠错反馈缓存
+
+反馈（correctedSentence、explanation、naturalnessScore）只取决于用户的上一句与对话风格，
+学习者又经常重复提交「おはよう」「ありがとう」这类短句，因此按
+（规范化句子、风格、提示词版本）持久化缓存，命中时 Gemini 只需生成回复。
+
+过期（feedback_cache_ttl_days）的条目查询时视为未命中；超出 feedback_cache_max_entries
+的条目由后台维护按 last_used_at 淘汰（见 app/services/maintenance.py）。
+命中次数与使用时间先在进程内累计，每 feedback_cache_flush_interval 秒批量写回一次，命中路径只读。
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Any
+
+from pydantic import ValidationError
+from sqlalchemy import bindparam, delete, func, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app import metrics
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models import FeedbackCache
+from app.schemas import Feedback
+from app.services.gemini import PROMPT_VERSION
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+# 句末的句号、感叹号、省略号不影响反馈；问号会改变句意，保留
+_TRAILING = '。．.!！…~～、,，'
+
+# 尚未写回的命中：key -> (次数, 最近使用时间)
+_pending_hits: dict[str, tuple[int, datetime]] = {}
+_hits_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def normalize(text: str) -> str:
+    """全半角统一（NFKC）、合并空白、去掉句末标点"""
+    text = _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', text)).strip()
+    return text.rstrip(_TRAILING + ' ')
+
+
+def cache_key(text: str, style: str) -> str:
+    return hashlib.sha256(f'{PROMPT_VERSION}\0{style}\0{text}'.encode('utf-8')).hexdigest()
+
+
+def _cacheable(text: str) -> bool:
+    settings = get_settings()
+    return settings.feedback_cache_enabled and 0 < len(text) <= settings.feedback_cache_max_chars
+
+
+def lookup(sentence: str, style: str) -> dict[str, Any] | None:
+    """返回缓存的反馈并记录一次命中；未命中或不可缓存时返回 None"""
+    text = normalize(sentence)
+    if not _cacheable(text):
+        metrics.feedback_cache_requests.labels(result='skip').inc()
+        return None
+    key = cache_key(text, style)
+    now = datetime.utcnow()
+    expires = now - timedelta(days=get_settings().feedback_cache_ttl_days)
+    db = SessionLocal()
+    try:
+        feedback = db.execute(
+            select(FeedbackCache.feedback).where(FeedbackCache.key == key, FeedbackCache.created_at >= expires)
+        ).scalar()
+    finally:
+        db.close()
+    if feedback is None:
+        metrics.feedback_cache_requests.labels(result='miss').inc()
+        return None
+    metrics.feedback_cache_requests.labels(result='hit').inc()
+    _record_hit(key, now)
+    return feedback
+
+
+def _record_hit(key: str, now: datetime) -> None:
+    with _hits_lock:
+        hits, _ = _pending_hits.get(key, (0, now))
+        _pending_hits[key] = (hits + 1, now)
+        due = time.monotonic() - _last_flush >= get_settings().feedback_cache_flush_interval
+    if due:
+        flush_hits()
+
+
+def flush_hits() -> int:
+    """把累计的命中次数与使用时间写回数据库（一个事务），返回写回的条目数
+
+    写回失败时丢弃这批记录：命中统计只影响淘汰顺序，不值得为此重试占用写锁。
+    """
+    global _last_flush
+    with _hits_lock:
+        pending = dict(_pending_hits)
+        _pending_hits.clear()
+        _last_flush = time.monotonic()
+    if not pending:
+        return 0
+    table = FeedbackCache.__table__
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(table)
+            .where(table.c.key == bindparam('k'))
+            .values(hits=table.c.hits + bindparam('n'), last_used_at=bindparam('at')),
+            [{'k': key, 'n': hits, 'at': at} for key, (hits, at) in pending.items()],
+        )
+        db.commit()
+    except SQLAlchemyError:
+        logger.warning("Failed to flush %d feedback cache hits", len(pending), exc_info=True)
+        db.rollback()
+        return 0
+    finally:
+        db.close()
+    return len(pending)
+
+
+def store(sentence: str, style: str, feedback: Any) -> None:
+    """保存模型生成的反馈；格式不完整时不缓存，过期条目被覆盖"""
+    text = normalize(sentence)
+    if not _cacheable(text):
+        return
+    try:
+        feedback = Feedback.model_validate(feedback).model_dump()
+    except ValidationError:
+        return
+    key = cache_key(text, style)
+    db = SessionLocal()
+    try:
+        # 过期条目在查询时视为未命中，这里先删除再写入
+        db.execute(delete(FeedbackCache).where(FeedbackCache.key == key))
+        db.add(FeedbackCache(key=key, text=text, style=style, prompt_version=PROMPT_VERSION, feedback=feedback))
+        db.commit()
+    except IntegrityError:
+        # 并发请求已写入同一句子
+        db.rollback()
+    finally:
+        db.close()
+
+
+def trim(db: Session, max_entries: int, ttl_days: int, dry_run: bool = False) -> int:
+    """删除过期条目及超出容量的最久未使用条目，返回删除（dry_run 时为将删除）的条数"""
+    expires = datetime.utcnow() - timedelta(days=ttl_days)
+    expired = db.execute(select(func.count()).where(FeedbackCache.created_at < expires)).scalar()
+    total = db.execute(select(func.count()).select_from(FeedbackCache)).scalar()
+    excess = max(0, total - expired - max_entries)
+    if dry_run:
+        return expired + excess
+    if expired:
+        db.execute(delete(FeedbackCache).where(FeedbackCache.created_at < expires))
+    if excess:
+        oldest = select(FeedbackCache.key).order_by(FeedbackCache.last_used_at).limit(excess)
+        db.execute(delete(FeedbackCache).where(FeedbackCache.key.in_(oldest)))
+    db.commit()
+    return expired + excess
@@ -1,18 +1,28 @@
 from __future__ import annotations
 
 import base64
+import hashlib
 import json
-import struct
-from typing import Any
+import logging
+import re
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable
 
-import google.generativeai as genai
 from fastapi import HTTPException, status
 
+from app import metrics, timing
 from app.config import get_settings
 from app.schemas import ChatRequest
+from app.services.audio import add_wav_header
+from app.services.model_router import ModelRouter, Route, parse_routes
+
+if TYPE_CHECKING:
+  import google.generativeai as genai
+
+logger = logging.getLogger(__name__)
 
 settings = get_settings()
-genai.configure(api_key=settings.google_api_key)
 
 CHAT_SCHEMA: dict[str, Any] = {
   'type': 'object',
@@ -33,6 +43,19 @@ CHAT_SCHEMA: dict[str, Any] = {
   'required': ['reply', 'replyTranslation', 'feedback'],
 }
 
+# 纠错反馈已由缓存提供时只需生成回复
+REPLY_SCHEMA: dict[str, Any] = {
+  'type': 'object',
+  'properties': {
+    'reply': {'type': 'string'},
+    'replyTranslation': {'type': 'string'},
+  },
+  'required': ['reply', 'replyTranslation'],
+}
+
+# 拆分模式下单独生成纠错反馈
+FEEDBACK_SCHEMA: dict[str, Any] = CHAT_SCHEMA['properties']['feedback']
+
 STYLE_PROMPTS = {
   'casual': '使用亲切、自然的日常会话语气，就像和朋友聊天，适度加入鼓励或追问。',
   'formal': '使用礼貌、正式的敬语表达，句式严谨，适合商务、面试或考试场景。',
@@ -88,6 +111,32 @@ User: "会話力を上げるには、どうすればいい？"
 - 禁止翻译成其他语言（如英文、韩文、俄文等），必须翻译成【中文】。
 """
 
+_REPLY_PROMPT = """你是专业日语老师，作为用户的"对话伙伴"，针对用户的内容进行正常的日语回复。请严格遵守JSON格式要求。
+
+【输出字段规则】
+- reply: 纯日语回应，必须是标准的现代日语，绝对禁止出现任何非日文字符。
+- replyTranslation: reply 的中文翻译，必须严格翻译成【中文】。
+
+【禁止行为】
+- 严禁输出 JSON 代码块以外的任何文字。
+"""
+
+_FEEDBACK_PROMPT = """你是专业日语老师，作为用户的"润色编辑器"：保留用户的意图和视角，仅提升表达的地道程度和礼貌度。请严格遵守JSON格式要求。
+
+【规则】
+- 陈述句不要改成疑问句；用户提问时只润色提问，禁止回答问题；避免啰嗦重复。
+  例："悲しい" → "今日は少し落ち込んでいます。"；"トイレどこ？" → "すみません、お手洗いはどちらでしょうか？"
+- correctedSentence: 保留原句的主语和语态，保持简洁，优先提供成人得体的自然表达。
+- explanation: 严格使用**日文**解释修改理由，重点解释语感差异（ニュアンス）和场景适配性。
+- naturalnessScore: 0-100 整数。
+- 绝对禁止出现任何非日文/非中文的字符，严禁输出 JSON 以外的任何文字。
+"""
+
+# 反馈缓存的键包含提示词版本，修改提示词后旧缓存自动失效
+PROMPT_VERSION = hashlib.sha256(
+  (_SYSTEM_PROMPT + _FEEDBACK_PROMPT + json.dumps(STYLE_PROMPTS, sort_keys=True)).encode()
+).hexdigest()[:12]
+
 TITLE_PROMPT = (
   '请基于以下对话内容生成 20 个字以内的日语标题。严格要求：\n'
   '1. 只输出一个纯日语标题（仅包含汉字、假名）。\n'
@@ -97,30 +146,122 @@ TITLE_PROMPT = (
   '对话内容：\n'
 )
 
-# 这个函数为原始 PCM 音频数据添加 WAV 头，以便于播放，如果需要的话可以调整采样率、通道数和采样宽度
-# 默认假设 Gemini 返回的是 24kHz 单声道 16位 PCM 数据
-# https://docs.fileformat.com/audio/wav/
-def add_wav_header(pcm_data: bytes, sample_rate: int = 24000, channels: int = 1, sample_width: int = 2) -> bytes:
-  header = b'RIFF'
-  header += struct.pack('<I', 36 + len(pcm_data))
-  header += b'WAVE'
-  header += b'fmt '
-  header += struct.pack('<I', 16)
-  header += struct.pack('<H', 1)
-  header += struct.pack('<H', channels)
-  header += struct.pack('<I', sample_rate)
-  header += struct.pack('<I', sample_rate * channels * sample_width)
-  header += struct.pack('<H', channels * sample_width)
-  header += struct.pack('<H', sample_width * 8)
-  header += b'data'
-  header += struct.pack('<I', len(pcm_data))
-  return header + pcm_data
+# 拆分模式的两次调用分别走 chat 与 feedback 路由
+_ROUTE_FOR_TASK = {'chat_reply': 'chat', 'chat_feedback': 'feedback'}
+
+
+_REPLY_KEY = re.compile(r'"reply"\s*:\s*"')
+
+
+def partial_reply(text: str) -> str:
+  """从流式输出的不完整 JSON 中取出 reply 字段已生成的部分"""
+  match = _REPLY_KEY.search(text)
+  if match is None:
+    return ''
+  index, end = match.end(), len(text)
+  while index < end and text[index] != '"':
+    if text[index] == '\\':
+      step = 6 if text[index + 1:index + 2] == 'u' else 2
+      if index + step > end:
+        break  # 转义序列还没收全
+      index += step
+    else:
+      index += 1
+  try:
+    value = json.loads(f'"{text[match.end():index]}"')
+  except json.JSONDecodeError:
+    return ''
+  # 代理对只收到前一半时先不输出
+  return value[:-1] if value and '\ud800' <= value[-1] <= '\udbff' else value
+
+
+def _routes() -> dict[str, list[Route]]:
+  timeout = settings.gemini_timeout
+  chat = parse_routes(settings.chat_models, timeout) or [Route(settings.chat_model, timeout)]
+  return {
+    'chat': chat,
+    'feedback': parse_routes(settings.feedback_models, timeout) or chat,
+    'title': parse_routes(settings.title_models, timeout) or [Route(settings.chat_model, timeout)],
+    'tts': parse_routes(settings.tts_models, timeout) or [Route(settings.tts_model, timeout)],
+  }
+
 
 class GeminiService:
   def __init__(self) -> None:
-    self.chat_model = genai.GenerativeModel(settings.chat_model)
-    self.tts_model = genai.GenerativeModel(settings.tts_model)
-    self.title_model = genai.GenerativeModel(settings.chat_model)
+    # SDK 导入耗时较长（约 0.7 秒），推迟到首次创建服务时
+    import google.generativeai as genai
+
+    if settings.gemini_api_endpoint:
+      # 指向自定义地址（如 benchmarks 中的假 Gemini 服务）时只能走 REST
+      genai.configure(
+        api_key=settings.google_api_key,
+        transport='rest',
+        client_options={'api_endpoint': settings.gemini_api_endpoint},
+      )
+    else:
+      genai.configure(api_key=settings.google_api_key)
+    self._genai = genai
+    self._models: dict[str, genai.GenerativeModel] = {}
+    self._models_lock = threading.Lock()
+    self.router = ModelRouter(
+      _routes(),
+      deadline=settings.gemini_deadline,
+      open_seconds=settings.gemini_breaker_open_seconds,
+    )
+    for routes in self.router.routes.values():
+      for route in routes:
+        self._model(route.model)
+
+  def _model(self, name: str) -> genai.GenerativeModel:
+    if name not in self._models:
+      with self._models_lock:
+        if name not in self._models:
+          self._models[name] = self._genai.GenerativeModel(name)
+    return self._models[name]
+
+  def _generate(
+    self,
+    task: str,
+    contents: list,
+    generation_config: dict,
+    on_text: Callable[[str], None] | None = None,
+  ) -> tuple[genai.types.GenerationResponse, str]:
+    """按任务的模型路由调用，返回 (响应, 实际使用的模型)
+
+    传入 on_text 时以流式方式调用，每收到一块就以累计的文本回调（故障转移后从头开始）。
+    """
+
+    def call(name: str, timeout: float, last: bool) -> genai.types.GenerationResponse:
+      # 统一记录各任务的调用耗时与 token 用量（每个尝试过的模型分别记录）
+      from google.api_core import retry
+
+      model = self._model(name)
+      started = time.perf_counter()
+      try:
+        with timing.span('llm'):
+          response = model.generate_content(
+            contents=contents,
+            generation_config=generation_config,
+            stream=on_text is not None,
+            # SDK 默认对 429/503 重试最长 600 秒：只在最后一个候选上重试，且不超过本次可用时间
+            request_options={
+              'timeout': timeout,
+              'retry': retry.Retry(predicate=retry.if_transient_error, initial=0.5, maximum=4, timeout=timeout)
+              if last else None,
+            },
+          )
+          if on_text is not None:
+            text = ''
+            for chunk in response:
+              text += chunk.text
+              on_text(text)
+      except Exception:
+        metrics.observe_gemini(task, name, started, outcome='error')
+        raise
+      metrics.observe_gemini(task, name, started, response)
+      return response
+
+    return self.router.call(_ROUTE_FOR_TASK.get(task, task), call)
 
   def _safe_json(self, response: genai.types.GenerationResponse) -> dict[str, Any]:
     try:
@@ -129,38 +270,78 @@ class GeminiService:
     except (json.JSONDecodeError, AttributeError) as exc:
       raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail='AI 返回格式错误') from exc
 
-  def chat(self, payload: ChatRequest) -> dict[str, Any]:
+  def chat(
+    self,
+    payload: ChatRequest,
+    feedback: dict[str, Any] | None = None,
+    on_reply: Callable[[str], None] | None = None,
+  ) -> dict[str, Any]:
+    """一次调用生成回复、翻译与纠错反馈；传入缓存的 feedback 时只生成回复与翻译
+
+    on_reply 用于流式输出：回复每增长一段就以目前为止的回复文本回调（在调用线程中执行）。
+    """
+    if feedback is not None:
+      return {**self.reply(payload, on_reply), 'feedback': feedback}
+    data = self._chat_json('chat', _SYSTEM_PROMPT, payload, CHAT_SCHEMA, on_reply)
+    # 注意：音频生成已移至异步路由层，这里不再自动生成
+    return data
+
+  def reply(self, payload: ChatRequest, on_reply: Callable[[str], None] | None = None) -> dict[str, Any]:
+    """只生成回复与翻译（带完整对话记录）；结果中的 model 为实际使用的模型"""
+    return self._chat_json('chat_reply', _REPLY_PROMPT, payload, REPLY_SCHEMA, on_reply)
+
+  def feedback(self, sentence: str, style: str) -> dict[str, Any]:
+    """只根据用户的上一句生成纠错反馈，提示词精简、不带对话记录"""
+    style_hint = STYLE_PROMPTS.get(style, STYLE_PROMPTS['casual'])
+    response, _ = self._generate(
+      'chat_feedback',
+      contents=[{'role': 'user', 'parts': [{'text': f"{_FEEDBACK_PROMPT}\n风格设定：{style_hint}\n\nuser: {sentence}"}]}],
+      generation_config={
+        'response_mime_type': 'application/json',
+        'response_schema': FEEDBACK_SCHEMA,
+      },
+    )
+    return self._safe_json(response)
+
+  def _chat_json(
+    self,
+    task: str,
+    system_prompt: str,
+    payload: ChatRequest,
+    schema: dict[str, Any],
+    on_reply: Callable[[str], None] | None = None,
+  ) -> dict[str, Any]:
     messages_text = '\n'.join([f"{msg.role}: {msg.content}" for msg in payload.messages])
-    last_user_message = next((msg.content for msg in reversed(payload.messages) if msg.role == 'user'), '')
+    last_user_message = payload.last_user_message()
     style_hint = STYLE_PROMPTS.get(payload.style, STYLE_PROMPTS['casual'])
-    username = payload.username if hasattr(payload, 'username') else '匿名用户' # 暂时保留
     prompt = (
-      f"{_SYSTEM_PROMPT}\n风格设定：{style_hint}\n\n用户上一句：{last_user_message}\n\n"
+      f"{system_prompt}\n风格设定：{style_hint}\n\n用户上一句：{last_user_message}\n\n"
       f"对话记录（供参考，可精简使用）：\n{messages_text}"
     )
-    response = self.chat_model.generate_content(
+    response, model = self._generate(
+      task,
       contents=[
         {'role': 'user', 'parts': [{'text': prompt}]},
       ],
       generation_config={
         'response_mime_type': 'application/json',
-        'response_schema': CHAT_SCHEMA,
+        'response_schema': schema,
       },
+      on_text=(lambda text: on_reply(partial_reply(text))) if on_reply is not None else None,
     )
-    data = self._safe_json(response)
-    # 注意：音频生成已移至异步路由层，这里不再自动生成
-    return data
+    return {**self._safe_json(response), 'model': model}
 
   def tts(self, text: str) -> str:
     try:
-      response = self.tts_model.generate_content(
+      response, _ = self._generate(
+        'tts',
         contents=[{'role': 'user', 'parts': [{'text': text}]}],
         generation_config={
           'response_modalities': ['AUDIO']
         },
       )
     except Exception as e:
-      print(f"Gemini TTS API Error: {e}")
+      logger.warning("Gemini TTS API Error: %s", e)
       raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f'TTS API调用失败: {str(e)}')
 
     try:
@@ -171,15 +352,15 @@ class GeminiService:
         wav_audio = add_wav_header(raw_audio)
         return base64.b64encode(wav_audio).decode('utf-8')
     except (IndexError, AttributeError) as exc:
-      print(f"Gemini TTS Parse Error: {exc}")
-      print(f"Response candidates: {response.candidates}")
+      logger.warning("Gemini TTS Parse Error: %s; candidates: %s", exc, response.candidates)
       raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail='TTS 生成失败') from exc
     raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail='未收到音频数据')
 
   def title(self, transcript: str) -> str:
     prompt = TITLE_PROMPT + transcript
-    response = self.title_model.generate_content(
-      [{'role': 'user', 'parts': [{'text': prompt}]}],
+    response, _ = self._generate(
+      'title',
+      contents=[{'role': 'user', 'parts': [{'text': prompt}]}],
       generation_config={'response_mime_type': 'text/plain'},
     )
     text = (response.text or '').strip()
@@ -187,6 +368,5 @@ class GeminiService:
     trimmed = candidate[:20].strip()
     return trimmed or '新しい話題'
 
-
-
-gemini_service = GeminiService()
+  def snapshot(self) -> dict[str, Any]:
+    return self.router.snapshot()
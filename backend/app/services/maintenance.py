@@ -0,0 +1,335 @@
+"""数据保留与压缩：控制 chatbot.db 的体积
+
+- 删除早于 retention_audio_days 的消息音频（audio_base64 占数据库的绝大部分）
+- 把超过 retention_archive_idle_days 没有新消息的会话压缩归档到 archived_sessions
+- 淘汰过期或超出容量的纠错反馈缓存
+- SQLite 下执行 incremental_vacuum 归还空闲页，并执行 PRAGMA optimize 更新统计信息
+
+所有写操作按 maintenance_batch_size 分批，每批一个短事务，批次之间暂停以让出写锁。
+开启分片时音频清理、归档与空间回收对主库和每个分片库分别执行，报告中的数字为合计。
+"""
+import asyncio
+import json
+import logging
+import time
+import zlib
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app import metrics
+from app.config import get_settings
+from app.database import SessionLocal, engine, shard_engine, shard_locations, shard_session
+from app.models import ArchivedSession, Message, Session as DBSession
+from app.services import feedback_cache
+
+logger = logging.getLogger(__name__)
+
+# 归档时保存的消息字段（不含音频，需要时可重新合成）
+ARCHIVED_MESSAGE_FIELDS = ('id', 'role', 'content', 'translation', 'feedback', 'model', 'created_at')
+
+_AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+
+@dataclass
+class MaintenanceReport:
+    dry_run: bool
+    audio_messages: int = 0
+    audio_bytes: int = 0
+    archived_sessions: int = 0
+    archived_messages: int = 0
+    archived_bytes: int = 0
+    feedback_cache_evicted: int = 0
+    freelist_bytes: int = 0
+    vacuumed_pages: int = 0
+    file_bytes: int | None = None
+    auto_vacuum: str | None = None
+    notes: list[str] = field(default_factory=list)
+
+    @property
+    def reclaimable_bytes(self) -> int:
+        return self.audio_bytes + self.archived_bytes + self.freelist_bytes
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), 'reclaimable_bytes': self.reclaimable_bytes}
+
+
+def _cutoff(days: int) -> datetime | None:
+    return datetime.utcnow() - timedelta(days=days) if days > 0 else None
+
+
+def _pause() -> None:
+    pause = get_settings().maintenance_batch_pause
+    if pause > 0:
+        time.sleep(pause)
+
+
+def _message_bytes(audio_dropped_before: datetime | None = None):
+    """消息占用的字节数（近似）；audio_dropped_before 之前的音频已计入音频清理，不重复计算"""
+    audio = func.coalesce(func.length(Message.audio_base64), 0)
+    if audio_dropped_before is not None:
+        audio = case((Message.created_at < audio_dropped_before, 0), else_=audio)
+    return func.length(Message.content) + func.coalesce(func.length(Message.translation), 0) + audio
+
+
+def drop_old_audio(db: Session, cutoff: datetime, batch_size: int) -> tuple[int, int]:
+    """分批清空早于 cutoff 的消息音频，返回 (消息数, 释放的字节数)"""
+    total_rows = total_bytes = 0
+    while True:
+        rows = db.execute(
+            select(Message.id, func.length(Message.audio_base64))
+            .where(Message.audio_base64.is_not(None), Message.created_at < cutoff)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return total_rows, total_bytes
+        db.execute(
+            update(Message).where(Message.id.in_([row[0] for row in rows])).values(audio_base64=None),
+            execution_options={'synchronize_session': False},
+        )
+        db.commit()
+        total_rows += len(rows)
+        total_bytes += sum(row[1] or 0 for row in rows)
+        metrics.maintenance_rows.labels(task='drop_audio').inc(len(rows))
+        _pause()
+
+
+def archive_session(db: Session, session: DBSession, cutoff: datetime) -> tuple[int, int] | None:
+    """把一个会话及其消息移入 archived_sessions（调用方提交），返回 (消息数, 原始字节数)
+
+    先取得写锁再确认会话仍然闲置：SQLite 由无操作的 UPDATE 开启写事务，其它数据库由 FOR UPDATE 锁住会话行，
+    读取与删除之间不会插入新消息。会话在选出之后有了新消息时返回 None。
+    """
+    db.execute(
+        update(DBSession).where(DBSession.id == session.id).values(updated_at=DBSession.updated_at),
+        execution_options={'synchronize_session': False},
+    )
+    still_idle = db.execute(
+        select(DBSession.id).where(DBSession.id == session.id, *_idle(cutoff)).with_for_update()
+    ).first()
+    if still_idle is None:
+        return None
+    messages = [
+        dict(zip(ARCHIVED_MESSAGE_FIELDS, row)) for row in db.execute(
+            select(*(getattr(Message, name) for name in ARCHIVED_MESSAGE_FIELDS))
+            .where(Message.session_id == session.id)
+            .order_by(Message.created_at)
+        )
+    ]
+    original_bytes = db.execute(
+        select(func.coalesce(func.sum(_message_bytes()), 0)).where(Message.session_id == session.id)
+    ).scalar()
+    payload = zlib.compress(json.dumps(messages, ensure_ascii=False, default=str).encode('utf-8'), 6)
+    db.execute(insert(ArchivedSession).values(
+        id=session.id,
+        user_id=session.user_id,
+        title=session.title,
+        conversation_style=session.conversation_style,
+        message_count=len(messages),
+        payload=payload,
+        created_at=session.created_at,
+        updated_at=session.updated_at,
+    ))
+    db.execute(delete(Message).where(Message.session_id == session.id))
+    db.execute(delete(DBSession).where(DBSession.id == session.id))
+    return len(messages), original_bytes
+
+
+def _idle(cutoff: datetime):
+    """闲置会话：会话与其中的消息在 cutoff 之后都没有更新（旧数据的 updated_at 可能没有随新消息刷新）"""
+    recent = select(Message.id).where(Message.session_id == DBSession.id, Message.created_at >= cutoff)
+    return DBSession.updated_at < cutoff, ~recent.exists()
+
+
+def archive_idle_sessions(db: Session, cutoff: datetime, batch_size: int) -> tuple[int, int, int]:
+    """分批归档闲置会话，每批消息总数不超过 batch_size（单个会话超出时独占一批）"""
+    sessions = messages = original_bytes = 0
+    while True:
+        candidates = db.execute(
+            select(DBSession).where(*_idle(cutoff)).order_by(DBSession.updated_at).limit(batch_size)
+        ).scalars().all()
+        if not candidates:
+            return sessions, messages, original_bytes
+        batch_sessions = batch_messages = 0
+        for session in candidates:
+            archived = archive_session(db, session, cutoff)
+            if archived is None:
+                continue
+            count, size = archived
+            batch_sessions += 1
+            batch_messages += count
+            original_bytes += size
+            if batch_messages >= batch_size:
+                break
+        db.commit()
+        db.expunge_all()
+        sessions += batch_sessions
+        messages += batch_messages
+        metrics.maintenance_rows.labels(task='archive_session').inc(batch_sessions)
+        _pause()
+
+
+def restore_session(db: Session, session_id: str) -> bool:
+    """把归档的会话恢复为普通会话（音频不会恢复）"""
+    archived = db.get(ArchivedSession, session_id)
+    if archived is None:
+        return False
+    db.add(DBSession(
+        id=archived.id,
+        user_id=archived.user_id,
+        title=archived.title,
+        conversation_style=archived.conversation_style,
+        created_at=archived.created_at,
+        updated_at=datetime.utcnow(),
+    ))
+    db.flush()
+    for message in json.loads(zlib.decompress(archived.payload)):
+        db.add(Message(
+            **{**message, 'created_at': datetime.fromisoformat(message['created_at']) if message['created_at'] else None},
+            session_id=archived.id,
+        ))
+    db.delete(archived)
+    db.commit()
+    return True
+
+
+def incremental_vacuum(pages_per_step: int, bind: Engine = engine) -> int:
+    """分步归还空闲页，返回回收的页数（auto_vacuum 不是 INCREMENTAL 时不做任何事）"""
+    reclaimed = 0
+    with bind.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+            return 0
+        while True:
+            before = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            if not before:
+                return reclaimed
+            conn.exec_driver_sql(f"PRAGMA incremental_vacuum({int(pages_per_step)})")
+            conn.commit()
+            after = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            if after >= before:
+                return reclaimed
+            reclaimed += before - after
+            metrics.maintenance_rows.labels(task='vacuum_pages').inc(before - after)
+            _pause()
+
+
+def optimize(analyze: bool = False, bind: Engine = engine) -> None:
+    """更新查询规划器统计信息；PRAGMA optimize 只分析需要的表，代价很小"""
+    with bind.connect() as conn:
+        if analyze:
+            conn.exec_driver_sql("ANALYZE")
+        conn.exec_driver_sql("PRAGMA optimize")
+        conn.commit()
+
+
+def enable_incremental_vacuum(bind: Engine = engine) -> None:
+    """把已有数据库切换到 auto_vacuum=INCREMENTAL（需要一次完整 VACUUM，期间独占数据库）"""
+    with bind.connect() as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+
+
+def _sqlite_status(report: MaintenanceReport, bind: Engine = engine) -> None:
+    """累加文件与空闲页大小；auto_vacuum 取主库的设置，任一分片库不是 INCREMENTAL 时也提示"""
+    with bind.connect() as conn:
+        page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+        report.file_bytes = (report.file_bytes or 0) + conn.exec_driver_sql("PRAGMA page_count").scalar() * page_size
+        report.freelist_bytes += conn.exec_driver_sql("PRAGMA freelist_count").scalar() * page_size
+        auto_vacuum = _AUTO_VACUUM_MODES.get(conn.exec_driver_sql("PRAGMA auto_vacuum").scalar())
+    if report.auto_vacuum is None:
+        report.auto_vacuum = auto_vacuum
+    note = ('auto_vacuum 不是 INCREMENTAL，删除数据后文件不会缩小；'
+            '执行 python -m app.cli maintenance --enable-incremental-vacuum 切换（需要一次完整 VACUUM）')
+    if auto_vacuum != 'incremental' and note not in report.notes:
+        report.notes.append(note)
+
+
+def _retain(
+    db: Session, report: MaintenanceReport, audio_cutoff: datetime | None, archive_cutoff: datetime | None,
+    batch_size: int,
+) -> None:
+    """在一个库（主库或分片）中清理音频、归档闲置会话，结果累加到 report"""
+    if report.dry_run:
+        if audio_cutoff:
+            messages, size = db.execute(
+                select(func.count(), func.coalesce(func.sum(func.length(Message.audio_base64)), 0))
+                .where(Message.audio_base64.is_not(None), Message.created_at < audio_cutoff)
+            ).one()
+            report.audio_messages += messages
+            report.audio_bytes += size
+        if archive_cutoff:
+            idle = select(DBSession.id).where(*_idle(archive_cutoff))
+            report.archived_sessions += db.execute(select(func.count()).select_from(idle.subquery())).scalar()
+            messages, size = db.execute(
+                select(func.count(), func.coalesce(func.sum(_message_bytes(audio_cutoff)), 0))
+                .where(Message.session_id.in_(idle))
+            ).one()
+            report.archived_messages += messages
+            report.archived_bytes += size
+        return
+    if audio_cutoff:
+        messages, size = drop_old_audio(db, audio_cutoff, batch_size)
+        report.audio_messages += messages
+        report.audio_bytes += size
+    if archive_cutoff:
+        sessions, messages, size = archive_idle_sessions(db, archive_cutoff, batch_size)
+        report.archived_sessions += sessions
+        report.archived_messages += messages
+        report.archived_bytes += size
+
+
+def run(dry_run: bool = False, analyze: bool = False) -> MaintenanceReport:
+    """执行一轮维护；dry_run 时只统计可回收的空间"""
+    settings = get_settings()
+    batch_size = max(1, settings.maintenance_batch_size)
+    audio_cutoff = _cutoff(settings.retention_audio_days)
+    archive_cutoff = _cutoff(settings.retention_archive_idle_days)
+    report = MaintenanceReport(dry_run=dry_run)
+    is_sqlite = engine.dialect.name == 'sqlite'
+
+    locations = shard_locations()
+    for shard in locations:
+        db = shard_session(shard)
+        try:
+            _retain(db, report, audio_cutoff, archive_cutoff, batch_size)
+        finally:
+            db.close()
+
+    if not dry_run:
+        # 淘汰按 last_used_at 排序，先写回累计的命中
+        feedback_cache.flush_hits()
+    db = SessionLocal()
+    try:
+        report.feedback_cache_evicted = feedback_cache.trim(
+            db, settings.feedback_cache_max_entries, settings.feedback_cache_ttl_days, dry_run=dry_run,
+        )
+        if not dry_run:
+            metrics.maintenance_rows.labels(task='feedback_cache').inc(report.feedback_cache_evicted)
+    finally:
+        db.close()
+
+    if is_sqlite:
+        for shard in locations:
+            bind = shard_engine(shard)
+            if not dry_run:
+                report.vacuumed_pages += incremental_vacuum(settings.maintenance_vacuum_pages, bind)
+                optimize(analyze=analyze, bind=bind)
+            _sqlite_status(report, bind)
+    if not dry_run:
+        metrics.maintenance_last_success.set(time.time())
+    return report
+
+
+async def run_periodically(interval: float) -> None:
+    """后台定期维护，在线程池中执行，失败只记录日志"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            report = await run_in_threadpool(run)
+            logger.info("Maintenance finished: %s", report.to_dict())
+        except Exception:
+            logger.exception("Maintenance failed")
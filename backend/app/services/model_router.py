@@ -0,0 +1,169 @@
+"""Gemini 模型路由：每个任务按顺序尝试多个模型，根据滚动延迟与错误率故障转移
+
+每个任务配置一组模型，格式为 "模型名@超时秒数"，逗号分隔，省略超时时使用 GEMINI_TIMEOUT：
+
+    CHAT_MODELS=gemini-2.5-flash@15,gemini-2.0-flash@20
+    FEEDBACK_MODELS=gemini-2.0-flash-lite@8,gemini-2.0-flash@15
+    TITLE_MODELS=gemini-2.0-flash-lite@5,gemini-2.0-flash@10
+
+- 每个模型一个熔断器（失败率滑动窗口），熔断期间跳过；所有模型都熔断时仍尝试第一个熔断的模型
+- 记录最近成功调用的耗时；预计耗时（p90）超过本次可用时间、且后面还有模型时先跳过
+- 单次调用失败或超时后，在 GEMINI_DEADLINE 剩余时间内尝试下一个模型
+- 调用方只在最后一个候选模型上做传输层重试，前面的模型失败立即转移
+"""
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Iterable, TypeVar
+
+from fastapi import HTTPException, status
+
+from app import metrics
+from app.services.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# 至少有这么多次成功调用后才按延迟跳过模型
+MIN_LATENCY_SAMPLES = 5
+
+
+@dataclass(frozen=True)
+class Route:
+    model: str
+    timeout: float
+
+
+def parse_routes(entries: Iterable[str], default_timeout: float) -> list[Route]:
+    """解析 "模型名@超时秒数" 列表"""
+    routes = []
+    for entry in entries:
+        model, _, timeout = entry.strip().partition('@')
+        if model:
+            routes.append(Route(model=model.strip(), timeout=float(timeout) if timeout else default_timeout))
+    return routes
+
+
+class ModelHealth:
+    """单个模型的熔断器与最近成功调用的耗时"""
+
+    def __init__(self, model: str, window: int, open_seconds: float):
+        self.model = model
+        self.breaker = CircuitBreaker(f'gemini:{model}', window_size=window, open_seconds=open_seconds)
+        self._latencies: deque[float] = deque(maxlen=window)
+        # Gemini 调用在线程池中并发执行
+        self._lock = threading.Lock()
+
+    def expected_latency(self) -> float | None:
+        """最近成功调用耗时的 p90，样本不足时返回 None"""
+        with self._lock:
+            if len(self._latencies) < MIN_LATENCY_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+
+    def record(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self._latencies.append(seconds)
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+    def snapshot(self) -> dict:
+        expected = self.expected_latency()
+        return {
+            **self.breaker.snapshot(),
+            'model': self.model,
+            'p90_ms': round(expected * 1000, 1) if expected is not None else None,
+        }
+
+
+class ModelRouter:
+    def __init__(self, routes: dict[str, list[Route]], deadline: float, window: int = 20, open_seconds: float = 30.0):
+        self.routes = routes
+        self.deadline = deadline
+        self._health = {
+            route.model: ModelHealth(route.model, window, open_seconds)
+            for task_routes in routes.values() for route in task_routes
+        }
+
+    def call(self, task: str, fn: Callable[[str, float, bool], T]) -> tuple[T, str]:
+        """按任务的路由依次执行 fn(模型名, 超时秒数, 是否最后一个候选)，返回 (结果, 实际使用的模型)"""
+        deadline = time.monotonic() + self.deadline
+        routes = self.routes[task]
+        slow: list[Route] = []
+        open_routes: list[Route] = []
+        last_error: Exception | None = None
+
+        for index, route in enumerate(routes):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            health = self._health[route.model]
+            expected = health.expected_latency()
+            if expected is not None and expected > min(route.timeout, remaining) and index < len(routes) - 1:
+                # 截止时间有风险：先试后面的模型，都失败时再回来
+                metrics.gemini_failovers.labels(task=task, model=route.model, reason='slow').inc()
+                slow.append(route)
+                continue
+            if not health.breaker.allow_request():
+                metrics.gemini_failovers.labels(task=task, model=route.model, reason='open').inc()
+                open_routes.append(route)
+                continue
+            last = index == len(routes) - 1 and not slow
+            try:
+                return self._attempt(route, min(route.timeout, remaining), fn, last), route.model
+            except Exception as exc:
+                metrics.gemini_failovers.labels(task=task, model=route.model, reason='error').inc()
+                logger.warning("Gemini model %s failed for %s: %s", route.model, task, exc)
+                last_error = exc
+
+        for index, route in enumerate(slow):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                return self._attempt(route, min(route.timeout, remaining), fn, index == len(slow) - 1), route.model
+            except Exception as exc:
+                last_error = exc
+
+        if last_error is None and open_routes and not slow:
+            # 所有模型都已熔断（如只配置了一个模型）：熔断只用于故障转移排序，仍尝试第一个，
+            # 避免一阵 429/5xx 之后在冷却期内整体返回 503
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                route = open_routes[0]
+                try:
+                    return self._attempt(route, min(route.timeout, remaining), fn, True), route.model
+                except Exception as exc:
+                    last_error = exc
+
+        if isinstance(last_error, HTTPException):
+            raise last_error
+        if last_error is not None:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail='AI 服务调用失败') from last_error
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='AI 模型暂时不可用')
+
+    def _attempt(self, route: Route, timeout: float, fn: Callable[[str, float, bool], T], last: bool) -> T:
+        started = time.perf_counter()
+        try:
+            result = fn(route.model, timeout, last)
+        except Exception:
+            self._health[route.model].record(time.perf_counter() - started, ok=False)
+            raise
+        self._health[route.model].record(time.perf_counter() - started, ok=True)
+        return result
+
+    def available(self, task: str) -> bool:
+        """任务是否还有未熔断的模型"""
+        return any(self._health[route.model].breaker.state != 'open' for route in self.routes[task])
+
+    def snapshot(self) -> dict:
+        return {
+            'routes': {task: [route.model for route in routes] for task, routes in self.routes.items()},
+            'models': [health.snapshot() for health in self._health.values()],
+        }
@@ -0,0 +1,406 @@
+"""复习提醒：每天在用户本地的提醒时段，向 User.push_url 推送待复习的收藏数
+
+收藏的下次复习时间记录在 favorites.due_at（按熟悉度间隔计算，已掌握为空）。每次扫描：
+
+1. 为旧数据补算 due_at（分批，每个库在进程内只补算一次）；释放占位超时仍为 pending 的行（发送后回写失败），让这些用户当天重发
+2. 取出有推送地址的用户使用的时区，用缓存的 ZoneInfo 算出当前处于提醒时段的时区及其本地日期
+3. 在主库找出这些时区中有推送地址、今天还没提醒过的用户，再在各自所在的库（主库或分片）
+   按 (due_at, user_id) 覆盖索引只统计这些用户的到期收藏数（GROUP BY user_id）
+4. 为今天还没提醒过的用户插入 reminder_deliveries 占位行（唯一约束保证多个 worker 不会重复发送）
+5. 解析推送主机，拒绝内网、回环、链路本地等非公网地址，并固定连接到检查过的 IP（防止 SSRF 与
+   DNS 重绑定）；共用一个连接池的 httpx.AsyncClient 并发推送，连接失败、429 与 5xx 按指数退避重试
+6. 分批回写发送结果
+
+推送为 POST JSON（title/body/group），兼容 Bark（push_url 形如 https://api.day.app/KEY）
+和一般的 webhook。
+"""
+import asyncio
+import logging
+import random
+import socket
+import time
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import metrics
+from app.config import get_settings
+from app.database import SessionLocal, shard_locations, shard_session
+from app.models import Favorite, ReminderDelivery, User
+from app.timezone_utils import get_zone
+from app.url_safety import allowed_push_hosts, check_push_url, is_public_host
+
+logger = logging.getLogger(__name__)
+
+# 按熟悉度的复习间隔（从上次复习算起，未复习过从收藏时算起）；不在表中的（mastered）不再提醒
+REVIEW_INTERVALS = {
+    'new': timedelta(days=1),
+    'learning': timedelta(days=1),
+    'review': timedelta(days=4),
+}
+
+_INSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+_USER_CHUNK = 500
+
+# 已完成 due_at 补算的库（None 为主库）；之后写入的收藏都会设置 due_at，不必每次扫描都检查
+_backfilled: set[int | None] = set()
+
+
+def next_due(mastery: str | None, created_at: datetime | None, last_reviewed_at: datetime | None) -> datetime | None:
+    interval = REVIEW_INTERVALS.get(mastery or 'new')
+    if interval is None:
+        return None
+    return (last_reviewed_at or created_at or datetime.utcnow()) + interval
+
+
+async def resolve_hosts(hosts: set[tuple[str, int]]) -> dict[tuple[str, int], str | None]:
+    """解析推送主机：返回检查过的公网 IP，任一解析结果不是公网地址或解析失败时为 None"""
+    loop = asyncio.get_running_loop()
+
+    async def resolve(host: str, port: int) -> str | None:
+        try:
+            infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError:
+            return None
+        addresses = [info[4][0] for info in infos]
+        if not addresses or not all(is_public_host(address) for address in addresses):
+            return None
+        return addresses[0]
+
+    keys = list(hosts)
+    return dict(zip(keys, await asyncio.gather(*(resolve(host, port) for host, port in keys))))
+
+
+def _target(url: str) -> tuple[httpx.URL, tuple[str, int]]:
+    parsed = httpx.URL(url)
+    return parsed, (parsed.raw_host.decode('ascii').lower(), parsed.port or (443 if parsed.scheme == 'https' else 80))
+
+
+@dataclass
+class Delivery:
+    id: int
+    user_id: int
+    push_url: str
+    due_count: int
+
+
+@dataclass
+class DispatchReport:
+    dry_run: bool
+    backfilled: int = 0
+    zones_in_window: int = 0
+    candidates: int = 0
+    released: int = 0  # 超时未回写、释放后重发的占位行
+    claimed: int = 0
+    sent: int = 0
+    failed: int = 0
+    attempts: int = 0
+    scan_seconds: float = 0.0  # 补算、候选查询与占位
+    seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def backfill_due(db: Session, batch_size: int) -> int:
+    """为 due_at 为空且未掌握的收藏补算下次复习时间，每批一个事务"""
+    total = 0
+    while True:
+        rows = db.execute(
+            select(Favorite.id, Favorite.mastery, Favorite.created_at, Favorite.last_reviewed_at)
+            .where(Favorite.due_at.is_(None), or_(Favorite.mastery.is_(None), Favorite.mastery.in_(REVIEW_INTERVALS)))
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return total
+        db.execute(update(Favorite), [
+            {'id': favorite_id, 'due_at': next_due(mastery, created_at, last_reviewed_at)}
+            for favorite_id, mastery, created_at, last_reviewed_at in rows
+        ])
+        db.commit()
+        total += len(rows)
+
+
+def zones_in_window(db: Session, now: datetime) -> dict[str | None, date]:
+    """有推送地址的用户所用时区中，当前处于提醒时段的时区 -> 本地日期"""
+    settings = get_settings()
+    start = settings.reminder_hour * 60
+    end = start + settings.reminder_window_hours * 60
+    aware = now.replace(tzinfo=timezone.utc)
+    zones: dict[str | None, date] = {}
+    names = db.scalars(select(User.timezone).where(User.push_url.isnot(None), User.push_url != '').distinct())
+    for name in names:
+        local = aware.astimezone(get_zone(name))
+        minutes = local.hour * 60 + local.minute
+        # 时段可能跨过午夜：把午夜后的时间加一天再比较
+        if start <= minutes < end or start <= minutes + 24 * 60 < end:
+            zones[name] = local.date()
+    return zones
+
+
+def due_counts(db: Session, now: datetime, user_ids: list[int]) -> dict[int, int]:
+    """一个库中指定用户的到期收藏数，没有到期收藏的用户不返回（只读 ix_favorites_due_at_user_id 覆盖索引）
+
+    按 user_id + 0 过滤与分组：直接用列时 SQLite 会为了省去排序改走 (user_id, created_at) 索引并扫描整表。
+    用户按 _USER_CHUNK 分批，避免超出 SQLite 的参数个数上限。
+    """
+    user_id = Favorite.user_id + 0
+    counts: dict[int, int] = {}
+    for start in range(0, len(user_ids), _USER_CHUNK):
+        counts.update(db.execute(
+            select(user_id, func.count())
+            .where(Favorite.due_at <= now, user_id.in_(user_ids[start:start + _USER_CHUNK]))
+            .group_by(user_id)
+        ).all())
+    return counts
+
+
+def find_candidates(db: Session, now: datetime, zones: dict[str | None, date]) -> list[tuple[int, str, int, date]]:
+    """处于提醒时段、有到期收藏且今天还没提醒过的用户：(user_id, push_url, 到期数, 本地日期)
+
+    users 在主库而收藏可能在分片库，不能联表：先取出候选用户，再按所在的库统计到期数。
+    """
+    if not zones:
+        return []
+    named = [name for name in zones if name is not None]
+    in_zone = User.timezone.in_(named)
+    if None in zones:
+        in_zone = or_(in_zone, User.timezone.is_(None))
+    last_day = (
+        select(func.max(ReminderDelivery.day))
+        .where(ReminderDelivery.user_id == User.id)
+        .scalar_subquery()
+    )
+    rows = db.execute(
+        select(User.id, User.push_url, User.timezone, User.shard, last_day)
+        .where(User.push_url.isnot(None), User.push_url != '', User.is_active, in_zone)
+    ).all()
+    eligible: dict[int | None, list[tuple[int, str, date]]] = {}
+    for user_id, push_url, name, shard, reminded in rows:
+        today = zones.get(name)
+        if today is not None and (reminded is None or reminded < today):
+            eligible.setdefault(shard, []).append((user_id, push_url, today))
+
+    candidates = []
+    for shard, users in eligible.items():
+        user_ids = [user_id for user_id, _, _ in users]
+        if shard is None:
+            counts = due_counts(db, now, user_ids)
+        else:
+            shard_db = shard_session(shard)
+            try:
+                counts = due_counts(shard_db, now, user_ids)
+            finally:
+                shard_db.close()
+        candidates.extend(
+            (user_id, push_url, counts[user_id], today) for user_id, push_url, today in users if user_id in counts
+        )
+    return candidates
+
+
+def release_stale(db: Session, cutoff: datetime) -> int:
+    """删除 cutoff 之前占位、仍为 pending 的行（发送后回写失败），用户重新成为候选
+
+    推送可能已经送达，此时用户会再收到一次（至少一次语义）。
+    """
+    released = db.execute(
+        delete(ReminderDelivery).where(ReminderDelivery.status == 'pending', ReminderDelivery.created_at < cutoff),
+        execution_options={'synchronize_session': False},
+    ).rowcount
+    db.commit()
+    return released
+
+
+def claim(db: Session, candidates: list[tuple[int, str, int, date]]) -> list[Delivery]:
+    """插入占位行；已被其它 worker 或上一次扫描占用的 (user_id, day) 跳过"""
+    rows = [
+        {'user_id': user_id, 'day': day, 'due_count': due_count, 'status': 'pending', 'attempts': 0}
+        for user_id, _, due_count, day in candidates
+    ]
+    urls = {user_id: push_url for user_id, push_url, _, _ in candidates}
+    insert = _INSERT_DIALECTS.get(db.get_bind().dialect.name)
+    claimed: list[tuple[int, int, int]] = []
+    if insert is not None:
+        stmt = insert(ReminderDelivery).on_conflict_do_nothing(index_elements=['user_id', 'day']).returning(
+            ReminderDelivery.id, ReminderDelivery.user_id, ReminderDelivery.due_count,
+        )
+        # executemany + RETURNING：冲突跳过的行不返回
+        claimed = list(db.execute(stmt, rows).all())
+    else:
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    delivery = ReminderDelivery(**row)
+                    db.add(delivery)
+                    db.flush()
+                claimed.append((delivery.id, delivery.user_id, delivery.due_count))
+            except IntegrityError:
+                pass
+    db.commit()
+    return [Delivery(id, user_id, urls[user_id], due_count) for id, user_id, due_count in claimed]
+
+
+def record(db: Session, results: list[dict[str, Any]], batch_size: int) -> None:
+    """按主键批量回写发送结果"""
+    for start in range(0, len(results), batch_size):
+        db.execute(update(ReminderDelivery), results[start:start + batch_size])
+        db.commit()
+
+
+def _message(due_count: int) -> dict[str, Any]:
+    return {
+        'title': '复习提醒',
+        'body': f'今天有 {due_count} 条收藏待复习',
+        'group': 'review',
+        'isArchive': 1,
+    }
+
+
+def _pinned_request(delivery: Delivery, addresses: dict[tuple[str, int], str | None]) -> dict[str, Any]:
+    """client.post 的参数：不在白名单中的主机改为连接已检查的 IP，Host 头与 TLS SNI 仍使用原主机名"""
+    url = check_push_url(delivery.push_url)
+    parsed, key = _target(url)
+    request: dict[str, Any] = {'url': parsed, 'json': _message(delivery.due_count)}
+    if key[0] in allowed_push_hosts():
+        return request
+    address = addresses.get(key)
+    if address is None:
+        raise ValueError('推送地址无法解析或指向内网地址')
+    request.update(
+        url=parsed.copy_with(host=address),
+        headers={'Host': parsed.netloc.decode('ascii')},
+        extensions={'sni_hostname': key[0]},
+    )
+    return request
+
+
+async def _send(
+    client: httpx.AsyncClient, semaphore: asyncio.Semaphore, delivery: Delivery, report: DispatchReport,
+    addresses: dict[tuple[str, int], str | None],
+) -> dict[str, Any]:
+    settings = get_settings()
+    result: dict[str, Any] = {
+        'id': delivery.id, 'status': 'failed', 'attempts': 0, 'http_status': None, 'error': None, 'sent_at': None,
+    }
+    try:
+        request = _pinned_request(delivery, addresses)
+    except ValueError as exc:
+        result['error'] = str(exc)[:255]
+        return result
+    while True:
+        result['attempts'] += 1
+        report.attempts += 1
+        metrics.reminder_attempts.inc()
+        try:
+            async with semaphore:
+                response = await client.post(**request)
+            result['http_status'] = response.status_code
+            if response.status_code < 400:
+                result.update(status='sent', error=None, sent_at=datetime.utcnow())
+                return result
+            retryable = response.status_code == 429 or response.status_code >= 500
+            result['error'] = f'HTTP {response.status_code}'
+        except httpx.HTTPError as exc:
+            retryable = True
+            result['error'] = (str(exc) or exc.__class__.__name__)[:255]
+        if not retryable or result['attempts'] >= settings.reminder_max_attempts:
+            return result
+        # 退避期间不占用并发名额
+        await asyncio.sleep(settings.reminder_backoff * 2 ** (result['attempts'] - 1) * (0.5 + random.random()))
+
+
+def _prepare(now: datetime, dry_run: bool, report: DispatchReport) -> list[Delivery]:
+    settings = get_settings()
+    db = SessionLocal()
+    try:
+        if not dry_run:
+            for shard in shard_locations():
+                if shard in _backfilled:
+                    continue
+                shard_db = shard_session(shard)
+                try:
+                    report.backfilled += backfill_due(shard_db, settings.maintenance_batch_size)
+                finally:
+                    shard_db.close()
+                _backfilled.add(shard)
+            # 按实际时间判断超时（now 可由调用方指定）
+            cutoff = datetime.utcnow() - timedelta(seconds=settings.reminder_pending_timeout)
+            report.released = release_stale(db, cutoff)
+        zones = zones_in_window(db, now)
+        report.zones_in_window = len(zones)
+        candidates = find_candidates(db, now, zones)
+        report.candidates = len(candidates)
+        if dry_run or not candidates:
+            return []
+        deliveries = claim(db, candidates)
+        report.claimed = len(deliveries)
+        return deliveries
+    finally:
+        db.close()
+
+
+def _record(results: list[dict[str, Any]]) -> None:
+    db = SessionLocal()
+    try:
+        record(db, results, get_settings().maintenance_batch_size)
+    finally:
+        db.close()
+
+
+async def dispatch(now: datetime | None = None, dry_run: bool = False) -> DispatchReport:
+    """执行一次扫描与发送；dry_run 只统计候选用户，不补算、不占位、不发送"""
+    settings = get_settings()
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    report = DispatchReport(dry_run=dry_run)
+    deliveries = await run_in_threadpool(_prepare, now, dry_run, report)
+    report.scan_seconds = round(time.perf_counter() - started, 3)
+
+    if deliveries:
+        concurrency = max(1, settings.reminder_concurrency)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        semaphore = asyncio.Semaphore(concurrency)
+        # 每个主机只解析一次（Bark 用户共用 api.day.app）
+        allowed = allowed_push_hosts()
+        hosts = set()
+        for delivery in deliveries:
+            try:
+                _, key = _target(delivery.push_url)
+            except httpx.InvalidURL:
+                continue
+            if key[0] not in allowed:
+                hosts.add(key)
+        addresses = await resolve_hosts(hosts)
+        # 不跟随重定向：跳转目标没有经过地址检查
+        async with httpx.AsyncClient(timeout=settings.reminder_timeout, limits=limits) as client:
+            results = await asyncio.gather(*(_send(client, semaphore, d, report, addresses) for d in deliveries))
+        for result in results:
+            metrics.reminder_deliveries.labels(result=result['status']).inc()
+            if result['status'] == 'sent':
+                report.sent += 1
+            else:
+                report.failed += 1
+        await run_in_threadpool(_record, list(results))
+
+    report.seconds = round(time.perf_counter() - started, 3)
+    metrics.reminder_pass_duration.observe(report.seconds)
+    return report
+
+
+async def run_periodically(interval: float) -> None:
+    """后台定期发送提醒，失败只记录日志"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            report = await dispatch()
+            if report.claimed:
+                logger.info("Reminders dispatched: %s", report.to_dict())
+        except Exception:
+            logger.exception("Reminder dispatch failed")
@@ -0,0 +1,210 @@
+"""上游调度：Gemini 与 VOICEVOX 调用前先在这里取得并发额度
+
+每个上游一条通道（Lane），同时执行的调用数不超过其额度，排队的调用按以下规则放行：
+
+- 优先级类别严格优先：对话（INTERACTIVE）> 按需播放（TTS）> 标题（TITLE）> 预取等后台任务（BACKGROUND）
+- 额度中保留 scheduler_reserved_share 的比例只给前两类，标题与后台任务占满其余额度后只能排队，
+  新的对话不必等在途的后台调用结束
+- 同一类别内按用户做加权公平排队（虚拟完成时间，权重为 1，代价为调用成本：Gemini 每次 1，
+  VOICEVOX 为文本字数），一个用户的大批量预取不会挤占其他用户
+- 除对话外各类别有最长排队时间，超时即丢弃并返回 503，过时的后台任务不再占用上游
+
+调用方用 classify() 标记之后的上游调用属于哪一类、哪个用户（contextvar，会被其中创建的任务
+和线程池调用继承），未标记时视为匿名的对话调用。
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, AsyncIterator, Callable, Iterator, TypeVar
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+from app import metrics
+
+T = TypeVar('T')
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # 对话回复、纠错反馈与对话语音
+    TTS = 1  # 按需播放（/api/tts）
+    TITLE = 2  # 会话标题
+    BACKGROUND = 3  # 预取（/api/tts/batch）等后台任务
+
+    @property
+    def label(self) -> str:
+        return self.name.lower()
+
+
+@dataclass(frozen=True)
+class Work:
+    priority: Priority
+    user: str
+
+
+_current: ContextVar[Work] = ContextVar('upstream_work', default=Work(Priority.INTERACTIVE, 'anonymous'))
+
+
+def current() -> Work:
+    return _current.get()
+
+
+@contextmanager
+def classify(priority: Priority, user: str) -> Iterator[None]:
+    """标记 with 块内（及其中创建的任务）发起的上游调用"""
+    token = _current.set(Work(priority, user))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class UpstreamBusy(HTTPException):
+    """排队超过该类别的最长等待时间，调用被丢弃"""
+
+    def __init__(self):
+        super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='服务繁忙，请稍后再试')
+
+
+@dataclass(order=True)
+class _Waiter:
+    tag: float
+    seq: int
+    future: asyncio.Future = field(compare=False)
+
+
+class Lane:
+    """单个上游的并发额度与按优先级、用户公平排序的等待队列（只在事件循环中访问）"""
+
+    def __init__(self, name: str, capacity: int, reserved: int, max_wait: dict[Priority, float | None]):
+        self.name = name
+        self.capacity = capacity
+        # 标题与后台任务最多占用的额度
+        self.shared = max(1, capacity - reserved)
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._queues: dict[Priority, list[_Waiter]] = {priority: [] for priority in Priority}
+        # 每个类别的虚拟时间与各用户最近一次排队的虚拟完成时间
+        self._vtime = {priority: 0.0 for priority in Priority}
+        self._finish: dict[Priority, dict[str, float]] = {priority: {} for priority in Priority}
+        self._seq = itertools.count()
+
+    def _allowed(self, priority: Priority) -> bool:
+        limit = self.capacity if priority <= Priority.TTS else self.shared
+        return self.in_flight < limit
+
+    def _higher_waiting(self, priority: Priority) -> bool:
+        return any(self._queues[p] for p in Priority if p <= priority)
+
+    async def acquire(self, work: Work, cost: float) -> None:
+        priority = work.priority
+        labels = {'upstream': self.name, 'priority': priority.label}
+        if self._allowed(priority) and not self._higher_waiting(priority):
+            self.in_flight += 1
+            metrics.upstream_queue_wait.labels(**labels).observe(0)
+            return
+
+        finish = self._finish[priority]
+        tag = max(self._vtime[priority], finish.get(work.user, 0.0)) + max(cost, 1.0)
+        finish[work.user] = tag
+        waiter = _Waiter(tag, next(self._seq), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queues[priority], waiter)
+        metrics.upstream_queue_depth.labels(**labels).inc()
+        started = time.perf_counter()
+        # 队首可能只剩已放弃的条目，入队后立即尝试放行
+        self._dispatch()
+        try:
+            await asyncio.wait_for(waiter.future, self.max_wait.get(priority))
+        except asyncio.TimeoutError:
+            metrics.upstream_dropped.labels(**labels).inc()
+            raise UpstreamBusy() from None
+        except BaseException:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 已分到额度但调用方被取消
+                self.release()
+            raise
+        finally:
+            if waiter.future.cancelled():
+                # 超时或取消：留在堆中的条目在放行时跳过，低优先级不再被它挡住
+                metrics.upstream_queue_depth.labels(**labels).dec()
+                self._dispatch()
+        metrics.upstream_queue_wait.labels(**labels).observe(time.perf_counter() - started)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        for priority in Priority:
+            queue = self._queues[priority]
+            while queue and self._allowed(priority):
+                waiter = heapq.heappop(queue)
+                if waiter.future.done():
+                    continue
+                self._vtime[priority] = waiter.tag
+                self._forget(priority)
+                self.in_flight += 1
+                metrics.upstream_queue_depth.labels(upstream=self.name, priority=priority.label).dec()
+                waiter.future.set_result(None)
+            if queue:
+                # 高优先级仍有排队时不放行低优先级
+                return
+
+    def _forget(self, priority: Priority) -> None:
+        """虚拟完成时间已落后于虚拟时间的用户不再需要记录"""
+        vtime = self._vtime[priority]
+        finish = self._finish[priority]
+        for user in [user for user, tag in finish.items() if tag <= vtime]:
+            del finish[user]
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            'capacity': self.capacity,
+            'in_flight': self.in_flight,
+            'queued': {
+                priority.label: sum(1 for waiter in self._queues[priority] if not waiter.future.done())
+                for priority in Priority
+            },
+        }
+
+
+class Scheduler:
+    """capacities 中没有的上游不做限制（SCHEDULER_ENABLED=false 时为空）"""
+
+    def __init__(self, capacities: dict[str, int], reserved_share: float, max_wait: dict[Priority, float | None]):
+        # 保留额度向上取整，但至少给标题与后台任务留一个
+        self.lanes = {
+            name: Lane(name, capacity, min(capacity - 1, math.ceil(capacity * reserved_share)), max_wait)
+            for name, capacity in capacities.items()
+        }
+
+    @asynccontextmanager
+    async def slot(self, upstream: str, cost: float = 1.0) -> AsyncIterator[None]:
+        """占用上游的一个并发额度，按当前 classify() 的类别与用户排队"""
+        lane = self.lanes.get(upstream)
+        if lane is None:
+            yield
+            return
+        await lane.acquire(current(), cost)
+        try:
+            yield
+        finally:
+            lane.release()
+
+    async def gemini(self, fn: Callable[..., T], *args: Any) -> T:
+        """取得 Gemini 额度后在线程池中执行阻塞的 SDK 调用；排队期间不占用线程"""
+        async with self.slot('gemini'):
+            return await run_in_threadpool(fn, *args)
+
+    def sample_metrics(self) -> None:
+        for name, lane in self.lanes.items():
+            metrics.upstream_in_flight.labels(upstream=name).set(lane.in_flight)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {name: lane.snapshot() for name, lane in self.lanes.items()}
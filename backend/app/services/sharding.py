@@ -0,0 +1,139 @@
+"""分片迁移与再平衡：把用户的会话、消息、收藏等搬到 SHARD_COUNT 对应的分片
+
+用户所在分片由 users.shard 决定（为空表示主库），目标分片为 user_id % SHARD_COUNT（SHARD_COUNT=0 时为主库）。
+从单库开启分片、增减分片数或关闭分片都是同一个操作：逐个搬迁位置与目标不一致的用户。
+
+搬迁一个用户：
+1. 源库 BEGIN IMMEDIATE，阻止该库在复制期间写入
+2. 清掉目标库中上次中断留下的副本，按批复制各表，提交
+3. 更新 users.shard（主库是源或目标时与该库的事务一起提交）
+4. 删除源库中的数据，提交
+
+任一步失败时 users.shard 仍指向源库，重新执行即可。搬迁期间该用户正在进行的写入可能失败，
+建议在低峰期执行。
+"""
+import time
+from dataclasses import asdict, dataclass, field
+
+from sqlalchemy import Connection, Table, delete, func, insert, select, update
+
+from app.config import get_settings
+from app.database import (
+    assign_shard, engine, init_shard, shard_engine, shard_locations, shard_users, sharded_tables,
+)
+from app.models import Message, Session as DBSession, User
+
+
+@dataclass
+class RebalanceReport:
+    dry_run: bool
+    shard_count: int
+    pending: int = 0  # 位置与目标不一致的用户数
+    moved: int = 0
+    rows: dict[str, int] = field(default_factory=dict)  # 各表搬迁的行数
+    moves: dict[str, int] = field(default_factory=dict)  # "源->目标": 用户数
+    seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _label(shard: int | None) -> str:
+    return 'main' if shard is None else str(shard)
+
+
+def _owned(table: Table, user_id: int):
+    """表中属于该用户的行：消息通过会话归属"""
+    if table.name == Message.__tablename__:
+        return table.c.session_id.in_(select(DBSession.id).where(DBSession.user_id == user_id))
+    return table.c.user_id == user_id
+
+
+def _delete_user(conn: Connection, shard: int | None, user_id: int) -> None:
+    # 子表在前；分片库中再删除占位行
+    for table in reversed(sharded_tables()):
+        conn.execute(delete(table).where(_owned(table, user_id)))
+    if shard is not None:
+        conn.execute(delete(shard_users).where(shard_users.c.id == user_id))
+
+
+def _copy(source: Connection, target: Connection, user_id: int, batch_size: int) -> dict[str, int]:
+    copied = {}
+    for table in sharded_tables():
+        count = 0
+        result = source.execution_options(yield_per=batch_size).execute(select(table).where(_owned(table, user_id)))
+        for rows in result.mappings().partitions():
+            target.execute(insert(table), [dict(row) for row in rows])
+            count += len(rows)
+        copied[table.name] = count
+    return copied
+
+
+def move_user(user_id: int, source: int | None, target: int | None, batch_size: int) -> dict[str, int]:
+    """把一个用户的数据从 source 搬到 target，返回各表的行数"""
+    set_shard = update(User).where(User.id == user_id).values(shard=target)
+    with shard_engine(source).connect() as src:
+        src.exec_driver_sql("BEGIN IMMEDIATE")
+        with shard_engine(target).connect() as dst:
+            dst.exec_driver_sql("BEGIN IMMEDIATE")
+            _delete_user(dst, target, user_id)
+            if target is not None:
+                dst.execute(insert(shard_users), {'id': user_id})
+            copied = _copy(src, dst, user_id, batch_size)
+            if target is None:
+                dst.execute(set_shard)
+            dst.commit()
+        if source is None:
+            src.execute(set_shard)
+        elif target is not None:
+            with engine.begin() as conn:
+                conn.execute(set_shard)
+        _delete_user(src, source, user_id)
+        src.commit()
+    return copied
+
+
+def rebalance(dry_run: bool = False, user_ids: list[int] | None = None, limit: int | None = None) -> RebalanceReport:
+    """搬迁所有位置与目标不一致的用户；dry_run 只统计"""
+    settings = get_settings()
+    started = time.perf_counter()
+    report = RebalanceReport(dry_run=dry_run, shard_count=settings.shard_count)
+    query = select(User.id, User.shard).order_by(User.id)
+    if user_ids:
+        query = query.where(User.id.in_(user_ids))
+    with engine.connect() as conn:
+        users = conn.execute(query).all()
+    pending = [(user_id, shard, assign_shard(user_id)) for user_id, shard in users if shard != assign_shard(user_id)]
+    report.pending = len(pending)
+    if limit is not None:
+        pending = pending[:limit]
+    for shard in {target for _, _, target in pending if target is not None}:
+        if not dry_run:
+            init_shard(shard)
+
+    for user_id, source, target in pending:
+        key = f'{_label(source)}->{_label(target)}'
+        report.moves[key] = report.moves.get(key, 0) + 1
+        if dry_run:
+            continue
+        for name, count in move_user(user_id, source, target, max(1, settings.maintenance_batch_size)).items():
+            report.rows[name] = report.rows.get(name, 0) + count
+        report.moved += 1
+    report.seconds = round(time.perf_counter() - started, 3)
+    return report
+
+
+def status() -> list[dict]:
+    """每个库（主库与各分片）的用户数与各分片表的行数"""
+    with engine.connect() as conn:
+        placed = dict(conn.execute(select(User.shard, func.count()).group_by(User.shard)).all())
+    result = []
+    for shard in shard_locations():
+        with shard_engine(shard).connect() as conn:
+            counts = {table.name: conn.execute(select(func.count()).select_from(table)).scalar() for table in sharded_tables()}
+            file_bytes = None
+            if conn.dialect.name == 'sqlite':
+                file_bytes = (conn.exec_driver_sql("PRAGMA page_count").scalar()
+                              * conn.exec_driver_sql("PRAGMA page_size").scalar())
+        result.append({'shard': _label(shard), 'users': placed.get(shard, 0), 'rows': counts, 'file_bytes': file_bytes})
+    return result
@@ -0,0 +1,52 @@
+"""语音合成入口：VOICEVOX 优先，熔断时可降级到 Gemini TTS"""
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app import metrics
+from app.config import get_settings
+from app.container import services
+from app.services.audio_profiles import STANDARD, AudioProfile, encode_base64
+from app.services.voicevox import VoicevoxUnavailable
+
+
+async def synthesize(text: str, profile: AudioProfile = STANDARD) -> str:
+    """合成语音并按档位返回 base64 WAV
+
+    VOICEVOX 熔断时立即返回（不等待超时）：开启 tts_fallback_gemini 则改用 Gemini TTS，
+    否则抛出 503。
+    """
+    try:
+        return await services.voicevox.tts(text, profile=profile)
+    except VoicevoxUnavailable:
+        if not get_settings().tts_fallback_gemini:
+            metrics.tts_fallbacks.labels(result='skipped').inc()
+            raise
+
+    try:
+        # Gemini SDK 是同步调用，经调度器排队后放到线程池，避免阻塞事件循环
+        audio = await services.scheduler.gemini(services.gemini.tts, text)
+    except HTTPException:
+        metrics.tts_fallbacks.labels(result='failed').inc()
+        raise
+    metrics.tts_fallbacks.labels(result='gemini').inc()
+    if profile.is_standard:
+        return audio
+    return await run_in_threadpool(encode_base64, audio, profile)
+
+
+async def synthesize_many(
+    texts: list[str], profile: AudioProfile = STANDARD,
+) -> AsyncIterator[tuple[str, str | None, str | None]]:
+    """批量合成，按完成顺序产出 (text, audio_base64, error)"""
+    settings = get_settings()
+    batch = services.voicevox.tts_batch(texts, concurrency=settings.tts_batch_concurrency, profile=profile)
+    async for text, audio, error in batch:
+        if isinstance(error, VoicevoxUnavailable) and settings.tts_fallback_gemini:
+            try:
+                audio = await synthesize(text, profile)
+                error = None
+            except HTTPException as exc:
+                error = exc
+        yield text, audio, str(error.detail) if error else None
@@ -0,0 +1,174 @@
+"""学习统计：按用户、按本地日期增量维护 user_daily_stats
+
+写入消息或收藏时在同一事务中执行一条 upsert，统计接口只读取聚合行，
+不再扫描 messages 并解析 feedback JSON。
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Iterable
+
+from sqlalchemy import case, delete, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models import Favorite, Message, Session as DBSession, User, UserDailyStats
+from app.timezone_utils import local_date
+
+COUNTERS = ('turns', 'score_count', 'score_sum', 'favorites_added', 'favorites_reviewed')
+
+_UPSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def extract_score(feedback: Any) -> int | None:
+    """从 feedback JSON 中取出 naturalnessScore"""
+    if not isinstance(feedback, dict):
+        return None
+    score = feedback.get('naturalnessScore')
+    if isinstance(score, bool) or not isinstance(score, (int, float)):
+        return None
+    return int(score)
+
+
+def record_message(db: Session, user: User, role: str, feedback: Any, created_at: datetime | None = None) -> None:
+    """保存消息时调用（不提交，随消息一起提交）"""
+    score = extract_score(feedback)
+    _upsert(
+        db, user.id, local_date(created_at or datetime.utcnow(), user.timezone),
+        turns=1 if role == 'user' else 0,
+        score_count=1 if score is not None else 0,
+        score_sum=score or 0,
+        score_min=score,
+        score_max=score,
+    )
+
+
+def record_favorite_added(db: Session, user: User, created_at: datetime | None = None) -> None:
+    _upsert(db, user.id, local_date(created_at or datetime.utcnow(), user.timezone), favorites_added=1)
+
+
+def record_favorite_reviewed(db: Session, user: User, reviewed_at: datetime | None = None) -> None:
+    _upsert(db, user.id, local_date(reviewed_at or datetime.utcnow(), user.timezone), favorites_reviewed=1)
+
+
+def record_many(
+    db: Session,
+    user: User,
+    messages: Iterable[tuple[str, Any, datetime | None]] = (),
+    favorites: Iterable[tuple[datetime | None, datetime | None]] = (),
+) -> None:
+    """批量写入（如导入）时按天聚合后每天一次 upsert
+
+    messages 为 (role, feedback, created_at)，favorites 为 (created_at, last_reviewed_at)。
+    """
+    rows: dict[date, dict[str, Any]] = defaultdict(_empty_row)
+    now = datetime.utcnow()
+    for role, feedback, created_at in messages:
+        _add_message(rows[local_date(created_at or now, user.timezone)], role, feedback)
+    for created_at, last_reviewed_at in favorites:
+        rows[local_date(created_at or now, user.timezone)]['favorites_added'] += 1
+        if last_reviewed_at is not None:
+            rows[local_date(last_reviewed_at, user.timezone)]['favorites_reviewed'] += 1
+    for day, row in rows.items():
+        _upsert(db, user.id, day, **row)
+
+
+def _empty_row() -> dict[str, Any]:
+    return {**{name: 0 for name in COUNTERS}, 'score_min': None, 'score_max': None}
+
+
+def _add_message(row: dict[str, Any], role: str, feedback: Any) -> None:
+    row['turns'] += 1 if role == 'user' else 0
+    score = extract_score(feedback)
+    if score is not None:
+        row['score_count'] += 1
+        row['score_sum'] += score
+        row['score_min'] = score if row['score_min'] is None else min(row['score_min'], score)
+        row['score_max'] = score if row['score_max'] is None else max(row['score_max'], score)
+
+
+def _upsert(db: Session, user_id: int, day: date, **values) -> None:
+    row = {'user_id': user_id, 'day': day, **{name: values.get(name, 0) for name in COUNTERS},
+           'score_min': values.get('score_min'), 'score_max': values.get('score_max')}
+    upsert = _UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if upsert is None:
+        _merge(db, row)
+        return
+
+    stmt = upsert(UserDailyStats).values(**row)
+    excluded = stmt.excluded
+    current = UserDailyStats.__table__.c
+    updates = {name: current[name] + excluded[name] for name in COUNTERS}
+    # 用 CASE 代替 min()/max()：SQLite 的多参数 min 遇到 NULL 返回 NULL
+    updates['score_min'] = case(
+        (excluded.score_min.is_(None), current.score_min),
+        (current.score_min.is_(None) | (excluded.score_min < current.score_min), excluded.score_min),
+        else_=current.score_min,
+    )
+    updates['score_max'] = case(
+        (excluded.score_max.is_(None), current.score_max),
+        (current.score_max.is_(None) | (excluded.score_max > current.score_max), excluded.score_max),
+        else_=current.score_max,
+    )
+    db.execute(stmt.on_conflict_do_update(index_elements=['user_id', 'day'], set_=updates))
+
+
+def _merge(db: Session, row: dict) -> None:
+    """不支持 ON CONFLICT 的数据库：读出后在 Python 中累加"""
+    stats = db.get(UserDailyStats, (row['user_id'], row['day']))
+    if stats is None:
+        db.add(UserDailyStats(**row))
+        return
+    for name in COUNTERS:
+        setattr(stats, name, getattr(stats, name) + row[name])
+    if row['score_min'] is not None:
+        stats.score_min = row['score_min'] if stats.score_min is None else min(stats.score_min, row['score_min'])
+        stats.score_max = row['score_max'] if stats.score_max is None else max(stats.score_max, row['score_max'])
+
+
+def get_daily_stats(db: Session, user_id: int, start: date, end: date) -> list[UserDailyStats]:
+    return db.execute(
+        select(UserDailyStats)
+        .where(UserDailyStats.user_id == user_id, UserDailyStats.day >= start, UserDailyStats.day <= end)
+        .order_by(UserDailyStats.day)
+    ).scalars().all()
+
+
+def backfill(db: Session, user_ids: Iterable[int] | None = None, batch_size: int = 1000) -> int:
+    """根据已有消息与收藏重建统计，返回写入的行数
+
+    收藏只保存了最近一次复习时间，因此历史的 favorites_reviewed 只能按 last_reviewed_at 计一次。
+    """
+    users = select(User.id, User.timezone)
+    if user_ids is not None:
+        users = users.where(User.id.in_(list(user_ids)))
+    timezones = dict(db.execute(users).all())
+    if not timezones:
+        return 0
+
+    rows: dict[tuple[int, date], dict[str, Any]] = defaultdict(_empty_row)
+
+    messages = db.execute(
+        select(DBSession.user_id, Message.role, Message.feedback, Message.created_at)
+        .join(DBSession, Message.session_id == DBSession.id)
+        .where(DBSession.user_id.in_(list(timezones)))
+        .execution_options(yield_per=batch_size)
+    )
+    for user_id, role, feedback, created_at in messages:
+        _add_message(rows[(user_id, local_date(created_at or datetime.utcnow(), timezones[user_id]))], role, feedback)
+
+    favorites = db.execute(
+        select(Favorite.user_id, Favorite.created_at, Favorite.last_reviewed_at)
+        .where(Favorite.user_id.in_(list(timezones)))
+        .execution_options(yield_per=batch_size)
+    )
+    for user_id, created_at, last_reviewed_at in favorites:
+        rows[(user_id, local_date(created_at or datetime.utcnow(), timezones[user_id]))]['favorites_added'] += 1
+        if last_reviewed_at is not None:
+            rows[(user_id, local_date(last_reviewed_at, timezones[user_id]))]['favorites_reviewed'] += 1
+
+    db.execute(delete(UserDailyStats).where(UserDailyStats.user_id.in_(list(timezones))))
+    values = [{'user_id': user_id, 'day': day, **row} for (user_id, day), row in rows.items()]
+    for start in range(0, len(values), batch_size):
+        db.execute(insert(UserDailyStats), values[start:start + batch_size])
+    db.commit()
+    return len(values)
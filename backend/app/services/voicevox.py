@@ -1,74 +1,416 @@
 """VOICEVOX TTS 服务"""
+import asyncio
 import base64
+import io
+import logging
+import time
+import zipfile
+from collections import OrderedDict
+from contextlib import asynccontextmanager, nullcontext
+from typing import AsyncIterator
+
 import httpx
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from app import metrics, timing
 from app.config import get_settings
+from app.services.audio import concat_wavs, split_sentences
+from app.services.audio_profiles import STANDARD, AudioProfile, encode_base64
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+# Server-Timing 中的阶段名
+_TIMING_PHASES = {
+    'audio_query': 'tts_query',
+    'synthesis': 'tts_synth',
+    'multi_synthesis': 'tts_synth',
+}
+
+
+async def _gather_or_cancel(*aws):
+    """同 asyncio.gather，但任一任务失败时立即取消其余任务，等它们退出（释放引擎名额）后再抛出异常"""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    for task in tasks:
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+    return [task.result() for task in tasks]
+
+
+class VoicevoxUnavailable(HTTPException):
+    """所有引擎都已熔断或不可达时直接拒绝的请求"""
+
+    def __init__(self, detail: str = "VOICEVOX 服务暂不可用（已熔断）"):
+        super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail)
+
+
+class VoicevoxEngineUnreachable(VoicevoxUnavailable):
+    """无法连接到某个引擎，可换下一个引擎重试"""
+
+    def __init__(self, url: str):
+        super().__init__(f"无法连接 VOICEVOX 引擎: {url}")
+
+
+class VoicevoxEngine:
+    """单个 VOICEVOX 引擎实例：独立熔断、记录在途请求数"""
+
+    def __init__(self, url: str, service: "VoicevoxService"):
+        settings = get_settings()
+        self.url = url.rstrip('/')
+        self.outstanding = 0
+        self.multi_synthesis_supported = settings.voicevox_multi_synthesis_size > 1
+        self._service = service
+        self.breaker = CircuitBreaker(
+            f'voicevox:{self.url}',
+            failure_rate_threshold=settings.voicevox_breaker_failure_rate,
+            window_size=settings.voicevox_breaker_window,
+            min_calls=settings.voicevox_breaker_min_calls,
+            open_seconds=settings.voicevox_breaker_open_seconds,
+            half_open_timeout=settings.voicevox_timeout,
+            probe=self.ping,
+            probe_interval=settings.voicevox_probe_interval,
+        )
+
+    @property
+    def available(self) -> bool:
+        return self.breaker.state != 'open'
+
+    async def ping(self) -> bool:
+        """探活：请求 /version 判断引擎是否恢复"""
+        try:
+            response = await self._service.client.get(f"{self.url}/version")
+            return response.status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    def snapshot(self) -> dict:
+        return {**self.breaker.snapshot(), 'url': self.url, 'outstanding': self.outstanding}
 
 
 class VoicevoxService:
     """VOICEVOX TTS 服务封装"""
-    
-    def __init__(self):
+
+    def __init__(self, scheduler: Scheduler | None = None):
         settings = get_settings()
-        self.base_url = settings.voicevox_url
+        # 合成前取得调度额度；为 None 时不排队（如命令行工具）
+        self.scheduler = scheduler
         self.speaker_id = settings.voicevox_speaker
-        
-    async def tts(self, text: str, speaker: int | None = None) -> str:
+        self.timeout = httpx.Timeout(settings.voicevox_timeout, connect=settings.voicevox_connect_timeout)
+        self.engines = [VoicevoxEngine(url, self) for url in settings.voicevox_urls or [settings.voicevox_url]]
+        self.split_chars = settings.voicevox_split_chars
+        self.multi_synthesis_size = settings.voicevox_multi_synthesis_size
+        # 最近合成结果的 LRU 缓存，键为 (text, speaker, 档位)
+        self.cache_size = settings.tts_cache_size
+        self._cache: OrderedDict[tuple[str, int, str], str] = OrderedDict()
+        self._client: httpx.AsyncClient | None = None
+        self._rotation = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """所有引擎共用的连接池，随应用生命周期关闭"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def available(self) -> bool:
+        """任一引擎未熔断即视为可用（不消耗半开试探名额）"""
+        return any(engine.available for engine in self.engines)
+
+    def snapshot(self) -> list[dict]:
+        return [engine.snapshot() for engine in self.engines]
+
+    def sample_metrics(self) -> None:
+        for engine in self.engines:
+            metrics.voicevox_outstanding.labels(engine=engine.url).set(engine.outstanding)
+
+    async def warm_up(self, speakers: list[int] | None = None) -> dict[str, bool]:
+        """启动时在每个引擎上预加载说话人模型，避免首个请求冷启动"""
+        speaker_ids = speakers or [self.speaker_id]
+
+        async def initialize(engine: VoicevoxEngine) -> bool:
+            try:
+                for speaker_id in speaker_ids:
+                    response = await self.client.post(
+                        f"{engine.url}/initialize_speaker",
+                        params={"speaker": speaker_id, "skip_reinit": "true"}
+                    )
+                    response.raise_for_status()
+                return True
+            except httpx.HTTPError as e:
+                logger.warning("VOICEVOX warm-up failed for %s: %s", engine.url, e)
+                engine.breaker.record_failure()
+                return False
+
+        results = await asyncio.gather(*(initialize(engine) for engine in self.engines))
+        return {engine.url: ok for engine, ok in zip(self.engines, results)}
+
+    async def tts(self, text: str, speaker: int | None = None, profile: AudioProfile = STANDARD) -> str:
         """
         生成语音并返回 base64 编码的 WAV 音频
-        
+
         Args:
             text: 要合成的文本
             speaker: 说话人 ID（可选，默认使用实例设置的 speaker_id）
-            
+            profile: 语音档位，非 standard 时由原始音频转换并单独缓存
+
         Returns:
             base64 编码的 WAV 音频数据
         """
         speaker_id = speaker or self.speaker_id
-        
+
+        cached = self._cache_get(text, speaker_id, profile)
+        if cached is not None:
+            return cached
+        if not profile.is_standard:
+            return await self._encode(text, speaker_id, await self.tts(text, speaker_id), profile)
+
+        # 长文本按句切分，分发到多个引擎并行合成后拼接
+        segments = split_sentences(text, self.split_chars) if len(text) > self.split_chars else [text]
+        wavs = await _gather_or_cancel(*(self._synthesize_one(segment, speaker_id) for segment in segments))
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                # 步骤 1: 生成音频查询（audio_query）
-                query_response = await client.post(
-                    f"{self.base_url}/audio_query",
-                    params={"text": text, "speaker": speaker_id}
-                )
-                query_response.raise_for_status()
-                audio_query = query_response.json()
-                
-                # 步骤 2: 合成音频
-                synthesis_response = await client.post(
-                    f"{self.base_url}/synthesis",
-                    params={"speaker": speaker_id},
-                    json=audio_query,
-                    headers={"Content-Type": "application/json"}
-                )
-                synthesis_response.raise_for_status()
-                
-                # 获取 WAV 音频数据
-                wav_data = synthesis_response.content
-                
-                # 转换为 base64
+            wav_data = concat_wavs(list(wavs))
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"VOICEVOX 音频拼接失败: {str(e)}"
+            ) from e
+
+        # 转换为 base64
+        audio_base64 = base64.b64encode(wav_data).decode('utf-8')
+        self._cache_put(text, speaker_id, audio_base64)
+        return audio_base64
+
+    async def tts_batch(
+        self,
+        texts: list[str],
+        speaker: int | None = None,
+        concurrency: int = 4,
+        profile: AudioProfile = STANDARD,
+    ) -> AsyncIterator[tuple[str, str | None, HTTPException | None]]:
+        """
+        批量合成，按完成顺序逐条产出 (text, audio_base64, error)
+
+        文本会先去重并命中缓存；其余按 multi_synthesis_size 分组，
+        每组一次 multi_synthesis 调用（引擎不支持时退回逐条 synthesis），
+        最多 concurrency 组并行。
+        """
+        speaker_id = speaker or self.speaker_id
+        pending: list[str] = []
+        for text in dict.fromkeys(texts):
+            cached = self._cache_get(text, speaker_id, profile)
+            if cached is None and not profile.is_standard:
+                standard = self._cache_get(text, speaker_id)
+                if standard is not None:
+                    cached = await self._encode(text, speaker_id, standard, profile)
+            if cached is not None:
+                yield text, cached, None
+            else:
+                pending.append(text)
+
+        chunk_size = max(1, self.multi_synthesis_size)
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run_chunk(chunk: list[str]) -> list[tuple[str, str | None, HTTPException | None]]:
+            async with semaphore:
+                try:
+                    wavs = await self._synthesize_chunk(chunk, speaker_id)
+                except HTTPException as exc:
+                    return [(text, None, exc) for text in chunk]
+            results = []
+            for text, wav_data in zip(chunk, wavs):
                 audio_base64 = base64.b64encode(wav_data).decode('utf-8')
-                
-                return audio_base64
-                
+                self._cache_put(text, speaker_id, audio_base64)
+                if not profile.is_standard:
+                    audio_base64 = await self._encode(text, speaker_id, audio_base64, profile)
+                results.append((text, audio_base64, None))
+            return results
+
+        tasks = [asyncio.ensure_future(run_chunk(chunk)) for chunk in chunks]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                for result in await finished:
+                    yield result
+        finally:
+            # 客户端断开时取消尚未完成的合成
+            for task in tasks:
+                task.cancel()
+
+    async def _synthesize_one(self, text: str, speaker_id: int) -> bytes:
+        async with self._slot(len(text)):
+            return await self._with_failover(self._synthesize_one_on, text, speaker_id)
+
+    async def _synthesize_chunk(self, texts: list[str], speaker_id: int) -> list[bytes]:
+        async with self._slot(sum(len(text) for text in texts)):
+            return await self._with_failover(self._synthesize_chunk_on, texts, speaker_id)
+
+    def _slot(self, chars: int):
+        """每次合成（单句或一组 multi_synthesis）占用一个额度，按字数计入用户的公平份额"""
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot('voicevox', cost=chars)
+
+    async def _with_failover(self, func, *args):
+        """连接失败时换到其它引擎重试，每个引擎最多尝试一次"""
+        tried: set[str] = set()
+        while True:
+            try:
+                async with self._engine(exclude=tried) as engine:
+                    return await func(engine, *args)
+            except VoicevoxEngineUnreachable:
+                tried.add(engine.url)
+                if len(tried) >= len(self.engines):
+                    raise
+
+    async def _synthesize_one_on(self, engine: VoicevoxEngine, text: str, speaker_id: int) -> bytes:
+        # 步骤 1: 生成音频查询（audio_query）
+        audio_query = await self._audio_query(engine, text, speaker_id)
+
+        # 步骤 2: 合成音频
+        return await self._synthesis(engine, audio_query, speaker_id)
+
+    async def _synthesize_chunk_on(self, engine: VoicevoxEngine, texts: list[str], speaker_id: int) -> list[bytes]:
+        queries = await _gather_or_cancel(*(self._audio_query(engine, text, speaker_id) for text in texts))
+        if len(queries) > 1 and engine.multi_synthesis_supported:
+            try:
+                return await self._multi_synthesis(engine, list(queries), speaker_id)
+            except httpx.HTTPStatusError as e:
+                # 旧版本引擎没有 multi_synthesis，之后该引擎统一走逐条合成
+                if e.response.status_code not in (404, 405):
+                    raise
+                engine.multi_synthesis_supported = False
+        return [await self._synthesis(engine, query, speaker_id) for query in queries]
+
+    async def _audio_query(self, engine: VoicevoxEngine, text: str, speaker_id: int) -> dict:
+        async with self._timed('audio_query', engine):
+            response = await self.client.post(
+                f"{engine.url}/audio_query",
+                params={"text": text, "speaker": speaker_id}
+            )
+            response.raise_for_status()
+        return response.json()
+
+    async def _synthesis(self, engine: VoicevoxEngine, audio_query: dict, speaker_id: int) -> bytes:
+        async with self._timed('synthesis', engine):
+            response = await self.client.post(
+                f"{engine.url}/synthesis",
+                params={"speaker": speaker_id},
+                json=audio_query,
+                headers={"Content-Type": "application/json"}
+            )
+            response.raise_for_status()
+        return response.content
+
+    async def _multi_synthesis(self, engine: VoicevoxEngine, audio_queries: list[dict], speaker_id: int) -> list[bytes]:
+        """一次请求合成多条，引擎返回按序号命名的 WAV 压缩包"""
+        async with self._timed('multi_synthesis', engine):
+            response = await self.client.post(
+                f"{engine.url}/multi_synthesis",
+                params={"speaker": speaker_id},
+                json=audio_queries,
+                headers={"Content-Type": "application/json"}
+            )
+            response.raise_for_status()
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            names = sorted(name for name in archive.namelist() if name.endswith('.wav'))
+            return [archive.read(name) for name in names]
+
+    @asynccontextmanager
+    async def _timed(self, operation: str, engine: VoicevoxEngine) -> AsyncIterator[None]:
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            yield
+            outcome = 'ok'
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.voicevox_request_duration.labels(
+                operation=operation, engine=engine.url, outcome=outcome
+            ).observe(elapsed)
+            timing.record(_TIMING_PHASES[operation], elapsed)
+
+    def _pick_engine(self, exclude: set[str]) -> VoicevoxEngine:
+        """最少在途请求优先，在途数相同时轮询，跳过已熔断的引擎"""
+        self._rotation = (self._rotation + 1) % len(self.engines)
+        rotated = self.engines[self._rotation:] + self.engines[:self._rotation]
+        for engine in sorted(rotated, key=lambda engine: engine.outstanding):
+            if engine.url not in exclude and engine.breaker.allow_request():
+                return engine
+        raise VoicevoxUnavailable()
+
+    @asynccontextmanager
+    async def _engine(self, exclude: set[str] | None = None) -> AsyncIterator[VoicevoxEngine]:
+        """选取引擎并记录在途数，把 httpx 异常转换为 HTTPException 并计入该引擎的熔断器"""
+        engine = self._pick_engine(exclude or set())
+        breaker = engine.breaker
+        engine.outstanding += 1
+        try:
+            yield engine
+        except httpx.ConnectError as e:
+            breaker.record_failure()
+            raise VoicevoxEngineUnreachable(engine.url) from e
         except httpx.TimeoutException as e:
+            breaker.record_failure()
             raise HTTPException(
                 status_code=status.HTTP_504_GATEWAY_TIMEOUT,
                 detail=f"VOICEVOX 服务响应超时: {str(e)}"
             ) from e
         except httpx.HTTPStatusError as e:
+            # 4xx 是请求本身的问题（如文本非法），不计入引擎故障
+            if e.response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
             raise HTTPException(
                 status_code=status.HTTP_502_BAD_GATEWAY,
                 detail=f"VOICEVOX 服务错误: {e.response.status_code}"
             ) from e
         except Exception as e:
+            breaker.record_failure()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"TTS 生成失败: {str(e)}"
             ) from e
+        except BaseException:
+            # 取消（客户端断开、超时取消）不代表引擎故障，但必须归还半开试探名额
+            breaker.record_cancelled()
+            raise
+        else:
+            breaker.record_success()
+        finally:
+            engine.outstanding -= 1
+
+    async def _encode(self, text: str, speaker_id: int, audio_base64: str, profile: AudioProfile) -> str:
+        """按档位转换原始音频（CPU 操作，放到线程池）并缓存"""
+        encoded = await run_in_threadpool(encode_base64, audio_base64, profile)
+        self._cache_put(text, speaker_id, encoded, profile)
+        return encoded
 
+    def _cache_get(self, text: str, speaker_id: int, profile: AudioProfile = STANDARD) -> str | None:
+        key = (text, speaker_id, profile.name)
+        audio = self._cache.get(key)
+        if audio is not None:
+            self._cache.move_to_end(key)
+        return audio
 
-# 创建全局实例
-voicevox_service = VoicevoxService()
+    def _cache_put(self, text: str, speaker_id: int, audio_base64: str, profile: AudioProfile = STANDARD) -> None:
+        if self.cache_size <= 0:
+            return
+        key = (text, speaker_id, profile.name)
+        self._cache[key] = audio_base64
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
@@ -1,10 +1,29 @@
 """
 时区处理工具函数
 """
-from datetime import datetime
-from zoneinfo import ZoneInfo
+from datetime import date, datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from typing import Optional
 
+DEFAULT_TIMEZONE = 'Asia/Shanghai'
+
+
+@lru_cache(maxsize=128)
+def get_zone(name: Optional[str]) -> ZoneInfo:
+    """获取时区对象（带缓存），无效时区回退到默认时区"""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def local_date(dt: datetime, user_timezone: Optional[str]) -> date:
+    """UTC datetime（naive 视为 UTC）在用户时区下的日期"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=ZoneInfo('UTC'))
+    return dt.astimezone(get_zone(user_timezone)).date()
+
 
 def convert_to_user_timezone(dt: Optional[datetime], user_timezone: str = 'Asia/Shanghai') -> Optional[str]:
     """
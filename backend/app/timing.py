@@ -0,0 +1,141 @@
+"""请求内分阶段计时：输出 Server-Timing 响应头与每请求一行的结构化日志"""
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from nanoid import generate
+
+access_logger = logging.getLogger('app.access')
+
+
+class RequestTiming:
+    """一个请求内各阶段的累计耗时（同名阶段多次出现时累加）"""
+
+    __slots__ = ('request_id', 'started', 'phases')
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.phases: dict[str, list[float]] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        # 同步路由在线程池中执行，contextvar 复制后仍指向同一对象；dict/list 操作在 GIL 下是原子的
+        entry = self.phases.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    def server_timing(self) -> str:
+        parts = [f'{name};dur={seconds * 1000:.1f}' for name, (seconds, _) in self.phases.items()]
+        parts.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.1f}')
+        return ', '.join(parts)
+
+
+_current: ContextVar[RequestTiming | None] = ContextVar('request_timing', default=None)
+
+
+def current() -> RequestTiming | None:
+    return _current.get()
+
+
+def record(name: str, seconds: float) -> None:
+    """把一段已测得的耗时计入当前请求（请求上下文之外调用时忽略）"""
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """记录一个阶段的耗时，同步与异步代码中都可使用 `with span('llm'):`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+class TimingMiddleware:
+    """为每个请求分配 request id，写入 Server-Timing / X-Request-ID 头并输出 JSON 访问日志"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get('headers') or [])
+        request_id = headers.get(b'x-request-id', b'').decode('latin-1')[:64] or generate(size=16)
+        timing = RequestTiming(request_id)
+        token = _current.set(timing)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                # 流式响应在此之后产生的阶段只会出现在日志中
+                message.setdefault('headers', [])
+                message['headers'] = [
+                    *message['headers'],
+                    (b'server-timing', timing.server_timing().encode('latin-1')),
+                    (b'x-request-id', request_id.encode('latin-1')),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = scope.get('route')
+            access_logger.info('request', extra={'fields': {
+                'request_id': request_id,
+                'method': scope['method'],
+                'path': scope['path'],
+                'route': getattr(route, 'path', None),
+                'status': status_code,
+                'duration_ms': round((time.perf_counter() - timing.started) * 1000, 1),
+                'phases': {
+                    name: {'ms': round(seconds * 1000, 1), 'count': count}
+                    for name, (seconds, count) in timing.phases.items()
+                },
+            }})
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON，自动附带当前请求的 request id"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            payload.update(fields)
+        else:
+            payload['message'] = record.getMessage()
+            timing = current()
+            if timing is not None:
+                payload['request_id'] = timing.request_id
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """应用日志统一以 JSON 输出到 stderr（uvicorn 只配置了自己的 logger）"""
+    logger = logging.getLogger('app')
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
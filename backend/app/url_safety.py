@@ -0,0 +1,56 @@
+"""
+用户提供的外发 URL 的安全检查（防止 SSRF），只依赖标准库与配置
+
+保存时由 schemas_auth 校验推送地址；发送时 app/services/reminders.py 再次校验，
+并在解析域名后用 is_public_host 检查实际连接的地址。
+"""
+import ipaddress
+from urllib.parse import urlsplit
+
+from app.config import get_settings
+
+
+def allowed_push_hosts() -> set[str]:
+    return {host.lower() for host in get_settings().reminder_push_hosts}
+
+
+def is_public_host(host: str) -> bool:
+    """域名在发送时解析后再检查；IP 字面量必须是公网单播地址"""
+    if host == 'localhost' or host.endswith('.localhost'):
+        return False
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return True
+    return address.is_global and not address.is_multicast
+
+
+def url_host(url: str) -> str:
+    """URL 中的主机名（小写，国际化域名转为 punycode）；不是合法 URL 时抛出 ValueError"""
+    try:
+        parts = urlsplit(url)
+        parts.port  # 端口不合法时抛出 ValueError
+        host = (parts.hostname or '').encode('idna').decode('ascii')
+    except (ValueError, UnicodeError) as exc:
+        raise ValueError('推送地址不是合法的 URL') from exc
+    return host
+
+
+def check_push_url(url: str) -> str:
+    """校验推送地址：http(s) URL，受 REMINDER_PUSH_HOSTS 限制，不能直接写内网 IP"""
+    if len(url) > 255:
+        raise ValueError('推送地址不能超过 255 个字符')
+    if any(char.isspace() for char in url):
+        raise ValueError('推送地址不是合法的 URL')
+    host = url_host(url)
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not host:
+        raise ValueError('推送地址必须是 http(s) URL')
+    if '@' in parts.netloc:
+        raise ValueError('推送地址不能包含用户名或密码')
+    allowed = allowed_push_hosts()
+    if allowed and host not in allowed:
+        raise ValueError(f"推送地址的主机必须是 {', '.join(sorted(allowed))} 之一")
+    if host not in allowed and not is_public_host(host):
+        raise ValueError('推送地址不能指向内网或本机地址')
+    return url
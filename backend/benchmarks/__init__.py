@@ -0,0 +1 @@
+"""离线性能基准：本地假 Gemini / VOICEVOX 服务与异步压测驱动"""
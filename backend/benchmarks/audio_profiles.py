@@ -0,0 +1,91 @@
+"""语音档位基准：每条回复的字节数与转换耗时
+
+用类语音信号（基频起伏的谐波加噪声，首尾各 0.1 秒静音，与 VOICEVOX 默认的前后留白相同）
+生成 24kHz 16 位 WAV，按日语约 0.12 秒/字估算回复时长，对每个档位测量：
+
+- WAV 字节数与 base64 后的字节数（API 实际传输的大小）
+- 每条回复的转换耗时与每秒音频的 CPU 时间
+
+  python -m benchmarks.audio_profiles --chars 20 40 80 --repeat 5
+"""
+import argparse
+import base64
+import json
+import math
+import random
+import time
+from array import array
+from pathlib import Path
+
+from app.services.audio import add_wav_header
+from app.services.audio_profiles import PROFILES, encode
+
+SAMPLE_RATE = 24000
+SECONDS_PER_CHAR = 0.12
+EDGE_SILENCE = 0.1
+
+
+def speech_like(seconds: float, seed: int = 0) -> bytes:
+    """音节包络调制的谐波信号，首尾留白"""
+    rng = random.Random(seed)
+    silence = [0] * int(EDGE_SILENCE * SAMPLE_RATE)
+    voiced = []
+    phase = 0.0
+    for i in range(int(seconds * SAMPLE_RATE)):
+        t = i / SAMPLE_RATE
+        pitch = 180 + 40 * math.sin(2 * math.pi * 0.7 * t)
+        phase += 2 * math.pi * pitch / SAMPLE_RATE
+        envelope = 0.5 + 0.5 * math.sin(2 * math.pi * 4 * t) ** 2  # 约每秒 8 个音节
+        value = sum(math.sin(k * phase) / k for k in range(1, 6)) * envelope
+        voiced.append(int(6000 * value + rng.gauss(0, 150)))
+    return add_wav_header(array('h', silence + voiced + silence).tobytes(), SAMPLE_RATE)
+
+
+def measure(chars: list[int], repeat: int) -> dict:
+    results = {}
+    for profile in PROFILES.values():
+        rows = []
+        for count in chars:
+            seconds = count * SECONDS_PER_CHAR
+            wav = speech_like(seconds, seed=count)
+            encode(wav, profile)  # 预热：首次调用会构建查表
+            cpu_started, started = time.process_time(), time.perf_counter()
+            for _ in range(repeat):
+                encoded = encode(wav, profile)
+            wall = (time.perf_counter() - started) / repeat
+            cpu = (time.process_time() - cpu_started) / repeat
+            rows.append({
+                'chars': count,
+                'audio_seconds': round(seconds + 2 * EDGE_SILENCE, 2),
+                'wav_bytes': len(encoded),
+                'base64_bytes': len(base64.b64encode(encoded)),
+                'ratio': round(len(encoded) / len(wav), 3),
+                'encode_ms': round(wall * 1000, 2),
+                'cpu_ms_per_audio_second': round(cpu * 1000 / (seconds + 2 * EDGE_SILENCE), 2),
+            })
+        results[profile.name] = rows
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chars', type=int, nargs='+', default=[20, 40, 80], help='回复字数')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', dest='json_path', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    results = measure(args.chars, args.repeat)
+    print(f"{'档位':<10}{'字数':>6}{'WAV 字节':>12}{'base64 字节':>14}{'比例':>8}{'转换 ms':>10}{'CPU ms/秒':>12}")
+    for name, rows in results.items():
+        for row in rows:
+            print(
+                f"{name:<10}{row['chars']:>6}{row['wav_bytes']:>12}{row['base64_bytes']:>14}"
+                f"{row['ratio']:>8}{row['encode_ms']:>10}{row['cpu_ms_per_audio_second']:>12}"
+            )
+    if args.json_path:
+        report = {'config': vars(args), 'results': results}
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
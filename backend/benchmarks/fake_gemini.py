@@ -0,0 +1,204 @@
+"""假 Gemini 服务：实现 generateContent / streamGenerateContent 的 REST 接口
+
+后端通过 GEMINI_API_ENDPOINT 指向本服务（REST transport），延迟与失败率可配置：
+
+  python -m benchmarks.fake_gemini --port 8901 --latency 0.8 --token-latency 0.01 --failure-rate 0.02
+
+测试模型路由时可为个别模型增加延迟或让其始终失败：
+
+  python -m benchmarks.fake_gemini --model-latency gemini-2.5-flash=3 --unavailable-models gemini-2.5-pro
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import struct
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 通过环境变量传递配置，便于 uvicorn 以 import 字符串方式启动
+LATENCY = float(os.getenv('FAKE_GEMINI_LATENCY', '0.5'))  # 首 token 前的固定延迟（秒）
+TOKEN_LATENCY = float(os.getenv('FAKE_GEMINI_TOKEN_LATENCY', '0.005'))  # 每个输出 token 的延迟（秒）
+PROMPT_TOKEN_LATENCY = float(os.getenv('FAKE_GEMINI_PROMPT_TOKEN_LATENCY', '0'))  # 每个输入 token 的延迟（秒，模拟 prefill）
+JITTER = float(os.getenv('FAKE_GEMINI_JITTER', '0.1'))  # 延迟随机抖动比例
+FAILURE_RATE = float(os.getenv('FAKE_GEMINI_FAILURE_RATE', '0'))  # 返回 500/429 的概率
+SEED = os.getenv('FAKE_GEMINI_SEED')
+# 按模型追加的固定延迟（"模型=秒数"，逗号分隔）与始终返回 503 的模型
+MODEL_LATENCY = {
+    model: float(seconds)
+    for model, _, seconds in (item.partition('=') for item in os.getenv('FAKE_GEMINI_MODEL_LATENCY', '').split(',') if item)
+}
+UNAVAILABLE_MODELS = set(filter(None, os.getenv('FAKE_GEMINI_UNAVAILABLE_MODELS', '').split(',')))
+
+rng = random.Random(int(SEED) if SEED else None)
+app = FastAPI(title='Fake Gemini')
+
+REPLY = 'そうなんですね。今日はどんな一日でしたか？よかったら詳しく教えてください。'
+REPLY_TRANSLATION = '原来如此。今天过得怎么样？可以的话请详细说说。'
+
+
+def _prompt_text(body: dict) -> str:
+    parts = [part.get('text', '') for content in body.get('contents', []) for part in content.get('parts', [])]
+    return '\n'.join(parts)
+
+
+def _estimate_tokens(text: str) -> int:
+    # 日文大约 1 字 1 token，粗略估计即可
+    return max(1, len(text))
+
+
+def _chat_payload(schema: dict | None, prompt: str) -> dict:
+    last_line = prompt.strip().splitlines()[-1] if prompt.strip() else ''
+    user_sentence = last_line.split(':', 1)[-1].strip() or 'こんにちは'
+    properties = (schema or {}).get('properties', {})
+    payload: dict = {}
+    if not properties or 'reply' in properties:
+        payload['reply'] = REPLY
+        payload['replyTranslation'] = REPLY_TRANSLATION
+    if not properties or 'feedback' in properties or 'correctedSentence' in properties:
+        feedback = {
+            'correctedSentence': f'{user_sentence}。',
+            'explanation': '自然な表現です。文末に句点を付けるとより丁寧です。',
+            'naturalnessScore': rng.randint(60, 98),
+        }
+        if 'correctedSentence' in properties:
+            payload.update(feedback)
+        else:
+            payload['feedback'] = feedback
+    return payload
+
+
+def _pcm(seconds: float, sample_rate: int = 24000) -> bytes:
+    # 300Hz 方波，足够让客户端正常解码播放
+    period = struct.pack('<h', 3000) * 40 + struct.pack('<h', -3000) * 40
+    return (period * (int(seconds * sample_rate) // 80 + 1))[:int(seconds * sample_rate) * 2]
+
+
+def _build_response(body: dict) -> tuple[dict, str]:
+    """返回 (candidate part, 用于计算延迟的输出文本)"""
+    config = body.get('generationConfig') or body.get('generation_config') or {}
+    prompt = _prompt_text(body)
+    modalities = config.get('responseModalities') or config.get('response_modalities') or []
+    mime_type = config.get('responseMimeType') or config.get('response_mime_type')
+    # REST transport 可能把枚举序列化为整数（AUDIO = 3）
+    if 'AUDIO' in modalities or 3 in modalities:
+        audio = base64.b64encode(_pcm(max(0.5, len(prompt) * 0.08))).decode('ascii')
+        return {'inlineData': {'mimeType': 'audio/L16;rate=24000', 'data': audio}}, prompt
+    if mime_type == 'application/json':
+        schema = config.get('responseSchema') or config.get('response_schema')
+        text = json.dumps(_chat_payload(schema, prompt), ensure_ascii=False)
+        return {'text': text}, text
+    return {'text': '日常会話'}, '日常会話'
+
+
+def _usage(prompt: str, output: str) -> dict:
+    prompt_tokens = _estimate_tokens(prompt)
+    output_tokens = _estimate_tokens(output)
+    return {
+        'promptTokenCount': prompt_tokens,
+        'candidatesTokenCount': output_tokens,
+        'totalTokenCount': prompt_tokens + output_tokens,
+    }
+
+
+def _jittered(seconds: float) -> float:
+    return max(0.0, seconds * (1 + rng.uniform(-JITTER, JITTER)))
+
+
+def _maybe_fail(model: str) -> JSONResponse | None:
+    if model in UNAVAILABLE_MODELS:
+        code = 503
+    elif FAILURE_RATE and rng.random() < FAILURE_RATE:
+        code = rng.choice([429, 500, 503])
+    else:
+        return None
+    return JSONResponse({'error': {'code': code, 'message': 'injected failure', 'status': 'UNAVAILABLE'}}, status_code=code)
+
+
+@app.post('/v1beta/models/{model_action}')
+async def generate(model_action: str, request: Request):
+    model, _, action = model_action.partition(':')
+    body = await request.json()
+    failure = _maybe_fail(model)
+    if failure is not None:
+        await asyncio.sleep(_jittered(LATENCY) / 2)
+        return failure
+
+    part, output = _build_response(body)
+    prompt = _prompt_text(body)
+    usage = _usage(prompt, output)
+
+    if action == 'streamGenerateContent':
+        alt = request.query_params.get('alt') or request.query_params.get('$alt') or ''
+        if alt.startswith('sse'):
+            return StreamingResponse(_stream(part, output, usage, model), media_type='text/event-stream')
+        # SDK 的 REST transport 使用 alt=json：整个响应是逐块输出的 JSON 数组
+        return StreamingResponse(_stream(part, output, usage, model, sse=False), media_type='application/json')
+
+    await asyncio.sleep(MODEL_LATENCY.get(model, 0) + _jittered(
+        LATENCY + PROMPT_TOKEN_LATENCY * _estimate_tokens(prompt) + TOKEN_LATENCY * _estimate_tokens(output)
+    ))
+    return {
+        'candidates': [{'content': {'role': 'model', 'parts': [part]}, 'finishReason': 'STOP', 'index': 0}],
+        'usageMetadata': usage,
+        'modelVersion': model,
+    }
+
+
+async def _stream(part: dict, output: str, usage: dict, model: str, sse: bool = True):
+    """分块输出，每块约 8 个 token：alt=sse 时为 SSE 事件，否则为 JSON 数组的元素"""
+    await asyncio.sleep(MODEL_LATENCY.get(model, 0) + _jittered(LATENCY))
+    if 'text' not in part:
+        chunks = [part]
+    else:
+        text = part['text']
+        chunks = [{'text': text[i:i + 8]} for i in range(0, len(text), 8)] or [{'text': ''}]
+    for index, chunk in enumerate(chunks):
+        await asyncio.sleep(_jittered(TOKEN_LATENCY * 8))
+        event = {
+            'candidates': [{'content': {'role': 'model', 'parts': [chunk]}, 'index': 0}],
+            'modelVersion': model,
+        }
+        if index == len(chunks) - 1:
+            event['candidates'][0]['finishReason'] = 'STOP'
+            event['usageMetadata'] = usage
+        data = json.dumps(event, ensure_ascii=False)
+        if sse:
+            yield f'data: {data}\r\n\r\n'
+        else:
+            yield ('[' if index == 0 else ',\r\n') + data + (']' if index == len(chunks) - 1 else '')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--latency', type=float, default=LATENCY)
+    parser.add_argument('--token-latency', type=float, default=TOKEN_LATENCY)
+    parser.add_argument('--prompt-token-latency', type=float, default=PROMPT_TOKEN_LATENCY)
+    parser.add_argument('--jitter', type=float, default=JITTER)
+    parser.add_argument('--failure-rate', type=float, default=FAILURE_RATE)
+    parser.add_argument('--model-latency', default=os.getenv('FAKE_GEMINI_MODEL_LATENCY', ''), help='如 gemini-2.5-flash=3,gemini-2.0-flash=0.5')
+    parser.add_argument('--unavailable-models', default=os.getenv('FAKE_GEMINI_UNAVAILABLE_MODELS', ''))
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    os.environ.update({
+        'FAKE_GEMINI_LATENCY': str(args.latency),
+        'FAKE_GEMINI_TOKEN_LATENCY': str(args.token_latency),
+        'FAKE_GEMINI_PROMPT_TOKEN_LATENCY': str(args.prompt_token_latency),
+        'FAKE_GEMINI_JITTER': str(args.jitter),
+        'FAKE_GEMINI_FAILURE_RATE': str(args.failure_rate),
+        'FAKE_GEMINI_MODEL_LATENCY': args.model_latency,
+        'FAKE_GEMINI_UNAVAILABLE_MODELS': args.unavailable_models,
+        **({'FAKE_GEMINI_SEED': str(args.seed)} if args.seed is not None else {}),
+    })
+    import uvicorn
+    uvicorn.run('benchmarks.fake_gemini:app', host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""假推送接收端：接受任意路径的 POST，按配置的延迟返回，可注入 503 与 429
+
+  python -m benchmarks.fake_push --port 8930 --latency 0.05 --failure-rate 0.05
+
+GET /stats 返回收到的请求数与各状态码的计数，POST /stats/reset 清零。
+"""
+import argparse
+import asyncio
+import os
+import random
+from collections import Counter
+
+from fastapi import FastAPI, Request, Response
+
+LATENCY = float(os.getenv('FAKE_PUSH_LATENCY', '0.05'))  # 每次推送的处理耗时（秒）
+FAILURE_RATE = float(os.getenv('FAKE_PUSH_FAILURE_RATE', '0'))  # 返回 503 的比例
+THROTTLE_RATE = float(os.getenv('FAKE_PUSH_THROTTLE_RATE', '0'))  # 返回 429 的比例
+
+app = FastAPI(title='Fake push receiver')
+_counts: Counter = Counter()
+
+
+@app.get('/stats')
+async def stats():
+    return {'requests': sum(_counts.values()), 'status': {str(code): count for code, count in _counts.items()}}
+
+
+@app.post('/stats/reset')
+async def reset():
+    _counts.clear()
+    return Response(status_code=204)
+
+
+@app.post('/{path:path}')
+async def push(path: str, request: Request):
+    await request.body()
+    await asyncio.sleep(LATENCY)
+    roll = random.random()
+    code = 503 if roll < FAILURE_RATE else 429 if roll < FAILURE_RATE + THROTTLE_RATE else 200
+    _counts[code] += 1
+    if code != 200:
+        return Response(status_code=code)
+    return {'code': 200, 'message': 'success'}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8930)
+    parser.add_argument('--latency', type=float, default=LATENCY)
+    parser.add_argument('--failure-rate', type=float, default=FAILURE_RATE)
+    parser.add_argument('--throttle-rate', type=float, default=THROTTLE_RATE)
+    args = parser.parse_args()
+
+    os.environ.update({
+        'FAKE_PUSH_LATENCY': str(args.latency),
+        'FAKE_PUSH_FAILURE_RATE': str(args.failure_rate),
+        'FAKE_PUSH_THROTTLE_RATE': str(args.throttle_rate),
+    })
+    import uvicorn
+    uvicorn.run('benchmarks.fake_push:app', host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""假 VOICEVOX 引擎：返回合法 WAV，合成耗时与文本长度成正比
+
+  python -m benchmarks.fake_voicevox --port 50021 --synth-base 0.05 --synth-per-char 0.01
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import struct
+import zipfile
+
+from fastapi import FastAPI, Request, Response
+
+QUERY_LATENCY = float(os.getenv('FAKE_VOICEVOX_QUERY_LATENCY', '0.02'))  # audio_query 耗时（秒）
+SYNTH_BASE = float(os.getenv('FAKE_VOICEVOX_SYNTH_BASE', '0.05'))  # 每次合成的固定耗时
+SYNTH_PER_CHAR = float(os.getenv('FAKE_VOICEVOX_SYNTH_PER_CHAR', '0.01'))  # 每个字符的合成耗时
+CONCURRENCY = int(os.getenv('FAKE_VOICEVOX_CONCURRENCY', '1'))  # 引擎同时合成的数量（真实引擎基本是串行的）
+FAILURE_RATE = float(os.getenv('FAKE_VOICEVOX_FAILURE_RATE', '0'))
+
+SAMPLE_RATE = 24000
+SECONDS_PER_CHAR = 0.12  # 生成音频的时长，约等于日语语速
+
+app = FastAPI(title='Fake VOICEVOX')
+_synth_slots = asyncio.Semaphore(CONCURRENCY)
+
+
+def _wav(seconds: float) -> bytes:
+    frames = int(seconds * SAMPLE_RATE)
+    period = struct.pack('<h', 2000) * 30 + struct.pack('<h', -2000) * 30
+    pcm = (period * (frames // 60 + 1))[:frames * 2]
+    header = b'RIFF' + struct.pack('<I', 36 + len(pcm)) + b'WAVE'
+    header += b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, SAMPLE_RATE, SAMPLE_RATE * 2, 2, 16)
+    return header + b'data' + struct.pack('<I', len(pcm)) + pcm
+
+
+async def _synthesize(query: dict) -> bytes:
+    text = query.get('kana') or ''
+    if FAILURE_RATE and random.random() < FAILURE_RATE:
+        raise RuntimeError('injected failure')
+    async with _synth_slots:
+        await asyncio.sleep(SYNTH_BASE + SYNTH_PER_CHAR * len(text))
+    return _wav(max(0.3, len(text) * SECONDS_PER_CHAR))
+
+
+@app.get('/version')
+async def version():
+    return '0.0.0-fake'
+
+
+@app.post('/initialize_speaker')
+async def initialize_speaker(speaker: int, skip_reinit: bool = False):
+    return Response(status_code=204)
+
+
+@app.post('/audio_query')
+async def audio_query(text: str, speaker: int):
+    await asyncio.sleep(QUERY_LATENCY)
+    # 真实引擎返回 accent_phrases 等字段，这里只保留合成所需的文本
+    return {'kana': text, 'speedScale': 1.0, 'outputSamplingRate': SAMPLE_RATE, 'outputStereo': False}
+
+
+@app.post('/synthesis')
+async def synthesis(speaker: int, request: Request):
+    query = await request.json()
+    try:
+        audio = await _synthesize(query)
+    except RuntimeError:
+        return Response(status_code=500)
+    return Response(audio, media_type='audio/wav')
+
+
+@app.post('/multi_synthesis')
+async def multi_synthesis(speaker: int, request: Request):
+    queries = json.loads(await request.body())
+    buffer = io.BytesIO()
+    try:
+        audios = [await _synthesize(query) for query in queries]
+    except RuntimeError:
+        return Response(status_code=500)
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for index, audio in enumerate(audios, start=1):
+            archive.writestr(f'{index:03}.wav', audio)
+    return Response(buffer.getvalue(), media_type='application/zip')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=50021)
+    parser.add_argument('--query-latency', type=float, default=QUERY_LATENCY)
+    parser.add_argument('--synth-base', type=float, default=SYNTH_BASE)
+    parser.add_argument('--synth-per-char', type=float, default=SYNTH_PER_CHAR)
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--failure-rate', type=float, default=FAILURE_RATE)
+    args = parser.parse_args()
+
+    os.environ.update({
+        'FAKE_VOICEVOX_QUERY_LATENCY': str(args.query_latency),
+        'FAKE_VOICEVOX_SYNTH_BASE': str(args.synth_base),
+        'FAKE_VOICEVOX_SYNTH_PER_CHAR': str(args.synth_per_char),
+        'FAKE_VOICEVOX_CONCURRENCY': str(args.concurrency),
+        'FAKE_VOICEVOX_FAILURE_RATE': str(args.failure_rate),
+    })
+    import uvicorn
+    uvicorn.run('benchmarks.fake_voicevox:app', host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
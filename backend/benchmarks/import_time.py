@@ -0,0 +1,65 @@
+"""导入耗时检查：分析 `python -X importtime -c "import app.main"` 的输出
+
+导入 app.main 不应加载 Gemini SDK 等重量级依赖，也不应超过时间预算：
+
+  python -m benchmarks.import_time --budget 1.5 --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# 这些模块应当在首次使用时才导入（见 app/container.py）
+FORBIDDEN = ('google.generativeai', 'google.ai.generativelanguage', 'grpc')
+
+
+def measure(module: str) -> list[tuple[str, int, int]]:
+    """返回 (模块名, 自身耗时 us, 累计耗时 us)，按导入顺序排列"""
+    env = {
+        **os.environ,
+        'GOOGLE_API_KEY': os.environ.get('GOOGLE_API_KEY', 'import-time'),
+        'DATABASE_URL': os.environ.get('DATABASE_URL', 'sqlite://'),
+    }
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix('import time:').split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app.main')
+    parser.add_argument('--budget', type=float, default=1.5, help='累计导入耗时上限（秒）')
+    parser.add_argument('--top', type=int, default=15, help='显示累计耗时最高的模块数')
+    args = parser.parse_args()
+
+    rows = measure(args.module)
+    total = next(cumulative for name, _, cumulative in rows if name == args.module) / 1e6
+    print(f'{"cumulative ms":>14}{"self ms":>10}  module')
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f'{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {name}')
+    print(f'\nimport {args.module}: {total:.3f}s（预算 {args.budget:.3f}s）')
+
+    failures = []
+    loaded = sorted({name for name, _, _ in rows if name.startswith(FORBIDDEN)})
+    if loaded:
+        failures.append(f'导入时加载了应延迟导入的模块: {", ".join(loaded[:5])}')
+    if total > args.budget:
+        failures.append(f'导入耗时 {total:.3f}s 超过预算 {args.budget:.3f}s')
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
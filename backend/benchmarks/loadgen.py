@@ -0,0 +1,354 @@
+"""异步压测客户端：模拟用户登录、浏览会话、多轮对话、TTS 与抽认卡复习
+
+可以直接压测已运行的后端（此时 Gemini / VOICEVOX 是否为假服务取决于后端配置）：
+
+  python -m benchmarks.loadgen --base-url http://127.0.0.1:8000 --users 20 --duration 60
+
+--live 时对话改走 WebSocket 实时通道（/api/sessions/{id}/live），报告中额外给出连接数与
+每个 worker 每秒完成的回合数。通常通过 benchmarks.run 一并启动假上游与后端。
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import httpx
+
+BASELINE_DIR = Path(__file__).parent / 'baselines'
+
+USER_SENTENCES = [
+    '今日は友達と映画を見に行きました',
+    '週末は雨だったので家で本を読んでいました',
+    '最近日本語の勉強を始めました',
+    '明日は朝早く起きなければなりません',
+    'この店のラーメンはとても美味しいです',
+]
+
+
+@dataclass
+class OpStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    def summary(self, duration: float) -> dict:
+        ordered = sorted(self.latencies)
+        return {
+            'count': len(ordered),
+            'errors': self.errors,
+            'throughput': round(len(ordered) / duration, 2) if duration else 0.0,
+            'p50_ms': _percentile_ms(ordered, 50),
+            'p95_ms': _percentile_ms(ordered, 95),
+            'p99_ms': _percentile_ms(ordered, 99),
+        }
+
+
+def _percentile_ms(ordered: list[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return round(ordered[index] * 1000, 1)
+
+
+class LoadRunner:
+    def __init__(
+        self,
+        base_url: str,
+        users: int,
+        duration: float,
+        turns: int,
+        password: str = 'benchmark',
+        live: bool = False,
+        workers: int = 1,
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.users = users
+        self.duration = duration
+        self.turns = turns
+        self.password = password
+        self.live = live
+        self.workers = workers
+        self.stats: dict[str, OpStats] = {}
+        self._deadline = 0.0
+        self._live_open = 0
+        self._live_peak = 0
+
+    async def call(self, client: httpx.AsyncClient, op: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        """发送请求并记录耗时；非 2xx 计为错误"""
+        stats = self.stats.setdefault(op, OpStats())
+        started = time.perf_counter()
+        try:
+            # 非流式请求会读完整个响应体（包括 NDJSON），耗时即端到端耗时
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            stats.errors += 1
+            return None
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            stats.errors += 1
+            return None
+        stats.latencies.append(elapsed)
+        return response
+
+    async def run(self) -> dict:
+        limits = httpx.Limits(max_connections=self.users * 2, max_keepalive_connections=self.users * 2)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=120, limits=limits) as client:
+            tokens = await asyncio.gather(*(self._login(client, index) for index in range(self.users)))
+            self.stats.clear()  # 只统计稳态阶段
+            started = time.perf_counter()
+            self._deadline = started + self.duration
+            await asyncio.gather(*(self._virtual_user(client, token) for token in tokens if token))
+            elapsed = time.perf_counter() - started
+        return self.report(elapsed)
+
+    async def _login(self, client: httpx.AsyncClient, index: int) -> str | None:
+        email = f'bench{index}@example.com'
+        credentials = {'email': email, 'password': self.password}
+        await self.call(client, 'register', 'POST', '/api/auth/register', json=credentials)
+        response = await self.call(client, 'login', 'POST', '/api/auth/login', json=credentials)
+        return response.json()['access_token'] if response else None
+
+    async def _virtual_user(self, client: httpx.AsyncClient, token: str) -> None:
+        headers = {'Authorization': f'Bearer {token}'}
+        rng = random.Random(token)
+        while time.perf_counter() < self._deadline:
+            if self.live:
+                await self._live_conversation(client, headers, rng)
+            else:
+                await self._conversation(client, headers, rng)
+            if time.perf_counter() < self._deadline:
+                await self._flashcards(client, headers, rng)
+
+    async def _conversation(self, client: httpx.AsyncClient, headers: dict, rng: random.Random) -> None:
+        """浏览会话列表 → 新建会话 → 多轮对话并保存消息 → 重新打开会话"""
+        await self.call(client, 'list_sessions', 'GET', '/api/sessions/', headers=headers)
+        response = await self.call(client, 'create_session', 'POST', '/api/sessions/', headers=headers, json={})
+        if response is None:
+            return
+        session_id = response.json()['id']
+        history: list[dict] = []
+        for _ in range(self.turns):
+            if time.perf_counter() >= self._deadline:
+                break
+            sentence = rng.choice(USER_SENTENCES)
+            history.append({'role': 'user', 'content': sentence})
+            response = await self.call(client, 'chat', 'POST', '/api/chat', json={
+                'sessionId': session_id,
+                'messages': history,
+                'style': 'casual',
+            })
+            if response is None:
+                history.pop()
+                continue
+            data = response.json()
+            await self.call(client, 'save_message', 'POST', f'/api/sessions/{session_id}/messages', headers=headers, json={
+                'role': 'user', 'content': sentence,
+            })
+            await self.call(client, 'save_message', 'POST', f'/api/sessions/{session_id}/messages', headers=headers, json={
+                'role': 'assistant', 'content': data['reply'], 'translation': data['replyTranslation'],
+                'feedback': data['feedback'], 'audio_base64': data.get('audioBase64'),
+            })
+            history.append({'role': 'assistant', 'content': data['reply']})
+            if rng.random() < 0.3:
+                await self.call(client, 'favorite_add', 'POST', '/api/favorites/', headers=headers, json={
+                    'text': data['feedback']['correctedSentence'], 'source': 'feedback',
+                })
+        await self.call(client, 'get_session', 'GET', f'/api/sessions/{session_id}', headers=headers)
+        await self.call(client, 'stats', 'GET', '/api/stats', headers=headers)
+
+    async def _live_conversation(self, client: httpx.AsyncClient, headers: dict, rng: random.Random) -> None:
+        """与 _conversation 相同的流程，但对话经 WebSocket 实时通道：连接时认证一次，每轮只发送用户输入"""
+        from websockets.asyncio.client import connect
+        from websockets.exceptions import WebSocketException
+
+        await self.call(client, 'list_sessions', 'GET', '/api/sessions/', headers=headers)
+        response = await self.call(client, 'create_session', 'POST', '/api/sessions/', headers=headers, json={})
+        if response is None:
+            return
+        session_id = response.json()['id']
+        url = 'ws' + self.base_url.removeprefix('http') + f'/api/sessions/{session_id}/live'
+        connect_stats = self.stats.setdefault('live_connect', OpStats())
+        started = time.perf_counter()
+        try:
+            async with connect(url, additional_headers=headers, max_size=None) as websocket:
+                await asyncio.wait_for(websocket.recv(), 30)  # ready
+                connect_stats.latencies.append(time.perf_counter() - started)
+                self._live_open += 1
+                self._live_peak = max(self._live_peak, self._live_open)
+                try:
+                    for index in range(self.turns):
+                        if time.perf_counter() >= self._deadline:
+                            break
+                        feedback = await self._live_turn(websocket, f'{session_id}-{index}', rng.choice(USER_SENTENCES))
+                        if feedback and rng.random() < 0.3:
+                            await self.call(client, 'favorite_add', 'POST', '/api/favorites/', headers=headers, json={
+                                'text': feedback['correctedSentence'], 'source': 'feedback',
+                            })
+                finally:
+                    self._live_open -= 1
+        except (OSError, asyncio.TimeoutError, WebSocketException):
+            connect_stats.errors += 1
+        await self.call(client, 'get_session', 'GET', f'/api/sessions/{session_id}', headers=headers)
+        await self.call(client, 'stats', 'GET', '/api/stats', headers=headers)
+
+    async def _live_turn(self, websocket, turn_id: str, sentence: str) -> dict | None:
+        """发送一轮输入并等待 done，分别记录首个回复增量与整轮（含保存与语音）的耗时"""
+        first_delta = self.stats.setdefault('live_first_delta', OpStats())
+        turn = self.stats.setdefault('live_turn', OpStats())
+        started = time.perf_counter()
+        await websocket.send(json.dumps({'type': 'turn', 'turnId': turn_id, 'content': sentence}, ensure_ascii=False))
+        seen_delta = failed = False
+        feedback = None
+        while True:
+            event = json.loads(await asyncio.wait_for(websocket.recv(), 120))
+            if event.get('turnId') != turn_id:
+                continue
+            if event['type'] == 'reply_delta' and not seen_delta:
+                seen_delta = True
+                first_delta.latencies.append(time.perf_counter() - started)
+            elif event['type'] == 'feedback':
+                feedback = event['feedback']
+            elif event['type'] == 'error':
+                failed = True
+            elif event['type'] == 'done':
+                break
+        if failed:
+            turn.errors += 1
+        else:
+            turn.latencies.append(time.perf_counter() - started)
+        return feedback
+
+    async def _flashcards(self, client: httpx.AsyncClient, headers: dict, rng: random.Random) -> None:
+        """抽认卡复习：拉取收藏、批量预取语音、播放单条并更新熟练度"""
+        response = await self.call(client, 'list_favorites', 'GET', '/api/favorites/', headers=headers)
+        if response is None:
+            return
+        favorites = response.json()
+        if not favorites:
+            return
+        deck = rng.sample(favorites, min(10, len(favorites)))
+        await self.call(client, 'tts_batch', 'POST', '/api/tts/batch', headers=headers, json={
+            'favoriteIds': [favorite['id'] for favorite in deck],
+        })
+        card = deck[0]
+        await self.call(client, 'tts', 'POST', '/api/tts', json={'text': card['text']})
+        await self.call(client, 'favorite_review', 'PUT', f"/api/favorites/{card['id']}", headers=headers, json={
+            'mastery': rng.choice(['learning', 'review', 'mastered']),
+            'review_count': card['review_count'] + 1,
+        })
+
+    def report(self, elapsed: float) -> dict:
+        total = OpStats()
+        for stats in self.stats.values():
+            total.latencies.extend(stats.latencies)
+            total.errors += stats.errors
+        config = {'users': self.users, 'duration': self.duration, 'turns': self.turns}
+        report = {
+            'config': config,
+            'elapsed': round(elapsed, 2),
+            'ops': {op: stats.summary(elapsed) for op, stats in sorted(self.stats.items())},
+            'total': total.summary(elapsed),
+        }
+        if self.live:
+            config.update({'live': True, 'workers': self.workers})
+            turns = len(self.stats.get('live_turn', OpStats()).latencies)
+            report['live'] = {
+                'peak_connections': self._live_peak,
+                'turns': turns,
+                'turns_per_sec': round(turns / elapsed, 2) if elapsed else 0.0,
+                'turns_per_sec_per_worker': round(turns / elapsed / self.workers, 2) if elapsed else 0.0,
+            }
+        return report
+
+
+def print_report(report: dict, out=sys.stdout) -> None:
+    header = f"{'operation':<18}{'count':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header, file=out)
+    print('-' * len(header), file=out)
+    rows = [*report['ops'].items(), ('TOTAL', report['total'])]
+    for op, row in rows:
+        print(
+            f"{op:<18}{row['count']:>8}{row['errors']:>8}{row['throughput']:>9.2f}"
+            f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}",
+            file=out,
+        )
+    if 'live' in report:
+        live = report['live']
+        print(
+            f"\n实时通道：峰值连接 {live['peak_connections']}，完成 {live['turns']} 轮，"
+            f"{live['turns_per_sec']:.2f} 轮/秒（每 worker {live['turns_per_sec_per_worker']:.2f}）",
+            file=out,
+        )
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """与基线对比，返回退化项（p95 变慢或吞吐下降超过 tolerance 比例）"""
+    regressions = []
+    for op, base in baseline['ops'].items():
+        current = report['ops'].get(op)
+        if current is None:
+            regressions.append(f'{op}: 本次运行没有该操作')
+            continue
+        if base['p95_ms'] and current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{op}: p95 {base['p95_ms']}ms -> {current['p95_ms']}ms")
+        if base['throughput'] and current['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{op}: 吞吐 {base['throughput']}/s -> {current['throughput']}/s")
+        if current['errors'] > base['errors'] and current['errors'] > current['count'] * tolerance:
+            regressions.append(f"{op}: 错误数 {base['errors']} -> {current['errors']}")
+    return regressions
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--users', type=int, default=10, help='并发虚拟用户数')
+    parser.add_argument('--duration', type=float, default=30, help='压测时长（秒）')
+    parser.add_argument('--turns', type=int, default=4, help='每个会话的对话轮数')
+    parser.add_argument('--live', action='store_true', help='对话走 WebSocket 实时通道')
+    parser.add_argument('--workers', type=int, default=1, help='后端 worker 进程数（benchmarks.run 按此启动，用于计算每 worker 吞吐）')
+    parser.add_argument('--baseline', help='基线名称，对应 benchmarks/baselines/<name>.json')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的退化比例')
+    parser.add_argument('--json', dest='json_path', help='把完整结果写入 JSON 文件')
+
+
+def finish(report: dict, args: argparse.Namespace) -> int:
+    """输出报告、处理基线，返回进程退出码"""
+    print_report(report)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    if not args.baseline:
+        return 0
+    path = BASELINE_DIR / f'{args.baseline}.json'
+    if args.save_baseline:
+        path.write_text(json.dumps(report, ensure_ascii=False, indent=2) + '\n', encoding='utf-8')
+        print(f'\n基线已保存到 {path}')
+        return 0
+    if not path.exists():
+        print(f'\n基线 {path} 不存在，使用 --save-baseline 生成', file=sys.stderr)
+        return 2
+    baseline = json.loads(path.read_text(encoding='utf-8'))
+    if baseline['config'] != report['config']:
+        print(f"\n注意：压测参数与基线不同\n  基线: {baseline['config']}\n  本次: {report['config']}", file=sys.stderr)
+    regressions = compare(report, baseline, args.tolerance)
+    if regressions:
+        print(f'\n相对基线 {args.baseline} 出现退化：', file=sys.stderr)
+        for line in regressions:
+            print(f'  - {line}', file=sys.stderr)
+        return 1
+    print(f'\n与基线 {args.baseline} 相比没有超过 {args.tolerance:.0%} 的退化')
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    add_arguments(parser)
+    args = parser.parse_args()
+    runner = LoadRunner(args.base_url, args.users, args.duration, args.turns, live=args.live, workers=args.workers)
+    sys.exit(finish(asyncio.run(runner.run()), args))
+
+
+if __name__ == '__main__':
+    main()
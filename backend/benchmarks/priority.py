@@ -0,0 +1,179 @@
+"""上游调度基准：批量预取占满 VOICEVOX 时，对话与按需播放的延迟
+
+分别以 SCHEDULER_ENABLED=false / true 启动后端（共用同一组假 Gemini 与假 VOICEVOX），
+若干用户持续调用 /api/tts/batch 预取整组抽认卡，同时测量：
+
+- /api/chat（同步音频，asyncAudio=false）端到端耗时
+- /api/tts 端到端耗时
+- 预取吞吐（每秒合成条数）与以 error 返回的条数（排队超时被丢弃）
+
+  python -m benchmarks.priority --background-users 4 --requests 30
+
+假 VOICEVOX 的并发与 VOICEVOX_CONCURRENCY 一致，关闭合成缓存，预取文本各不相同。
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+import httpx
+
+from benchmarks.loadgen import USER_SENTENCES, _percentile_ms
+from benchmarks.run import _free_port, _spawn, _wait_ready
+
+PHRASES = ['おはようございます', '駅はどこですか', 'これをください', 'もう一度お願いします', '少し待ってください']
+
+
+async def _login(client: httpx.AsyncClient, index: int) -> str:
+    credentials = {'email': f'prefetch{index}@example.com', 'password': 'benchmark-password'}
+    await client.post('/api/auth/register', json=credentials)
+    response = await client.post('/api/auth/login', json=credentials)
+    response.raise_for_status()
+    return response.json()['access_token']
+
+
+async def _prefetch(client: httpx.AsyncClient, token: str, user: int, batch: int, stop: asyncio.Event, totals: dict) -> None:
+    counter = itertools.count()
+    while not stop.is_set():
+        texts = [f'{PHRASES[i % len(PHRASES)]}（{user}-{next(counter)}）' for i in range(batch)]
+        async with client.stream(
+            'POST', '/api/tts/batch', json={'texts': texts}, headers={'Authorization': f'Bearer {token}'},
+        ) as response:
+            async for line in response.aiter_lines():
+                if line:
+                    totals['error' if json.loads(line).get('error') else 'ok'] += 1
+
+
+async def _chat(client: httpx.AsyncClient, index: int) -> float:
+    sentence = USER_SENTENCES[index % len(USER_SENTENCES)]
+    started = time.perf_counter()
+    response = await client.post('/api/chat', json={
+        'sessionId': f'bench-{index}',
+        'messages': [{'role': 'user', 'content': f'{sentence}（{index}）'}],
+        'asyncAudio': False,
+    })
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def _tts(client: httpx.AsyncClient, index: int) -> float:
+    started = time.perf_counter()
+    response = await client.post('/api/tts', json={'text': f'{PHRASES[index % len(PHRASES)]}（tts-{index}）'})
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def _measure(base_url: str, args: argparse.Namespace) -> dict:
+    totals = {'ok': 0, 'error': 0}
+    stop = asyncio.Event()
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        await _chat(client, -1)  # 预热：首次调用会创建 Gemini 客户端
+        tokens = [await _login(client, index) for index in range(args.background_users)]
+        background = [
+            asyncio.ensure_future(_prefetch(client, token, index, args.batch_size, stop, totals))
+            for index, token in enumerate(tokens)
+        ]
+        await asyncio.sleep(args.warmup)
+        started = time.perf_counter()
+        chat, tts = [], []
+        for index in range(args.requests):
+            # 对话与按需播放交替进行，模拟一个正在练习的用户
+            chat.append(await _chat(client, index))
+            tts.append(await _tts(client, index))
+        elapsed = time.perf_counter() - started
+        prefetched = dict(totals)
+        stop.set()
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+
+    def summary(values: list[float]) -> dict:
+        ordered = sorted(values)
+        return {'p50_ms': _percentile_ms(ordered, 50), 'p95_ms': _percentile_ms(ordered, 95)}
+
+    return {
+        'chat': summary(chat),
+        'tts': summary(tts),
+        'prefetch': {
+            'items_per_sec': round((prefetched['ok'] + prefetched['error']) / (elapsed + args.warmup), 1),
+            'ok': prefetched['ok'],
+            'dropped': prefetched['error'],
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=30, help='对话与按需播放各多少次')
+    parser.add_argument('--background-users', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=40)
+    parser.add_argument('--warmup', type=float, default=2.0, help='预取开始多久后再测量（秒）')
+    parser.add_argument('--voicevox-concurrency', type=int, default=2)
+    parser.add_argument('--synth-base', type=float, default=0.05)
+    parser.add_argument('--synth-per-char', type=float, default=0.005)
+    parser.add_argument('--gemini-latency', type=float, default=0.3)
+    parser.add_argument('--json', dest='json_path', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    results = {}
+    with ExitStack() as stack:
+        workdir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix='bench-priority-')))
+        env = {**os.environ, 'PYTHONUNBUFFERED': '1'}
+        gemini_port, voicevox_port = _free_port(), _free_port()
+        gemini = _spawn(stack, [
+            '-m', 'benchmarks.fake_gemini', '--port', str(gemini_port), '--jitter', '0',
+            '--latency', str(args.gemini_latency), '--token-latency', '0',
+        ], env, workdir / 'fake_gemini.log')
+        voicevox = _spawn(stack, [
+            '-m', 'benchmarks.fake_voicevox', '--port', str(voicevox_port),
+            '--concurrency', str(args.voicevox_concurrency),
+            '--synth-base', str(args.synth_base), '--synth-per-char', str(args.synth_per_char),
+        ], env, workdir / 'fake_voicevox.log')
+        _wait_ready(f'http://127.0.0.1:{gemini_port}/docs', gemini)
+        _wait_ready(f'http://127.0.0.1:{voicevox_port}/docs', voicevox)
+        whitelist = workdir / 'whitelist.txt'
+        whitelist.write_text('')
+
+        for mode in ('off', 'on'):
+            with ExitStack() as backend_stack:
+                port = _free_port()
+                backend = _spawn(backend_stack, [
+                    '-m', 'uvicorn', 'app.main:app', '--port', str(port), '--log-level', 'warning',
+                ], {
+                    **env,
+                    'GOOGLE_API_KEY': env.get('GOOGLE_API_KEY', 'benchmark'),
+                    'GEMINI_API_ENDPOINT': f'http://127.0.0.1:{gemini_port}',
+                    'VOICEVOX_URL': f'http://127.0.0.1:{voicevox_port}',
+                    'DATABASE_URL': f"sqlite:///{workdir / f'{mode}.db'}",
+                    'EMAIL_WHITELIST_FILE': str(whitelist),
+                    'SCHEDULER_ENABLED': str(mode == 'on').lower(),
+                    'VOICEVOX_CONCURRENCY': str(args.voicevox_concurrency),
+                    'VOICEVOX_MULTI_SYNTHESIS_SIZE': '1',
+                    'TTS_CACHE_SIZE': '0',
+                    'FEEDBACK_CACHE_ENABLED': 'false',
+                    'VOICEVOX_WARMUP': 'false',
+                    'MAINTENANCE_INTERVAL': '0',
+                }, workdir / f'backend_{mode}.log')
+                base_url = f'http://127.0.0.1:{port}'
+                _wait_ready(f'{base_url}/health', backend)
+                results[mode] = asyncio.run(_measure(base_url, args))
+
+    print(f"{'调度':<8}{'对话 p50/p95 ms':>20}{'播放 p50/p95 ms':>20}{'预取 条/秒':>12}{'丢弃':>8}")
+    for mode, result in results.items():
+        chat, tts, prefetch = result['chat'], result['tts'], result['prefetch']
+        print(
+            f"{mode:<8}{chat['p50_ms']:>11}/{chat['p95_ms']:<8}{tts['p50_ms']:>11}/{tts['p95_ms']:<8}"
+            f"{prefetch['items_per_sec']:>12}{prefetch['dropped']:>8}"
+        )
+    if args.json_path:
+        report = {'config': vars(args), 'results': results}
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""复习提醒基准：一次扫描与推送大量用户的耗时
+
+在临时 SQLite 数据库中生成若干时区的用户（每人若干收藏，部分到期，push_url 指向
+benchmarks/fake_push.py），以固定的当前时间执行两次 dispatch：
+
+- 第一次：扫描耗时（补算、时区、候选查询、占位）、推送耗时与每秒提醒数
+- 第二次：同一天内不应重复发送
+- 到期收藏统计的 EXPLAIN QUERY PLAN，确认只读 ix_favorites_due_at_user_id 覆盖索引
+
+  python -m benchmarks.reminders --users 20000 --concurrency 20 --push-latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+from benchmarks.run import _free_port, _spawn, _wait_ready
+
+# 2026-01-15 11:00 UTC：上海 19:00、东京与首尔 20:00 处于默认提醒时段（19:00 起 3 小时），其余不在
+NOW = datetime(2026, 1, 15, 11, 0)
+TIMEZONES = [
+    'Asia/Shanghai', 'Asia/Tokyo', 'Asia/Seoul', 'Europe/London',
+    'Europe/Berlin', 'America/New_York', 'Asia/Kolkata', 'Australia/Sydney',
+]
+
+
+def seed(users: int, favorites_per_user: int, due_share: float, push_base: str) -> None:
+    from sqlalchemy import insert
+
+    from app.database import SessionLocal, init_db
+    from app.models import Favorite, User
+    from app.services import reminders
+
+    init_db()
+    rng = random.Random(0)
+    db = SessionLocal()
+    try:
+        db.execute(insert(User), [
+            {
+                'id': index + 1, 'email': f'reminder{index}@example.com', 'hashed_password': 'x',
+                'timezone': TIMEZONES[index % len(TIMEZONES)], 'is_active': True,
+                'push_url': f'{push_base}/key{index}', 'created_at': NOW, 'updated_at': NOW,
+            }
+            for index in range(users)
+        ])
+        rows = []
+        for user_id in range(1, users + 1):
+            for index in range(favorites_per_user):
+                due = rng.random() < due_share
+                created = NOW - timedelta(days=3 if due else 0, hours=rng.randint(0, 12))
+                rows.append({
+                    'id': f'f{user_id}-{index}', 'user_id': user_id, 'text': 'おはようございます', 'source': 'reply',
+                    'mastery': 'new', 'review_count': 0, 'created_at': created,
+                    'due_at': reminders.next_due('new', created, None),
+                })
+        for start in range(0, len(rows), 5000):
+            db.execute(insert(Favorite), rows[start:start + 5000])
+        db.commit()
+    finally:
+        db.close()
+
+
+def explain() -> list[str]:
+    from sqlalchemy import text
+
+    from app.database import SessionLocal
+    from app.services import reminders
+
+    db = SessionLocal()
+    try:
+        zones = reminders.zones_in_window(db, NOW)
+        captured = []
+        original = db.execute
+
+        def capture(statement, *args, **kwargs):
+            captured.append(statement)
+            return original(statement, *args, **kwargs)
+
+        db.execute = capture
+        reminders.find_candidates(db, NOW, zones)
+        db.execute = original
+        compiled = captured[-1].compile(db.get_bind(), compile_kwargs={'literal_binds': True})
+        return [row[-1] for row in db.execute(text(f'EXPLAIN QUERY PLAN {compiled}')).all()]
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--favorites-per-user', type=int, default=5)
+    parser.add_argument('--due-share', type=float, default=0.3, help='到期收藏的比例')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--push-latency', type=float, default=0.05)
+    parser.add_argument('--push-failure-rate', type=float, default=0.0)
+    parser.add_argument('--json', dest='json_path', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        workdir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix='bench-reminders-')))
+        port = _free_port()
+        push = _spawn(stack, [
+            '-m', 'benchmarks.fake_push', '--port', str(port),
+            '--latency', str(args.push_latency), '--failure-rate', str(args.push_failure_rate),
+        ], {**os.environ, 'PYTHONUNBUFFERED': '1'}, workdir / 'fake_push.log')
+        _wait_ready(f'http://127.0.0.1:{port}/stats', push)
+
+        # 配置在导入 app 之前写入环境变量
+        os.environ.update({
+            'GOOGLE_API_KEY': os.environ.get('GOOGLE_API_KEY', 'benchmark'),
+            'DATABASE_URL': f"sqlite:///{workdir / 'reminders.db'}",
+            'REMINDER_CONCURRENCY': str(args.concurrency),
+            'REMINDER_BACKOFF': '0.05',
+            # 推送接收端在本机，需要加入白名单才能绕过内网地址检查
+            'REMINDER_PUSH_HOSTS': '127.0.0.1',
+        })
+        from app.services import reminders
+
+        started = time.perf_counter()
+        seed(args.users, args.favorites_per_user, args.due_share, f'http://127.0.0.1:{port}')
+        seed_seconds = time.perf_counter() - started
+
+        first = asyncio.run(reminders.dispatch(now=NOW)).to_dict()
+        second = asyncio.run(reminders.dispatch(now=NOW)).to_dict()
+        received = httpx.get(f'http://127.0.0.1:{port}/stats').json()
+        plan = explain()
+
+    results = {
+        'seed_seconds': round(seed_seconds, 2),
+        'first_pass': {**first, 'reminders_per_sec': round(first['sent'] / first['seconds'], 1) if first['seconds'] else 0},
+        'second_pass': second,
+        'received': received,
+        'query_plan': plan,
+    }
+    print(f"用户 {args.users}，处于提醒时段的时区 {first['zones_in_window']}，候选 {first['candidates']}")
+    print(
+        f"第一次：占位 {first['claimed']}，成功 {first['sent']}，失败 {first['failed']}，"
+        f"尝试 {first['attempts']}，扫描 {first['scan_seconds']}s，"
+        f"总耗时 {first['seconds']}s（{results['first_pass']['reminders_per_sec']} 条/秒）"
+    )
+    print(f"第二次：候选 {second['candidates']}，占位 {second['claimed']}，耗时 {second['seconds']}s")
+    print(f"接收端收到 {received['requests']} 个请求：{received['status']}")
+    print('到期统计查询计划：')
+    for line in plan:
+        print(f'  {line}')
+    if args.json_path:
+        report = {'config': vars(args), 'results': results}
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
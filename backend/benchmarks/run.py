@@ -0,0 +1,139 @@
+"""一键压测：启动假 Gemini、假 VOICEVOX 与后端，运行 loadgen 并与基线对比
+
+  python -m benchmarks.run --users 20 --duration 60 --baseline default
+  python -m benchmarks.run --users 20 --duration 60 --baseline default --save-baseline
+  python -m benchmarks.run --users 50 --duration 60 --live --workers 2
+
+后端使用临时 SQLite 数据库与空白名单，不会影响开发数据。
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+import httpx
+
+from benchmarks.loadgen import LoadRunner, add_arguments, finish
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{url} 启动失败，退出码 {process.returncode}')
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f'{url} 在 {timeout} 秒内没有就绪')
+
+
+def _spawn(stack: ExitStack, args: list[str], env: dict[str, str], log_path: Path) -> subprocess.Popen:
+    log = stack.enter_context(open(log_path, 'w'))
+    process = subprocess.Popen([sys.executable, *args], cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    def stop() -> None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    stack.callback(stop)
+    return process
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument('--gemini-latency', type=float, default=0.5)
+    parser.add_argument('--gemini-token-latency', type=float, default=0.005)
+    parser.add_argument('--gemini-failure-rate', type=float, default=0.0)
+    parser.add_argument('--voicevox-engines', type=int, default=1, help='假 VOICEVOX 引擎数量')
+    parser.add_argument('--voicevox-synth-base', type=float, default=0.05)
+    parser.add_argument('--voicevox-synth-per-char', type=float, default=0.01)
+    parser.add_argument('--backend-env', action='append', default=[], metavar='KEY=VALUE', help='附加给后端的环境变量')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        workdir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix='bench-')))
+        env = {**os.environ, 'PYTHONUNBUFFERED': '1'}
+
+        gemini_port = _free_port()
+        gemini = _spawn(stack, [
+            '-m', 'benchmarks.fake_gemini', '--port', str(gemini_port),
+            '--latency', str(args.gemini_latency),
+            '--token-latency', str(args.gemini_token_latency),
+            '--failure-rate', str(args.gemini_failure_rate),
+            '--seed', str(args.seed),
+        ], env, workdir / 'fake_gemini.log')
+
+        voicevox_urls = []
+        for index in range(args.voicevox_engines):
+            port = _free_port()
+            engine = _spawn(stack, [
+                '-m', 'benchmarks.fake_voicevox', '--port', str(port),
+                '--synth-base', str(args.voicevox_synth_base),
+                '--synth-per-char', str(args.voicevox_synth_per_char),
+            ], env, workdir / f'fake_voicevox_{index}.log')
+            url = f'http://127.0.0.1:{port}'
+            _wait_ready(f'{url}/version', engine)
+            voicevox_urls.append(url)
+        _wait_ready(f'http://127.0.0.1:{gemini_port}/docs', gemini)
+
+        whitelist = workdir / 'whitelist.txt'
+        whitelist.write_text('', encoding='utf-8')  # 空白名单即允许任意邮箱注册
+        backend_port = _free_port()
+        backend_env = {
+            **env,
+            'GOOGLE_API_KEY': env.get('GOOGLE_API_KEY', 'benchmark'),
+            'GEMINI_API_ENDPOINT': f'http://127.0.0.1:{gemini_port}',
+            'VOICEVOX_URL': voicevox_urls[0],
+            'VOICEVOX_URLS': ','.join(voicevox_urls),
+            'DATABASE_URL': f"sqlite:///{workdir / 'bench.db'}",
+            'EMAIL_WHITELIST_FILE': str(whitelist),
+            **dict(item.split('=', 1) for item in args.backend_env),
+        }
+        backend = _spawn(stack, [
+            '-m', 'uvicorn', 'app.main:app', '--port', str(backend_port), '--log-level', 'warning',
+            '--workers', str(args.workers),
+        ], backend_env, workdir / 'backend.log')
+        base_url = f'http://127.0.0.1:{backend_port}'
+        _wait_ready(f'{base_url}/health', backend)
+
+        print(f'后端 {base_url}，假 Gemini :{gemini_port}，假 VOICEVOX {len(voicevox_urls)} 个；'
+              f'{args.users} 个用户压测 {args.duration:g} 秒\n')
+        report = asyncio.run(LoadRunner(
+            base_url, args.users, args.duration, args.turns, live=args.live, workers=args.workers,
+        ).run())
+        # 记录上游参数，对比基线时确认条件一致
+        report['config'].update({
+            'gemini_latency': args.gemini_latency,
+            'gemini_token_latency': args.gemini_token_latency,
+            'gemini_failure_rate': args.gemini_failure_rate,
+            'voicevox_engines': args.voicevox_engines,
+            'voicevox_synth_base': args.voicevox_synth_base,
+            'voicevox_synth_per_char': args.voicevox_synth_per_char,
+        })
+        code = finish(report, args)
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
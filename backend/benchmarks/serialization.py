@@ -0,0 +1,185 @@
+"""JSON 响应序列化微基准：对比默认 Pydantic 路径与 Core 行 + orjson 路径
+
+每种负载构造 --rows 行数据（默认 10000），报告每次响应的 CPU 时间（含查询）与响应大小：
+
+  python -m benchmarks.serialization --rows 10000 --repeat 5
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+os.environ.setdefault('GOOGLE_API_KEY', 'benchmark')
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import create_engine, select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.database import Base  # noqa: E402
+from app.models import Favorite, Message, Session as DBSession, User  # noqa: E402
+from app.responses import brotli, columns_for, dumps, rows_to_dicts  # noqa: E402
+from app.schemas_db import FavoriteResponse, MessageResponse, SessionResponse, SessionWithMessages  # noqa: E402
+
+USER_ID = 1
+SESSION_ID = 'bench-session'
+
+
+def populate(db, rows: int) -> None:
+    now = datetime(2026, 1, 1, 12, 0, 0, 123456)
+    db.add(User(id=USER_ID, email='bench@example.com', hashed_password='x'))
+    db.add(DBSession(id=SESSION_ID, user_id=USER_ID, title='長い会話', created_at=now, updated_at=now))
+    db.bulk_insert_mappings(DBSession, [
+        {'id': f's{i}', 'user_id': USER_ID, 'title': f'会話 {i}', 'conversation_style': 'casual',
+         'created_at': now + timedelta(seconds=i), 'updated_at': now + timedelta(seconds=i)}
+        for i in range(rows)
+    ])
+    db.bulk_insert_mappings(Message, [
+        {'id': f'm{i}', 'session_id': SESSION_ID, 'role': 'user' if i % 2 == 0 else 'assistant',
+         'content': '今日は友達と映画を見に行きました。とても面白かったです。',
+         'translation': None if i % 2 == 0 else '今天和朋友去看了电影，非常有趣。',
+         'feedback': {'correctedSentence': '今日は友人と映画を観に行きました。', 'explanation': '「観る」の方が自然です。',
+                      'naturalnessScore': 85} if i % 2 == 0 else None,
+         'created_at': now + timedelta(seconds=i)}
+        for i in range(rows)
+    ])
+    db.bulk_insert_mappings(Favorite, [
+        {'id': f'f{i}', 'user_id': USER_ID, 'text': 'お手洗いはどちらでしょうか？', 'translation': '请问洗手间在哪里？',
+         'source': 'feedback', 'mastery': 'learning', 'review_count': i % 7, 'created_at': now + timedelta(seconds=i),
+         'last_reviewed_at': now if i % 3 == 0 else None}
+        for i in range(rows)
+    ])
+    db.commit()
+
+
+def _starlette_json(content) -> bytes:
+    # 与 fastapi.responses.JSONResponse.render 相同的参数
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':')).encode('utf-8')
+
+
+def build_cases(db) -> dict[str, dict[str, Callable[[], bytes]]]:
+    sessions_adapter = TypeAdapter(List[SessionResponse])
+    favorites_adapter = TypeAdapter(List[FavoriteResponse])
+    detail_adapter = TypeAdapter(SessionWithMessages)
+
+    def orm_sessions():
+        return db.query(DBSession).filter(DBSession.user_id == USER_ID).order_by(DBSession.updated_at.desc()).all()
+
+    def orm_favorites():
+        return db.query(Favorite).filter(Favorite.user_id == USER_ID).order_by(Favorite.created_at.desc()).all()
+
+    def orm_detail():
+        return db.query(DBSession).filter(DBSession.id == SESSION_ID).first()
+
+    def core_sessions():
+        return rows_to_dicts(db.execute(
+            select(*columns_for(DBSession, SessionResponse))
+            .where(DBSession.user_id == USER_ID).order_by(DBSession.updated_at.desc())
+        ))
+
+    def core_favorites():
+        return rows_to_dicts(db.execute(
+            select(*columns_for(Favorite, FavoriteResponse))
+            .where(Favorite.user_id == USER_ID).order_by(Favorite.created_at.desc())
+        ))
+
+    def core_detail():
+        session = rows_to_dicts(db.execute(
+            select(*columns_for(DBSession, SessionResponse)).where(DBSession.id == SESSION_ID)
+        ))[0]
+        session['messages'] = rows_to_dicts(db.execute(
+            select(*columns_for(Message, MessageResponse))
+            .where(Message.session_id == SESSION_ID).order_by(Message.created_at)
+        ))
+        return session
+
+    def pydantic_path(adapter, load):
+        # FastAPI 默认路径：按 response_model 校验 ORM 对象 → 转为 JSON 兼容对象 → json.dumps
+        def run() -> bytes:
+            db.expire_all()
+            value = adapter.validate_python(load(), from_attributes=True)
+            return _starlette_json(adapter.dump_python(value, mode='json'))
+        return run
+
+    def adapter_json_path(adapter, load):
+        # 预编译 TypeAdapter 直接输出 JSON（pydantic-core），省去 json.dumps
+        def run() -> bytes:
+            db.expire_all()
+            return adapter.dump_json(adapter.validate_python(load(), from_attributes=True))
+        return run
+
+    def core_path(load):
+        def run() -> bytes:
+            return dumps(load())
+        return run
+
+    return {
+        'sessions list': {
+            'orm + pydantic + json': pydantic_path(sessions_adapter, orm_sessions),
+            'orm + TypeAdapter.dump_json': adapter_json_path(sessions_adapter, orm_sessions),
+            'core rows + orjson': core_path(core_sessions),
+        },
+        'favorites list': {
+            'orm + pydantic + json': pydantic_path(favorites_adapter, orm_favorites),
+            'orm + TypeAdapter.dump_json': adapter_json_path(favorites_adapter, orm_favorites),
+            'core rows + orjson': core_path(core_favorites),
+        },
+        'session with messages': {
+            'orm + pydantic + json': pydantic_path(detail_adapter, orm_detail),
+            'orm + TypeAdapter.dump_json': adapter_json_path(detail_adapter, orm_detail),
+            'core rows + orjson': core_path(core_detail),
+        },
+    }
+
+
+def measure(func: Callable[[], bytes], repeat: int) -> tuple[float, bytes]:
+    func()  # 预热（编译语句缓存等）
+    samples = []
+    body = b''
+    for _ in range(repeat):
+        started = time.process_time()
+        body = func()
+        samples.append(time.process_time() - started)
+    return statistics.median(samples), body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(f'sqlite:///{workdir}/bench.db')
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine)()
+        populate(db, args.rows)
+
+        print(f'{args.rows} 行，每项取 {args.repeat} 次的 CPU 时间中位数\n')
+        print(f"{'payload / path':<48}{'cpu ms':>10}{'speedup':>9}{'bytes':>12}")
+        for payload, cases in build_cases(db).items():
+            print(payload)
+            baseline = None
+            expected = body = b''
+            for name, func in cases.items():
+                cpu, body = measure(func, args.repeat)
+                baseline = baseline or cpu
+                expected = expected or body
+                print(f'  {name:<46}{cpu * 1000:>10.1f}{baseline / cpu:>8.1f}x{len(body):>12,}')
+                if json.loads(body) != json.loads(expected):
+                    print(f'  !! {name} 的输出与默认路径不一致')
+            for name, compress in (
+                ('gzip level 5', lambda data: gzip.compress(data, compresslevel=5)),
+                *((('brotli quality 4', lambda data: brotli.compress(data, quality=4)),) if brotli else ()),
+            ):
+                cpu, compressed = measure(lambda: compress(body), args.repeat)
+                print(f'  {"+ " + name:<46}{cpu * 1000:>10.1f}{"":>9}{len(compressed):>12,}')
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
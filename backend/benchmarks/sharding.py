@@ -0,0 +1,169 @@
+"""分片写入基准：并发保存消息时的吞吐与延迟随分片数的变化
+
+对每个分片数（0 表示不分片）在临时目录中新建主库与分片库，按 user_id % 分片数放置用户，
+再用多个线程持续执行与 POST /api/sessions/{id}/messages 相同的写入（插入消息并在同一事务中
+更新每日统计），测量：
+
+- 每秒提交的消息数
+- 每次写入（含等待写锁）的 p50 / p95 / p99 延迟
+- 等待写锁超时（database is locked）的次数
+
+每个分片数在独立的子进程中运行，避免引擎与配置缓存互相影响。数据库文件放在 --dir
+（默认系统临时目录）；tmpfs 上没有 fsync 开销，结果会明显偏乐观。
+
+  python -m benchmarks.sharding --shards 0 2 4 8 --threads 16 --seconds 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.loadgen import _percentile_ms
+from benchmarks.run import BACKEND_DIR
+
+
+def _seed(users: int) -> list:
+    from sqlalchemy import insert
+
+    from app.database import SessionLocal, assign_shard, init_db, register_shard_user, shard_session
+    from app.models import Session as DBSession, User
+
+    init_db()
+    db = SessionLocal()
+    try:
+        db.execute(insert(User), [
+            {'id': user_id, 'email': f'shard{user_id}@example.com', 'hashed_password': 'x',
+             'timezone': 'Asia/Shanghai', 'is_active': True, 'shard': assign_shard(user_id)}
+            for user_id in range(1, users + 1)
+        ])
+        db.commit()
+        seeded = db.query(User).all()
+        db.expunge_all()
+    finally:
+        db.close()
+    for user in seeded:
+        if user.shard is not None:
+            register_shard_user(user.shard, user.id)
+        db = shard_session(user.shard)
+        try:
+            db.add(DBSession(id=f'bench-{user.id}', user_id=user.id))
+            db.commit()
+        finally:
+            db.close()
+    return seeded
+
+
+def _child(args: argparse.Namespace) -> None:
+    """子进程：配置已通过环境变量传入"""
+    from nanoid import generate
+    from sqlalchemy.exc import OperationalError
+
+    from app.database import shard_session
+    from app.models import Message
+    from app.services import stats
+
+    users = _seed(args.users)
+    audio = 'A' * (args.audio_kb * 1024)
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def worker(index: int) -> None:
+        nonlocal errors
+        mine = users[index::args.threads]
+        turn = 0
+        while not stop.is_set():
+            user = mine[turn % len(mine)]
+            turn += 1
+            started = time.perf_counter()
+            db = shard_session(user.shard)
+            try:
+                db.add(Message(
+                    id=generate(size=21), session_id=f'bench-{user.id}', role='user',
+                    content='今日はいい天気ですね', audio_base64=audio or None,
+                ))
+                stats.record_message(db, user, 'user', {'naturalnessScore': 80})
+                db.commit()
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+            except OperationalError:
+                db.rollback()
+                with lock:
+                    errors += 1
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    print(json.dumps({
+        'writes_per_sec': round(len(ordered) / elapsed, 1),
+        'writes': len(ordered),
+        'locked_errors': errors,
+        'p50_ms': _percentile_ms(ordered, 50),
+        'p95_ms': _percentile_ms(ordered, 95),
+        'p99_ms': _percentile_ms(ordered, 99),
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shards', type=int, nargs='+', default=[0, 2, 4, 8], help='分片数，0 表示不分片')
+    parser.add_argument('--threads', type=int, default=16, help='并发写入线程数（相当于同时保存消息的请求数）')
+    parser.add_argument('--users', type=int, default=64)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--audio-kb', type=int, default=0, help='每条消息附带的 audio_base64 大小（KB）')
+    parser.add_argument('--dir', help='数据库文件所在目录，默认系统临时目录')
+    parser.add_argument('--json', dest='json_path', help='把结果写入 JSON 文件')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args)
+        return
+
+    results = {}
+    for count in args.shards:
+        with tempfile.TemporaryDirectory(prefix='bench-sharding-', dir=args.dir) as workdir:
+            env = {
+                **os.environ,
+                'GOOGLE_API_KEY': os.environ.get('GOOGLE_API_KEY', 'benchmark'),
+                'DATABASE_URL': f"sqlite:///{Path(workdir) / 'main.db'}",
+                'SHARD_COUNT': str(count),
+                'SHARD_URL': f"sqlite:///{Path(workdir) / 'shard_{shard}.db'}",
+            }
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.sharding', '--child', '--threads', str(args.threads),
+                 '--users', str(args.users), '--seconds', str(args.seconds), '--audio-kb', str(args.audio_kb)],
+                cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            results[count] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'分片数':<8}{'写入/秒':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'锁超时':>8}")
+    for count, result in results.items():
+        print(
+            f"{count or '不分片':<8}{result['writes_per_sec']:>10}{result['p50_ms']:>10}"
+            f"{result['p95_ms']:>10}{result['p99_ms']:>10}{result['locked_errors']:>8}"
+        )
+    if args.json_path:
+        report = {'config': vars(args), 'results': results}
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""拆分模式基准：对比一次调用（combined）与回复/反馈并发调用（split）的延迟
+
+分别以 CHAT_SPLIT_MODE=false / true 启动后端（共用同一个假 Gemini），对每种模式测量：
+
+- /api/chat 端到端耗时
+- /api/chat/stream 的 time-to-reply（收到 reply 行）与端到端耗时
+
+  python -m benchmarks.split_chat --requests 40 --concurrency 4
+
+为避免反馈缓存影响结果，后端关闭 FEEDBACK_CACHE_ENABLED；音频走异步任务，只测文本生成。
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+import httpx
+
+from benchmarks.loadgen import USER_SENTENCES, _percentile_ms
+from benchmarks.run import _free_port, _spawn, _wait_ready
+
+HISTORY = [
+    {'role': 'user', 'content': 'こんにちは'},
+    {'role': 'assistant', 'content': 'こんにちは！今日はどんな一日でしたか？'},
+]
+
+
+def _payload(index: int) -> dict:
+    sentence = USER_SENTENCES[index % len(USER_SENTENCES)]
+    return {
+        'sessionId': f'bench-{index}',
+        'messages': [*HISTORY, {'role': 'user', 'content': f'{sentence}（{index}）'}],
+        'asyncAudio': True,
+    }
+
+
+async def _chat(client: httpx.AsyncClient, index: int) -> dict:
+    started = time.perf_counter()
+    response = await client.post('/api/chat', json=_payload(index))
+    response.raise_for_status()
+    return {'end_to_end': time.perf_counter() - started}
+
+
+async def _chat_stream(client: httpx.AsyncClient, index: int) -> dict:
+    started = time.perf_counter()
+    result = {}
+    async with client.stream('POST', '/api/chat/stream', json=_payload(index)) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line and json.loads(line)['type'] == 'reply':
+                result['time_to_reply'] = time.perf_counter() - started
+    result['end_to_end'] = time.perf_counter() - started
+    return result
+
+
+async def _measure(base_url: str, requests: int, concurrency: int, call) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: dict[str, list[float]] = {}
+
+    async def one(client: httpx.AsyncClient, index: int) -> None:
+        async with semaphore:
+            for name, value in (await call(client, index)).items():
+                samples.setdefault(name, []).append(value)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        await one(client, -1)  # 预热：首次调用会创建 Gemini 客户端
+        samples.clear()
+        await asyncio.gather(*(one(client, index) for index in range(requests)))
+    return {
+        name: {'p50_ms': _percentile_ms(sorted(values), 50), 'p95_ms': _percentile_ms(sorted(values), 95)}
+        for name, values in samples.items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--gemini-latency', type=float, default=0.4)
+    parser.add_argument('--gemini-token-latency', type=float, default=0.01)
+    parser.add_argument('--gemini-prompt-token-latency', type=float, default=0.0002)
+    parser.add_argument('--json', dest='json_path', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    results = {}
+    with ExitStack() as stack:
+        workdir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix='bench-split-')))
+        env = {**os.environ, 'PYTHONUNBUFFERED': '1'}
+        gemini_port = _free_port()
+        gemini = _spawn(stack, [
+            '-m', 'benchmarks.fake_gemini', '--port', str(gemini_port), '--jitter', '0',
+            '--latency', str(args.gemini_latency),
+            '--token-latency', str(args.gemini_token_latency),
+            '--prompt-token-latency', str(args.gemini_prompt_token_latency),
+        ], env, workdir / 'fake_gemini.log')
+        _wait_ready(f'http://127.0.0.1:{gemini_port}/docs', gemini)
+
+        for mode in ('combined', 'split'):
+            with ExitStack() as backend_stack:
+                port = _free_port()
+                backend = _spawn(backend_stack, [
+                    '-m', 'uvicorn', 'app.main:app', '--port', str(port), '--log-level', 'warning',
+                ], {
+                    **env,
+                    'GOOGLE_API_KEY': env.get('GOOGLE_API_KEY', 'benchmark'),
+                    'GEMINI_API_ENDPOINT': f'http://127.0.0.1:{gemini_port}',
+                    'DATABASE_URL': f"sqlite:///{workdir / f'{mode}.db'}",
+                    'CHAT_SPLIT_MODE': str(mode == 'split').lower(),
+                    'FEEDBACK_CACHE_ENABLED': 'false',
+                    'VOICEVOX_WARMUP': 'false',
+                    'MAINTENANCE_INTERVAL': '0',
+                }, workdir / f'backend_{mode}.log')
+                base_url = f'http://127.0.0.1:{port}'
+                _wait_ready(f'{base_url}/health', backend)
+                results[mode] = {
+                    'chat': asyncio.run(_measure(base_url, args.requests, args.concurrency, _chat)),
+                    'chat_stream': asyncio.run(_measure(base_url, args.requests, args.concurrency, _chat_stream)),
+                }
+
+    print(f"{'模式':<10}{'接口':<14}{'指标':<15}{'p50 ms':>10}{'p95 ms':>10}")
+    for mode, endpoints in results.items():
+        for endpoint, metrics in endpoints.items():
+            for name, values in metrics.items():
+                print(f"{mode:<10}{endpoint:<14}{name:<15}{values['p50_ms']:>10}{values['p95_ms']:>10}")
+    if args.json_path:
+        report = {'config': vars(args), 'results': results}
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
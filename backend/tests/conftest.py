@@ -0,0 +1,12 @@
+import os
+import tempfile
+
+# 导入 app 之前设置：不连接真实服务，数据库放在临时目录
+_tmp = tempfile.mkdtemp(prefix='kokoro-tests-')
+os.environ.setdefault('GOOGLE_API_KEY', 'test')
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{_tmp}/test.db')
+os.environ.setdefault('VOICEVOX_WARMUP', 'false')
+os.environ.setdefault('MAINTENANCE_INTERVAL', '0')
+os.environ.setdefault('REMINDER_INTERVAL', '0')
+os.environ.setdefault('EMAIL_WHITELIST_FILE', f'{_tmp}/whitelist.txt')
+open(os.environ['EMAIL_WHITELIST_FILE'], 'a').close()
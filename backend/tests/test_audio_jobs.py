@@ -0,0 +1,154 @@
+import asyncio
+import base64
+from array import array
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.container import services
+from app.database import SessionLocal
+from app.main import app
+from app.models import Message
+from app.services import audio_jobs
+from app.services.audio import add_wav_header
+from app.services.audio_jobs import DONE, AudioJob
+from app.services.audio_profiles import PROFILES, STANDARD
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        email = 'audio-jobs@example.com'
+        client.post('/api/auth/register', json={'email': email, 'password': 'secret123'})
+        token = client.post('/api/auth/login', json={'email': email, 'password': 'secret123'}).json()['access_token']
+        client.headers['Authorization'] = f'Bearer {token}'
+        yield client
+
+
+def _stored_audio(message_id: str) -> str | None:
+    db = SessionLocal()
+    try:
+        return db.get(Message, message_id).audio_base64
+    finally:
+        db.close()
+
+
+def _add_job(status: str = audio_jobs.PENDING, audio: str | None = None, profile=STANDARD) -> AudioJob:
+    job = AudioJob(
+        id=f'job-{status}-{profile.name}', text='こんにちは', status=status, profile=profile,
+        audio_base64=audio, standard_base64=audio,
+    )
+    services.audio_jobs._jobs[job.id] = job
+    return job
+
+
+def test_job_finishing_after_save_is_written_back(client, monkeypatch):
+    async def synthesize(text, profile=STANDARD):
+        return 'UklGRg=='
+    monkeypatch.setattr(audio_jobs.speech, 'synthesize', synthesize)
+
+    session_id = client.post('/api/sessions/', json={}).json()['id']
+    job = _add_job()
+    message = client.post(f'/api/sessions/{session_id}/messages', json={
+        'role': 'assistant', 'content': 'こんにちは', 'audio_job_id': job.id,
+    }).json()
+    assert message['audio_base64'] is None
+
+    client.portal.call(services.audio_jobs._run, job)
+    assert _stored_audio(message['id']) == 'UklGRg=='
+
+
+def test_finished_job_is_stored_with_message(client):
+    session_id = client.post('/api/sessions/', json={}).json()['id']
+    job = _add_job(DONE, 'UklGRg==')
+    message = client.post(f'/api/sessions/{session_id}/messages', json={
+        'role': 'assistant', 'content': 'こんにちは', 'audio_job_id': job.id,
+    }).json()
+    assert message['audio_base64'] == 'UklGRg=='
+    assert _stored_audio(message['id']) == 'UklGRg=='
+
+
+def test_attach_runs_after_message_is_committed(client, monkeypatch):
+    # 任务可能在 attach 之后任意时刻完成并回写，此时消息行必须已经提交
+    committed = []
+    attach = services.audio_jobs.attach
+
+    def checked_attach(job_id, message_id, shard=None):
+        db = SessionLocal()
+        try:
+            committed.append(db.get(Message, message_id) is not None)
+        finally:
+            db.close()
+        return attach(job_id, message_id, shard)
+    monkeypatch.setattr(services.audio_jobs, 'attach', checked_attach)
+
+    session_id = client.post('/api/sessions/', json={}).json()['id']
+    job = _add_job()
+    client.post(f'/api/sessions/{session_id}/messages', json={
+        'role': 'assistant', 'content': 'こんにちは', 'audio_job_id': job.id,
+    })
+    assert committed == [True]
+
+
+def test_profile_applies_to_response_only(client, monkeypatch):
+    tone = array('h', [8000, -8000] * 12000)
+    standard = base64.b64encode(add_wav_header(tone.tobytes(), 24000)).decode('ascii')
+
+    async def synthesize(text, profile=STANDARD):
+        assert profile is STANDARD
+        return standard
+    monkeypatch.setattr(audio_jobs.speech, 'synthesize', synthesize)
+
+    session_id = client.post('/api/sessions/', json={}).json()['id']
+    job = _add_job(profile=PROFILES['low'])
+    message = client.post(f'/api/sessions/{session_id}/messages', json={
+        'role': 'assistant', 'content': 'こんにちは', 'audio_job_id': job.id,
+    }).json()
+    client.portal.call(services.audio_jobs._run, job)
+
+    assert job.audio_base64 != standard
+    assert _stored_audio(message['id']) == standard
+
+
+def test_store_failure_keeps_job_done_and_workers_alive(client, monkeypatch):
+    async def synthesize(text, profile=STANDARD):
+        return 'UklGRg=='
+    monkeypatch.setattr(audio_jobs.speech, 'synthesize', synthesize)
+
+    def broken_store(shard, message_id, audio_base64):
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(audio_jobs, '_store_audio', broken_store)
+
+    async def run():
+        manager = services.audio_jobs
+        first = manager.submit('一つ目')
+        manager.attach(first.id, 'missing-message')
+        await manager.wait(first, 5)
+        second = manager.submit('二つ目')
+        await manager.wait(second, 5)
+        return first, second, manager.stats()['workers']
+
+    first, second, workers = client.portal.call(run)
+    assert first.status == DONE and first.audio_base64 == 'UklGRg=='
+    assert second.status == DONE
+    assert workers == services.audio_jobs.worker_count
+
+
+def test_dead_workers_are_replaced(client, monkeypatch):
+    async def synthesize(text, profile=STANDARD):
+        return 'UklGRg=='
+    monkeypatch.setattr(audio_jobs.speech, 'synthesize', synthesize)
+
+    async def run():
+        manager = services.audio_jobs
+        manager._ensure_workers()
+        for task in manager._workers:
+            task.cancel()
+        await asyncio.gather(*manager._workers, return_exceptions=True)
+        job = manager.submit('こんにちは')
+        alive = len([task for task in manager._workers if not task.done()])
+        return alive, await manager.wait(job, 5)
+
+    alive, job = client.portal.call(run)
+    assert alive == services.audio_jobs.worker_count
+    assert job.status == DONE
@@ -0,0 +1,14 @@
+import pytest
+
+from app.services.audio_profiles import PROFILES, resolve_profile
+
+
+def test_minimal_requires_declared_codec():
+    with pytest.raises(ValueError):
+        resolve_profile('minimal')
+    assert resolve_profile('minimal', 'opus,ima_adpcm') is PROFILES['minimal']
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        resolve_profile('lossless')
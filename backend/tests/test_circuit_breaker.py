@@ -0,0 +1,112 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services import circuit_breaker
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from app.services.voicevox import VoicevoxService, VoicevoxUnavailable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', fake)
+    return fake
+
+
+def _tripped(clock, **kwargs) -> CircuitBreaker:
+    breaker = CircuitBreaker('test', min_calls=2, open_seconds=10, **kwargs)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    clock.now += 10
+    assert breaker.state == HALF_OPEN
+    return breaker
+
+
+def test_trips_and_recovers(clock):
+    breaker = _tripped(clock)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_failed_trial_reopens(clock):
+    breaker = _tripped(clock)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_cancelled_trial_releases_slot(clock):
+    breaker = _tripped(clock)
+    assert breaker.allow_request()
+    breaker.record_cancelled()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_stuck_trial_times_out(clock):
+    breaker = _tripped(clock, half_open_timeout=5)
+    assert breaker.allow_request()
+    clock.now += 4
+    assert breaker.state == HALF_OPEN
+    clock.now += 1
+    assert breaker.state == OPEN
+
+
+@pytest.mark.asyncio
+async def test_voicevox_cancel_during_trial_releases_slot(clock):
+    service = VoicevoxService()
+    breaker = service.engines[0].breaker
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+    clock.now += breaker.open_seconds
+    assert breaker.state == HALF_OPEN
+
+    entered = asyncio.Event()
+
+    async def trial():
+        async with service._engine():
+            entered.set()
+            await asyncio.sleep(3600)
+
+    task = asyncio.create_task(trial())
+    await entered.wait()
+    # 试探进行中：名额已占用
+    with pytest.raises(VoicevoxUnavailable):
+        service._pick_engine(set())
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert breaker.state == HALF_OPEN
+    assert service.engines[0].outstanding == 0
+    assert service._pick_engine(set()) is service.engines[0]
+
+
+def test_half_open_admits_one_trial_across_threads(clock):
+    breaker = _tripped(clock)
+    barrier = threading.Barrier(16)
+    admitted = []
+
+    def trial():
+        barrier.wait()
+        admitted.append(breaker.allow_request())
+
+    threads = [threading.Thread(target=trial) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert admitted.count(True) == 1
@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import event
+
+from app.config import get_settings
+from app.database import SessionLocal, engine, init_db
+from app.models import FeedbackCache
+from app.services import feedback_cache
+
+FEEDBACK = {'correctedSentence': 'おはよう', 'explanation': '', 'naturalnessScore': 5}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    init_db()
+    monkeypatch.setattr(get_settings(), 'feedback_cache_flush_interval', 3600.0)
+    feedback_cache.flush_hits()
+    session = SessionLocal()
+    yield session
+    session.query(FeedbackCache).delete()
+    session.commit()
+    session.close()
+
+
+def _writes(statements: list[str]):
+    def record(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith(('UPDATE', 'INSERT', 'DELETE')):
+            statements.append(statement)
+    return record
+
+
+def test_hits_do_not_write_until_flushed(db):
+    feedback_cache.store('おはよう。', 'casual', FEEDBACK)
+    statements: list[str] = []
+    listener = _writes(statements)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        assert feedback_cache.lookup('おはよう', 'casual') is not None
+        assert feedback_cache.lookup('おはよう！', 'casual') is not None
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert statements == []
+
+    assert feedback_cache.flush_hits() == 1
+    entry = db.query(FeedbackCache).one()
+    assert entry.hits == 2
+    assert entry.last_used_at is not None
@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.models import User
+from app.routers import live
+from app.routers.live import LiveConnection
+
+
+@pytest.mark.asyncio
+async def test_failed_turn_is_not_kept_in_history(monkeypatch):
+    sent = []
+
+    async def wait_reply(payload, on_reply=None):
+        sent.append([message.content for message in payload.messages])
+        if len(sent) == 1:
+            raise HTTPException(status_code=504, detail='timeout')
+        feedback = asyncio.get_running_loop().create_future()
+        feedback.set_result({'correctedSentence': 'はい', 'explanation': '', 'naturalnessScore': 5})
+        return {'reply': 'こんにちは', 'replyTranslation': '你好'}, feedback
+    monkeypatch.setattr(live.conversation, 'wait_reply', wait_reply)
+    monkeypatch.setattr(live, '_save_message', lambda *args, **kwargs: 'message-id')
+
+    connection = LiveConnection(None, User(id=1, email='live@example.com'), 'session', 'casual', [])
+    await connection.run_turn('t1', '最初', False)
+    assert connection.history == []
+
+    await connection.run_turn('t2', '二回目', False)
+    assert sent == [['最初'], ['二回目']]
+    assert connection.history == [
+        {'role': 'user', 'content': '二回目'},
+        {'role': 'assistant', 'content': 'こんにちは'},
+    ]
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database import SessionLocal, init_db
+from app.models import ArchivedSession, Message, Session as DBSession, User
+from app.services import maintenance
+
+
+@pytest.fixture
+def db():
+    init_db()
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    for model in (Message, DBSession, ArchivedSession, User):
+        session.query(model).delete()
+    session.commit()
+    session.close()
+
+
+def test_archive_skips_sessions_with_recent_messages(db):
+    now = datetime.utcnow()
+    old = now - timedelta(days=100)
+    user = User(email='archive@example.com', hashed_password='x')
+    db.add(user)
+    db.flush()
+    # 创建很早、updated_at 没有随新消息刷新的旧数据
+    db.add(DBSession(id='active', user_id=user.id, created_at=old, updated_at=old))
+    db.add(DBSession(id='idle', user_id=user.id, created_at=old, updated_at=old))
+    db.add(Message(id='m1', session_id='active', role='user', content='x', created_at=now))
+    db.add(Message(id='m2', session_id='idle', role='user', content='x', created_at=old))
+    db.commit()
+
+    sessions, messages, _ = maintenance.archive_idle_sessions(db, now - timedelta(days=30), batch_size=10)
+
+    assert (sessions, messages) == (1, 1)
+    assert db.get(DBSession, 'active') is not None
+    assert db.get(ArchivedSession, 'idle') is not None
+
+
+def test_message_arriving_after_selection_is_not_lost(db, monkeypatch):
+    now = datetime.utcnow()
+    old = now - timedelta(days=100)
+    user = User(email='archive-race@example.com', hashed_password='x')
+    db.add(user)
+    db.flush()
+    db.add(DBSession(id='racing', user_id=user.id, created_at=old, updated_at=old))
+    db.add(Message(id='r1', session_id='racing', role='user', content='x', created_at=old))
+    db.commit()
+
+    # 会话被选为候选之后、归档之前，实时通道写入了一条新消息
+    archive_session = maintenance.archive_session
+
+    def racing_archive(db, session, cutoff):
+        other = SessionLocal()
+        try:
+            other.add(Message(id='r2', session_id=session.id, role='user', content='y', created_at=now))
+            other.commit()
+        finally:
+            other.close()
+        return archive_session(db, session, cutoff)
+    monkeypatch.setattr(maintenance, 'archive_session', racing_archive)
+
+    sessions, messages, _ = maintenance.archive_idle_sessions(db, now - timedelta(days=30), batch_size=10)
+
+    assert (sessions, messages) == (0, 0)
+    assert db.get(ArchivedSession, 'racing') is None
+    assert {message.id for message in db.query(Message).filter(Message.session_id == 'racing')} == {'r1', 'r2'}
@@ -0,0 +1,48 @@
+import pytest
+from fastapi import HTTPException
+
+from app.services.model_router import ModelHealth, ModelRouter, Route
+
+
+def _tripped_router(*models: str) -> ModelRouter:
+    router = ModelRouter({'chat': [Route(model, 5.0) for model in models]}, deadline=10.0, window=5)
+    for model in models:
+        breaker = router._health[model].breaker
+        for _ in range(breaker.min_calls):
+            breaker.record_failure()
+        assert breaker.state == 'open'
+    return router
+
+
+def test_single_open_route_is_still_tried():
+    router = _tripped_router('gemini-a')
+    calls = []
+
+    def call(model, timeout, last):
+        calls.append((model, last))
+        return 'ok'
+
+    assert router.call('chat', call) == ('ok', 'gemini-a')
+    assert calls == [('gemini-a', True)]
+
+
+def test_all_routes_open_tries_first_once():
+    router = _tripped_router('gemini-a', 'gemini-b')
+    calls = []
+
+    def call(model, timeout, last):
+        calls.append(model)
+        raise HTTPException(status_code=502, detail='upstream')
+
+    with pytest.raises(HTTPException) as exc:
+        router.call('chat', call)
+    assert exc.value.status_code == 502
+    assert calls == ['gemini-a']
+
+
+def test_open_route_is_skipped_when_another_is_available():
+    router = _tripped_router('gemini-a')
+    router.routes['chat'].append(Route('gemini-b', 5.0))
+    router._health['gemini-b'] = ModelHealth('gemini-b', 5, 30.0)
+
+    assert router.call('chat', lambda model, timeout, last: model) == ('gemini-b', 'gemini-b')
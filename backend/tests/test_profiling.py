@@ -0,0 +1,38 @@
+import anyio.to_thread
+from fastapi import FastAPI
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+
+from app import profiling
+
+
+def _client(monkeypatch) -> TestClient:
+    monkeypatch.setattr(profiling, '_is_admin', lambda scope: True)
+    app = FastAPI()
+    app.add_middleware(profiling.ProfileMiddleware)
+
+    @app.get('/sync')
+    def sync_route():
+        # 分析期间线程池调用经过包装
+        return {'wrapped': anyio.to_thread.run_sync is profiling._profiled_run_sync}
+
+    @app.get('/broken')
+    async def broken_route():
+        return Response(b'{"partial": ', media_type='application/json')
+
+    return TestClient(app)
+
+
+def test_thread_pool_is_only_wrapped_while_profiling(monkeypatch):
+    client = _client(monkeypatch)
+    assert client.get('/sync').json() == {'wrapped': False}
+
+    profiled = client.get('/sync?profile=1').json()
+    assert profiled['response']['body'] == {'wrapped': True}
+    assert anyio.to_thread.run_sync is profiling._run_sync
+
+
+def test_invalid_json_body_is_returned_as_text(monkeypatch):
+    response = _client(monkeypatch).get('/broken?profile=1')
+    assert response.status_code == 200
+    assert response.json()['response']['body'] == '{"partial": '
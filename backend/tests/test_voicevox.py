@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.voicevox import VoicevoxService
+
+
+@pytest.mark.asyncio
+async def test_failed_segment_cancels_siblings(monkeypatch):
+    service = VoicevoxService()
+    service.split_chars = 4
+    cancelled = []
+
+    async def synthesize_one(text, speaker_id):
+        if text.startswith('失敗'):
+            await asyncio.sleep(0.01)
+            raise HTTPException(status_code=502, detail='engine error')
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled.append(text)
+            raise
+    monkeypatch.setattr(service, '_synthesize_one', synthesize_one)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await asyncio.wait_for(service.tts('長い文です。失敗します。長い文です。'), 5)
+    assert exc_info.value.status_code == 502
+    assert len(cancelled) == 2